@@ -0,0 +1,77 @@
+"""Compara dos JSON de `run_benchmarks.py` y marca las regresiones.
+
+Las filas se emparejan por (bench, variant, size). Para cada métrica común
+se informa el cambio relativo; es regresión si empeora más que `--threshold`
+(tiempos y latencias que suben, tasas que bajan) o si un recall baja más de
+`--recall-tolerance` en valor absoluto. Sale con código 1 si hay regresiones.
+
+    python benchmarks/compare.py benchmarks/results/<base>.json benchmarks/results/<nuevo>.json
+"""
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+KEY_FIELDS = ("bench", "variant", "size")
+# metrics not listed here (counts, hit rates) are reported but never flagged
+LOWER_IS_BETTER = ("seconds", "_ms")
+HIGHER_IS_BETTER = ("_per_sec", "qps")
+
+
+def load(path: str) -> Tuple[dict, Dict[tuple, dict]]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return report["meta"], {tuple(row[k] for k in KEY_FIELDS): row for row in report["results"]}
+
+
+def direction(metric: str) -> Optional[int]:
+    """+1 si más es mejor, -1 si menos es mejor, None si la métrica no se evalúa."""
+    if metric.startswith("recall"):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    return None
+
+
+def compare(base_path: str, new_path: str, threshold: float = 0.1, recall_tolerance: float = 0.01) -> List[dict]:
+    base_meta, base = load(base_path)
+    new_meta, new = load(new_path)
+    print(f"base:  {base_meta.get('commit')} ({base_meta.get('timestamp')})")
+    print(f"nuevo: {new_meta.get('commit')} ({new_meta.get('timestamp')})")
+    if (base_meta.get("platform"), base_meta.get("cpus")) != (new_meta.get("platform"), new_meta.get("cpus")):
+        print("Aviso: los resultados son de máquinas distintas; los tiempos no son comparables")
+    regressions = []
+    print(f"{'bench':>12} {'variante':>22} {'tamaño':>9} {'métrica':>16} {'base':>11} {'nuevo':>11} {'cambio':>8}")
+    for key in sorted(base.keys() & new.keys(), key=str):
+        for metric, old in base[key].items():
+            value = new[key].get(metric)
+            sign = direction(metric)
+            if sign is None or not isinstance(old, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            change = (value - old) / old if old else 0.0
+            if metric.startswith("recall"):
+                worse = old - value > recall_tolerance
+            else:
+                worse = -sign * change > threshold
+            mark = "  REGRESIÓN" if worse else ""
+            print(f"{key[0]:>12} {key[1]:>22} {key[2]:>9} {metric:>16} {old:>11.4g} {value:>11.4g} {change:>+8.1%}{mark}")
+            if worse:
+                regressions.append({"key": key, "metric": metric, "base": old, "new": value, "change": change})
+    for key in sorted(base.keys() ^ new.keys(), key=str):
+        print(f"Sólo en {'base' if key in base else 'nuevo'}: {key}")
+    print(f"{len(regressions)} regresión(es)")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Compara dos resultados de run_benchmarks.py")
+    p.add_argument("base", help="JSON de referencia (p. ej. el commit anterior)")
+    p.add_argument("new", help="JSON a evaluar")
+    p.add_argument("--threshold", type=float, default=0.1, help="Empeoramiento relativo tolerado en tiempos y tasas")
+    p.add_argument("--recall-tolerance", type=float, default=0.01, help="Caída absoluta de recall tolerada")
+    args = p.parse_args()
+    sys.exit(1 if compare(args.base, args.new, args.threshold, args.recall_tolerance) else 0)
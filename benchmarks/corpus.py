@@ -0,0 +1,103 @@
+"""Corpus sintéticos para los benchmarks: KB con consultas etiquetadas y CSV de saldos.
+
+Todo es determinista dado `seed`, así que dos corridas (o dos commits) miden
+exactamente los mismos archivos y consultas.
+"""
+import os
+import random
+from typing import Dict, List, NamedTuple, Tuple
+
+
+TOPICS = ["cuenta", "transferencia", "tarjeta", "credito", "deposito", "cheque", "prestamo", "seguro"]
+COMMON = ["banco", "cliente", "solicitud", "requisitos", "documento", "plazo", "comision", "interes",
+          "sucursal", "linea", "formulario", "identidad", "saldo", "monto", "limite", "firma"]
+SYLLABLES = ["ba", "ca", "de", "fi", "go", "la", "me", "no", "pa", "ra", "se", "ti", "vo", "za",
+             "cu", "li", "mo", "ne", "ro", "su", "ten", "dor", "mar", "qui"]
+VOCAB_SIZE = 5000
+
+
+class LabeledQuery(NamedTuple):
+    text: str
+    source: str
+
+
+def vocabulary(size: int = VOCAB_SIZE, seed: int = 0) -> List[str]:
+    """Pseudo-palabras de 2 a 4 sílabas, distintas entre sí (la cola larga del vocabulario)."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_kb(kb_dir: str, n_docs: int, seed: int = 0) -> Dict[str, str]:
+    """Escribe `n_docs` archivos .txt de 2 a 6 párrafos y devuelve {nombre: texto}.
+
+    Cada documento tiene un tema y mezcla palabras comunes con una cola larga
+    de distribución Zipf, así que cada párrafo tiene términos que lo distinguen.
+    """
+    rng = random.Random(seed)
+    vocab = vocabulary(seed=seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    os.makedirs(kb_dir, exist_ok=True)
+    docs = {}
+    for d in range(n_docs):
+        topic = TOPICS[d % len(TOPICS)]
+        paras = []
+        for _ in range(rng.randint(2, 6)):
+            sentences = []
+            for _ in range(rng.randint(3, 8)):
+                words = rng.choices(vocab, weights=weights, k=rng.randint(6, 16))
+                words += rng.choices(COMMON, k=2) + [topic]
+                rng.shuffle(words)
+                sentences.append(" ".join(words).capitalize() + ".")
+            paras.append(" ".join(sentences))
+        name = f"doc_{d:06d}.txt"
+        docs[name] = "\n\n".join(paras)
+        with open(os.path.join(kb_dir, name), "w", encoding="utf-8") as f:
+            f.write(docs[name])
+    return docs
+
+
+def labeled_queries(docs: Dict[str, str], n: int, words: int = 8, seed: int = 1) -> List[LabeledQuery]:
+    """`n` consultas de `words` palabras consecutivas de algún documento, etiquetadas con su archivo.
+
+    La respuesta correcta es el documento del que salió la consulta: recall@k
+    cuenta en cuántas consultas ese archivo aparece entre los k resultados.
+    """
+    rng = random.Random(seed)
+    names = sorted(docs)
+    out = []
+    for _ in range(n):
+        source = rng.choice(names)
+        tokens = docs[source].replace(".", "").split()
+        start = rng.randrange(max(1, len(tokens) - words))
+        out.append(LabeledQuery(" ".join(tokens[start:start + words]).lower(), source))
+    return out
+
+
+def synthetic_saldos(csv_path: str, n: int, seed: int = 0) -> List[str]:
+    """Escribe un saldos.csv de `n` filas (IDs `V-########` y numéricos) y devuelve los IDs."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+    ids = []
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("ID_Cedula,Nombre,Balance\n")
+        for i in range(n):
+            number = 10_000_000 + i
+            id_value = f"V-{number}" if i % 2 == 0 else str(number)
+            ids.append(id_value)
+            f.write(f"{id_value},Cliente {i},{rng.uniform(0, 100_000):.2f}\n")
+    return ids
+
+
+def balance_lookups(ids: List[str], n: int, hit_ratio: float = 0.5, seed: int = 2) -> List[Tuple[str, bool]]:
+    """`n` IDs a buscar: una fracción `hit_ratio` existe en el CSV y el resto no."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        if rng.random() < hit_ratio:
+            out.append((rng.choice(ids), True))
+        else:
+            out.append((str(rng.randint(90_000_000, 99_999_999)), False))
+    return out
@@ -0,0 +1,396 @@
+"""Suite de benchmarks offline de indexado, recuperación, saldos y enrutamiento.
+
+Genera corpus sintéticos (ver `corpus.py`) de varios tamaños y mide, sobre
+los mismos archivos y consultas:
+
+- chunking: `build_index.chunk_text` (solution_micaela)
+- build_index: `build_index.build_index` completo y la pasada incremental sin cambios
+- retrieval: `QueryEngine.retrieve` / `retrieve_batch` (lo que usa `retrieve_docs`),
+  backends dense y sparse, latencia p50/p99, consultas/s y recall@k
+- faiss_store: `index_kb.build_and_save_faiss` con MiniLM y `similarity_search`
+  del store guardado frente a `retriever.CascadeRetriever` (candidatos TF-IDF
+  y re-rank MiniLM): latencia, CPU por consulta, recall@k y coincidencia con
+  la búsqueda densa
+- balances: `lookup_balance` (`BalanceStore`), `find_balance` lineal de app.py,
+  `BalanceIndex`, `ColumnarBalanceIndex` y `SqliteBalanceIndex` (find, find_many
+  y scan; la base SQLite se convierte desde el CSV por partes)
+- context: tamaño del prompt de la cadena "stuff" con los k documentos
+  recuperados enteros frente al contexto empaquetado con
+  `context_packing.pack_documents` (`--context-tokens`), si el documento y el
+  texto de la consulta siguen en el contexto y, con `--llm-queries`, la
+  latencia de punta a punta llamando al LLM de `GROQ_API_URL` (p. ej. `mock_groq`)
+- routing: `Router.route`, `Router.route_many` y `classify_question` de query_agent
+
+Los resultados van a un JSON (por defecto `benchmarks/results/<commit>.json`)
+con el commit, la máquina y una fila por medida; `compare.py` compara dos de
+esos archivos y marca las regresiones.
+
+    python benchmarks/run_benchmarks.py --kb-sizes 100,1000 --balance-sizes 10000,1000000
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# solution_micaela is a folder of scripts that import each other by module name
+for path in (BASE_DIR, os.path.join(BASE_DIR, "solution_micaela")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import build_index
+import query_agent
+from corpus import balance_lookups, labeled_queries, synthetic_kb, synthetic_saldos
+from langchain_groq_app import app
+from langchain_groq_app.balance_index import BalanceIndex, ColumnarBalanceIndex, SqliteBalanceIndex, export_columnar, export_sqlite
+from langchain_groq_app.bench_router import corpus as routing_corpus
+from langchain_groq_app.router import ROUTER
+
+
+BENCHES = ("chunking", "build_index", "retrieval", "faiss_store", "context", "balances", "routing")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+@contextlib.contextmanager
+def quiet():
+    # build_index and index_kb report progress with print
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    arr = np.array(latencies) * 1000
+    return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99))}
+
+
+def per_sec(fn: Callable[[], object], count: int, repeat: int = 3) -> float:
+    """Operaciones por segundo de la mejor de `repeat` corridas (la menos afectada por ruido)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return count / best if best > 0 else float("inf")
+
+
+def recall_at_k(hits: List[List[str]], queries) -> float:
+    return float(np.mean([q.source in sources for q, sources in zip(queries, hits)]))
+
+
+def git_info() -> Dict[str, Optional[object]]:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def bench_chunking(docs: Dict[str, str], repeat: int = 3) -> List[dict]:
+    texts = list(docs.values())
+    chars = sum(len(t) for t in texts)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = [c for t in texts for c in build_index.chunk_text(t, max_len=800)]
+    elapsed = (time.perf_counter() - start) / repeat
+    return [{"bench": "chunking", "variant": "chunk_text", "size": len(docs), "chunks": len(chunks),
+             "seconds": elapsed, "chunks_per_sec": len(chunks) / elapsed, "mb_per_sec": chars / 2**20 / elapsed}]
+
+
+def bench_build_index(kb_dir: str, out_dir: str, n_docs: int) -> List[dict]:
+    with quiet():
+        start = time.perf_counter()
+        build_index.build_index(kb_dir, out_dir, backend="all", full=True)
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        build_index.build_index(kb_dir, out_dir, backend="all")
+        noop = time.perf_counter() - start
+    n_chunks = len(query_agent.QueryEngine(out_dir).state()[3])
+    return [{"bench": "build_index", "variant": "all", "size": n_docs, "chunks": n_chunks, "seconds": full,
+             "chunks_per_sec": n_chunks / full, "noop_seconds": noop}]
+
+
+def bench_retrieval(out_dir: str, queries, top_k: int, n_docs: int) -> List[dict]:
+    texts = [q.text for q in queries]
+    rows = []
+    for backend in build_index.BACKENDS:
+        engine = query_agent.QueryEngine(out_dir, backend=backend)
+        start = time.perf_counter()
+        engine.state()
+        load = time.perf_counter() - start
+        latencies, hits = [], []
+        for text in texts:
+            t0 = time.perf_counter()
+            docs = engine.retrieve(text, top_k=top_k)
+            latencies.append(time.perf_counter() - t0)
+            hits.append([d["meta"]["source"] for d in docs])
+        batch_qps = per_sec(lambda: engine.retrieve_batch(texts, top_k=top_k), len(texts))
+        rows.append({"bench": "retrieval", "variant": backend, "size": n_docs, "load_seconds": load,
+                     **latency_stats(latencies), "qps": len(texts) / sum(latencies), "batch_qps": batch_qps,
+                     f"recall_at_{top_k}": recall_at_k(hits, queries)})
+    return rows
+
+
+def timed_search(search: Callable[[str], list], queries) -> Tuple[List[float], float, List[list]]:
+    """Latencias por consulta, CPU total (s) y documentos devueltos por `search` para cada consulta."""
+    latencies, docs = [], []
+    cpu = time.process_time()
+    for q in queries:
+        t0 = time.perf_counter()
+        docs.append(search(q.text))
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.process_time() - cpu, docs
+
+
+def bench_faiss_store(kb_dir: str, out_dir: str, queries, top_k: int, n_docs: int, embeddings,
+                      candidates: int) -> List[dict]:
+    from langchain_groq_app.index_kb import build_and_save_faiss, load_faiss_store
+    from langchain_groq_app.retriever import CascadeRetriever
+
+    with quiet():
+        stats = build_and_save_faiss(kb_dir, out_dir, full=True, embeddings=embeddings)
+    store = load_faiss_store(out_dir, embeddings)
+    latencies, cpu, dense = timed_search(lambda text: store.similarity_search(text, k=top_k), queries)
+    rows = [{"bench": "faiss_store", "variant": "minilm_flat", "size": n_docs, "chunks": stats["chunks"],
+             "seconds": stats["seconds"], "chunks_per_sec": stats["chunks_per_sec"], **latency_stats(latencies),
+             "cpu_ms": cpu / len(queries) * 1000, "qps": len(queries) / sum(latencies),
+             f"recall_at_{top_k}": recall_at_k([[d.metadata["source"] for d in docs] for docs in dense], queries)}]
+
+    start = time.perf_counter()
+    cascade = CascadeRetriever.from_vectorstore(store, k=top_k, candidates=candidates)
+    fit_seconds = time.perf_counter() - start
+    latencies, cpu, found = timed_search(cascade.invoke, queries)
+    # how many of the dense top-k the cascade also returns (1.0 = same results)
+    same = [len({d.page_content for d in a} & {d.page_content for d in b}) / max(1, len(b)) for a, b in zip(found, dense)]
+    rows.append({"bench": "faiss_store", "variant": f"minilm_cascade_{candidates}", "size": n_docs,
+                 "chunks": stats["chunks"], "tfidf_seconds": fit_seconds, **latency_stats(latencies),
+                 "cpu_ms": cpu / len(queries) * 1000, "qps": len(queries) / sum(latencies),
+                 f"recall_at_{top_k}": recall_at_k([[d.metadata["source"] for d in docs] for docs in found], queries),
+                 "recall_vs_dense": float(np.mean(same))})
+    return rows
+
+
+def bench_context(kb_dir: str, out_dir: str, queries, top_k: int, n_docs: int, embeddings, budget: int,
+                  llm_queries: int, built: bool) -> List[dict]:
+    from langchain.chains.retrieval_qa.prompt import PROMPT
+
+    from langchain_groq_app.answer_cache import normalize_question
+    from langchain_groq_app.context_packing import count_tokens, pack_documents
+    from langchain_groq_app.index_kb import build_and_save_faiss, load_faiss_store
+
+    if not built:
+        with quiet():
+            build_and_save_faiss(kb_dir, out_dir, full=True, embeddings=embeddings)
+    store = load_faiss_store(out_dir, embeddings)
+    llm = None
+    if llm_queries:
+        from langchain_groq_app.groq_llm import GroqLLM
+
+        llm = GroqLLM()
+    retrieved = [store.similarity_search(q.text, k=top_k) for q in queries]
+    rows = []
+    for variant, packed in (("stuff", False), (f"packed_{budget}", True)):
+        def prompt_for(text, docs):
+            if packed:
+                docs = pack_documents(text, docs, budget)
+            # what the "stuff" chain sends: the documents separated by blank lines
+            return docs, PROMPT.format(context="\n\n".join(d.page_content for d in docs), question=text)
+
+        pack_seconds, tokens, hits, retained = 0.0, [], [], []
+        for q, docs in zip(queries, retrieved):
+            start = time.perf_counter()
+            docs, prompt = prompt_for(q.text, docs)
+            pack_seconds += time.perf_counter() - start
+            tokens.append(count_tokens(prompt))
+            hits.append([d.metadata["source"] for d in docs])
+            # the query is 8 consecutive words of its document: are they still in the context?
+            retained.append(normalize_question(q.text) in normalize_question(" ".join(d.page_content for d in docs)))
+        row = {"bench": "context", "variant": variant, "size": n_docs, "prompt_tokens": float(np.mean(tokens)),
+               "prompt_tokens_p99": float(np.percentile(tokens, 99)), "pack_ms": pack_seconds / len(queries) * 1000,
+               f"recall_at_{top_k}": recall_at_k(hits, queries), "query_text_retained": float(np.mean(retained))}
+        if llm is not None:
+            # retrieval, packing and the LLM call, one query at a time
+            latencies = []
+            for q in queries[:llm_queries]:
+                start = time.perf_counter()
+                llm.invoke(prompt_for(q.text, store.similarity_search(q.text, k=top_k))[1])
+                latencies.append(time.perf_counter() - start)
+            row.update(latency_stats(latencies))
+        rows.append(row)
+    return rows
+
+
+def bench_balances(csv_path: str, ids: List[str], n_rows: int, lookups: int, linear_lookups: int, tmp: str) -> List[dict]:
+    probes = balance_lookups(ids, lookups)
+    texts = [f"Consultar saldo de la cédula {id_value} por favor" for id_value, _ in probes]
+    rows = []
+
+    def lookup_row(variant, build_seconds, find, probes, scan=None, find_many=None):
+        found = 0
+
+        def run_find():
+            nonlocal found
+            found = sum(find(id_value) is not None for id_value, _ in probes)
+
+        row = {"bench": "balances", "variant": variant, "size": n_rows, "build_seconds": build_seconds,
+               "lookups_per_sec": per_sec(run_find, len(probes)),
+               "hit_rate": found / len(probes)}
+        if scan is not None:
+            row["scans_per_sec"] = per_sec(lambda: [scan(t) for t in texts], len(texts))
+        if find_many is not None:
+            probe_ids = [id_value for id_value, _ in probes]
+            row["bulk_lookups_per_sec"] = per_sec(lambda: find_many(probe_ids), len(probe_ids))
+        rows.append(row)
+
+    store = query_agent.BalanceStore(csv_path)
+    start = time.perf_counter()
+    store.lookup("")
+    lookup_row("lookup_balance", time.perf_counter() - start, store.lookup, probes)
+
+    start = time.perf_counter()
+    df = app.load_balances(csv_path)
+    load = time.perf_counter() - start
+    # the linear scan costs O(rows) per call, so it gets fewer lookups
+    lookup_row("find_balance_linear", load, lambda id_value: app.find_balance(df, id_value), probes[:linear_lookups])
+
+    start = time.perf_counter()
+    index = BalanceIndex(df)
+    lookup_row("balance_index", load + time.perf_counter() - start, index.find, probes, index.scan, index.find_many)
+
+    start = time.perf_counter()
+    export_dir = os.path.join(tmp, "balances_columnar")
+    export_columnar(df, export_dir)
+    columnar = ColumnarBalanceIndex(export_dir)
+    lookup_row("columnar_index", load + time.perf_counter() - start, columnar.find, probes, columnar.scan,
+               columnar.find_many)
+
+    # streams the CSV itself, no DataFrame load
+    start = time.perf_counter()
+    db_path = os.path.join(tmp, "balances.sqlite")
+    export_sqlite(csv_path, db_path)
+    sqlite_index = SqliteBalanceIndex(db_path)
+    lookup_row("sqlite_index", time.perf_counter() - start, sqlite_index.find, probes, sqlite_index.scan,
+               sqlite_index.find_many)
+    return rows
+
+
+def bench_routing(n: int) -> List[dict]:
+    texts = routing_corpus(n)
+    variants = (
+        ("router_route", lambda: [ROUTER.route(t) for t in texts]),
+        ("router_route_many", lambda: ROUTER.route_many(texts)),
+        ("query_agent_classify", lambda: [query_agent.classify_question(t) for t in texts]),
+    )
+    return [{"bench": "routing", "variant": name, "size": n,
+             "routes_per_sec": per_sec(fn, n)} for name, fn in variants]
+
+
+def print_row(row: dict):
+    metrics = " ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                       for k, v in row.items() if k not in ("bench", "variant", "size"))
+    print(f"{row['bench']:>12} {row['variant']:>22} {row['size']:>9}  {metrics}")
+
+
+def run(kb_sizes: List[int], balance_sizes: List[int], n_queries: int, top_k: int, lookups: int,
+        linear_lookups: int, routes: int, benches: List[str], out: Optional[str], candidates: int = 100,
+        context_tokens: int = 300, llm_queries: int = 0) -> dict:
+    results: List[dict] = []
+    meta = {**git_info(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "params": {"kb_sizes": kb_sizes, "balance_sizes": balance_sizes, "queries": n_queries, "top_k": top_k,
+                       "lookups": lookups, "linear_lookups": linear_lookups, "routes": routes,
+                       "candidates": candidates, "context_tokens": context_tokens, "llm_queries": llm_queries}}
+
+    def add(rows: List[dict]):
+        for row in rows:
+            print_row(row)
+            results.append(row)
+
+    embeddings = None
+    if {"faiss_store", "context"} & set(benches):
+        from langchain_groq_app import index_kb
+
+        start = time.perf_counter()
+        # no embedding cache: every build has to run the model
+        embeddings = index_kb.make_encoder(index_kb.EMBEDDING_MODEL, "fp32")
+        embeddings.embed_query("warm-up")
+        meta["model_load_seconds"] = time.perf_counter() - start
+
+    for n_docs in kb_sizes if {"chunking", "build_index", "retrieval", "faiss_store", "context"} & set(benches) else []:
+        with tempfile.TemporaryDirectory() as tmp:
+            kb_dir = os.path.join(tmp, "kb")
+            docs = synthetic_kb(kb_dir, n_docs)
+            queries = labeled_queries(docs, n_queries)
+            index_dir = os.path.join(tmp, "index")
+            if "chunking" in benches:
+                add(bench_chunking(docs))
+            if "build_index" in benches:
+                add(bench_build_index(kb_dir, index_dir, n_docs))
+            elif "retrieval" in benches:
+                with quiet():
+                    build_index.build_index(kb_dir, index_dir, backend="all", full=True)
+            if "retrieval" in benches:
+                add(bench_retrieval(index_dir, queries, top_k, n_docs))
+            if "faiss_store" in benches:
+                add(bench_faiss_store(kb_dir, os.path.join(tmp, "kb_faiss"), queries, top_k, n_docs, embeddings,
+                                      candidates))
+            if "context" in benches:
+                add(bench_context(kb_dir, os.path.join(tmp, "kb_faiss"), queries, top_k, n_docs, embeddings,
+                                  context_tokens, llm_queries, "faiss_store" in benches))
+
+    for n_rows in balance_sizes if "balances" in benches else []:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "saldos.csv")
+            ids = synthetic_saldos(csv_path, n_rows)
+            add(bench_balances(csv_path, ids, n_rows, lookups, linear_lookups, tmp))
+
+    if "routing" in benches:
+        add(bench_routing(routes))
+
+    report = {"meta": meta, "results": results}
+    if out is None:
+        commit = (meta["commit"] or "unknown")[:12] + ("-dirty" if meta["dirty"] else "")
+        out = os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {out}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    def sizes(value: str) -> List[int]:
+        return [int(s) for s in value.split(",") if s]
+
+    p = argparse.ArgumentParser(description="Benchmarks offline de indexado, recuperación, saldos y enrutamiento")
+    p.add_argument("--kb-sizes", type=sizes, default=[100, 1000], help="Cantidades de documentos de la KB sintética")
+    p.add_argument("--balance-sizes", type=sizes, default=[10_000, 100_000, 1_000_000], help="Filas del saldos.csv sintético")
+    p.add_argument("--queries", type=int, default=200, help="Consultas etiquetadas por tamaño de KB")
+    p.add_argument("--top-k", type=int, default=4)
+    p.add_argument("--lookups", type=int, default=20_000, help="Búsquedas de saldo por variante")
+    p.add_argument("--linear-lookups", type=int, default=50, help="Búsquedas para el find_balance lineal")
+    p.add_argument("--routes", type=int, default=20_000, help="Preguntas para el benchmark de enrutamiento")
+    p.add_argument("--candidates", type=int, default=100, help="Candidatos TF-IDF del retriever en cascada")
+    p.add_argument("--context-tokens", type=int, default=300, help="Presupuesto de tokens del contexto empaquetado")
+    p.add_argument("--llm-queries", type=int, default=0,
+                   help="Consultas del benchmark context que además llaman al LLM de GROQ_API_URL (0 = ninguna)")
+    p.add_argument("--benches", default=",".join(BENCHES), help=f"Benchmarks a correr, separados por coma: {', '.join(BENCHES)}")
+    p.add_argument("--out", help="Archivo JSON de salida (por defecto benchmarks/results/<commit>.json)")
+    args = p.parse_args()
+    unknown = set(args.benches.split(",")) - set(BENCHES)
+    if unknown:
+        p.error(f"benchmarks desconocidos: {', '.join(sorted(unknown))}")
+    run(args.kb_sizes, args.balance_sizes, args.queries, args.top_k, args.lookups, args.linear_lookups,
+        args.routes, args.benches.split(","), args.out, args.candidates, args.context_tokens, args.llm_queries)
@@ -0,0 +1,186 @@
+"""Fábrica de índices FAISS exactos y aproximados, con un evaluador de recall y latencia.
+
+Tipos soportados: `flat` (búsqueda exacta), `ivf_flat`, `ivf_pq` y `hnsw`.
+Los índices IVF/PQ se entrenan sobre el corpus ya embebido; `nprobe` y
+`efSearch` se ajustan al consultar con `set_search_params`.
+
+solution_micaela/ann_index.py repite la fábrica y los valores por defecto
+para sus scripts; un arreglo en uno suele hacer falta también en el otro.
+"""
+import time
+from typing import Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# index types an incremental delete would corrupt, so they are always rebuilt:
+# HNSW cannot remove vectors, and IVF indexes are built with positional ids
+# that FAISS.delete leaves in place while it compacts index_to_docstore_id
+NO_REMOVE_TYPES = ("hnsw", "ivf_flat", "ivf_pq")
+# below this many vectors training IVF/PQ is meaningless; fall back to flat
+MIN_TRAIN_VECTORS = 256
+
+
+def default_nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, keeping at least 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    # largest number of sub-quantizers with at least 8 dims each that divides dim
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def default_pq_nbits(n: int) -> int:
+    return int(min(8, max(4, np.floor(np.log2(max(n, 2) / 39)))))
+
+
+def factory_string(kind: str, dim: int, n: int, nlist: Optional[int] = None, pq_m: Optional[int] = None, hnsw_m: int = 32) -> str:
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return f"HNSW{hnsw_m}"
+    nlist = nlist or default_nlist(n)
+    if kind == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if kind == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m or default_pq_m(dim)}x{default_pq_nbits(n)}"
+    raise ValueError(f"Tipo de índice desconocido: {kind!r}. Opciones: {', '.join(INDEX_TYPES)}")
+
+
+def make_index(kind: str, dim: int, n: int, metric: int = faiss.METRIC_L2, id_map: bool = False, **opts) -> faiss.Index:
+    """Crea un índice vacío (sin entrenar) del tipo pedido para `n` vectores de dimensión `dim`.
+
+    Con `id_map=True` el índice acepta `add_with_ids`; IVF lo soporta de forma
+    nativa y flat/HNSW se envuelven en IDMap2.
+    """
+    if kind != "flat" and n < MIN_TRAIN_VECTORS:
+        print(f"Sólo {n} vectores: se usa un índice flat en lugar de {kind}")
+        kind = "flat"
+    desc = factory_string(kind, dim, n, **opts)
+    if id_map and kind in ("flat", "hnsw"):
+        desc = "IDMap2," + desc
+    return faiss.index_factory(dim, desc, metric)
+
+
+def build_ann_index(kind: str, vectors: np.ndarray, metric: int = faiss.METRIC_L2, ids: Optional[np.ndarray] = None, **opts) -> faiss.Index:
+    """Crea, entrena sobre `vectors` y llena un índice del tipo pedido."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = make_index(kind, vectors.shape[1], len(vectors), metric, id_map=ids is not None, **opts)
+    if not index.is_trained:
+        index.train(vectors)
+    if ids is None:
+        index.add(vectors)
+    else:
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Ajusta nprobe (IVF) y efSearch (HNSW); se ignoran los que no aplican al índice."""
+    ps = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            ps.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+
+def search_grid(kind: str, nprobes: Iterable[int], ef_searches: Iterable[int]) -> List[Dict[str, int]]:
+    if kind.startswith("ivf"):
+        return [{"nprobe": v} for v in nprobes]
+    if kind == "hnsw":
+        return [{"ef_search": v} for v in ef_searches]
+    return [{}]
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, kinds: Iterable[str] = INDEX_TYPES, k: int = 4,
+             metric: int = faiss.METRIC_L2, nprobes: Iterable[int] = (1, 4, 16, 64),
+             ef_searches: Iterable[int] = (16, 64, 256)) -> List[dict]:
+    """Mide recall@k contra la búsqueda exacta, latencia p50/p99 por consulta y tamaño de cada índice."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    truth = build_ann_index("flat", vectors, metric).search(queries, k)[1]
+    rows = []
+    for kind in kinds:
+        start = time.perf_counter()
+        index = build_ann_index(kind, vectors, metric)
+        build_s = time.perf_counter() - start
+        size = faiss.serialize_index(index).nbytes
+        for params in search_grid(kind, nprobes, ef_searches):
+            set_search_params(index, **params)
+            lat = []
+            for q in queries:
+                t0 = time.perf_counter()
+                index.search(q[None, :], k)
+                lat.append(time.perf_counter() - t0)
+            found = index.search(queries, k)[1]
+            recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+            rows.append({
+                "index": kind,
+                "params": params,
+                f"recall@{k}": float(recall),
+                "p50_ms": float(np.percentile(lat, 50) * 1000),
+                "p99_ms": float(np.percentile(lat, 99) * 1000),
+                "size_bytes": int(size),
+                "build_s": build_s,
+            })
+    return rows
+
+
+def print_report(rows: List[dict]):
+    recall_key = next(key for key in rows[0] if key.startswith("recall@"))
+    print(f"{'índice':>9} {'params':>16} {recall_key:>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'tamaño (KB)':>12} {'build (s)':>9}")
+    for r in rows:
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items()) or "-"
+        print(f"{r['index']:>9} {params:>16} {r[recall_key]:>10.3f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} "
+              f"{r['size_bytes'] / 1024:>12.1f} {r['build_s']:>9.2f}")
+
+
+def load_vectors(store_dir: Optional[str], vectors_path: Optional[str], synthetic: int, dim: int) -> np.ndarray:
+    if vectors_path:
+        return np.load(vectors_path).astype("float32")
+    if store_dir:
+        index = faiss.read_index(f"{store_dir}/index.faiss")
+        return index.reconstruct_n(0, index.ntotal)
+    rng = np.random.default_rng(0)
+    # clustered synthetic data behaves closer to real embeddings than uniform noise
+    centers = rng.normal(size=(max(1, synthetic // 100), dim))
+    data = centers[rng.integers(0, len(centers), synthetic)] + 0.3 * rng.normal(size=(synthetic, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype("float32")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser(description="Evalúa recall@k, latencia y tamaño de índices FAISS frente a la búsqueda exacta")
+    p.add_argument("--store", help="Directorio de un índice LangChain FAISS (p. ej. kb_faiss)")
+    p.add_argument("--vectors", help="Archivo .npy con los vectores (p. ej. solution_micaela/index/embeddings.npy)")
+    p.add_argument("--synthetic", type=int, default=20000, help="Cantidad de vectores sintéticos si no se indica --store/--vectors")
+    p.add_argument("--dim", type=int, default=384, help="Dimensión de los vectores sintéticos")
+    p.add_argument("--metric", choices=["l2", "ip"], default="l2", help="l2 para kb_faiss, ip para el índice TF-IDF")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--types", default=",".join(INDEX_TYPES))
+    p.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    args = p.parse_args()
+
+    data = load_vectors(args.store, args.vectors, args.synthetic, args.dim)
+    rng = np.random.default_rng(1)
+    # queries are perturbed corpus vectors, so they have true near neighbours but are not exact copies
+    picks = data[rng.integers(0, len(data), args.queries)]
+    qs = (picks + 0.05 * rng.normal(size=picks.shape) * np.abs(picks).mean()).astype("float32")
+    metric = faiss.METRIC_INNER_PRODUCT if args.metric == "ip" else faiss.METRIC_L2
+    results = evaluate(data, qs, args.types.split(","), args.k, metric)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,143 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas, sin tildes, sin signos de puntuación y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+class AnswerCache:
+    """Caché de respuestas delante de QA_CHAIN y del LLM.
+
+    Primero busca la pregunta normalizada tal cual; si no está y hay
+    `embeddings`, busca la pregunta cacheada más parecida en un índice FAISS
+    (producto interno sobre vectores normalizados = coseno) y la acepta si
+    supera `threshold`. Las entradas se agrupan por ruta (`kb`, `llm`) para que
+    una pregunta nunca reciba la respuesta de otra ruta. Vencen a los `ttl`
+    segundos y, al llenarse, se desaloja la menos usada (LRU). `embeddings`
+    puede asignarse más tarde (p. ej. cuando termina de cargar el vectorstore);
+    hasta entonces sólo hay búsqueda exacta.
+    """
+
+    def __init__(self, embeddings=None, capacity: int = 1000, ttl: float = 3600.0, threshold: float = 0.92):
+        self.embeddings = embeddings
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        # (route, normalized question) -> (id, answer, created, cost_s)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._keys = {}
+        self._next_id = 0
+        self._index = None  # faiss.IndexIDMap2, created with the first embedded question
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        import faiss
+
+        vec = np.asarray([self.embeddings.embed_query(text)], dtype="float32")
+        faiss.normalize_L2(vec)
+        return vec
+
+    def _drop(self, key: Tuple[str, str]):
+        entry_id = self._entries.pop(key)[0]
+        del self._keys[entry_id]
+        if self._index is not None:
+            self._index.remove_ids(np.asarray([entry_id], dtype="int64"))
+
+    def _alive(self, key: Tuple[str, str], now: float) -> bool:
+        if now - self._entries[key][2] <= self.ttl:
+            return True
+        self._drop(key)
+        return False
+
+    def _hit(self, key: Tuple[str, str]) -> str:
+        self._entries.move_to_end(key)
+        entry = self._entries[key]
+        self.saved_seconds += entry[3]
+        return entry[1]
+
+    def get(self, route: str, text: str) -> Optional[str]:
+        """Devuelve la respuesta cacheada para `text` en `route`, o None."""
+        key = (route, normalize_question(text))
+        now = time.time()
+        with self._lock:
+            if key in self._entries and self._alive(key, now):
+                self.exact_hits += 1
+                return self._hit(key)
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+        vec = self._embed(key[1])
+        with self._lock:
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(vec, min(8, self._index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if score < self.threshold:
+                        break
+                    near = self._keys.get(int(entry_id))
+                    if near is not None and near[0] == route and self._alive(near, now):
+                        self.semantic_hits += 1
+                        return self._hit(near)
+            self.misses += 1
+            return None
+
+    def put(self, route: str, text: str, answer: str, cost_s: float):
+        """Guarda `answer`; `cost_s` es lo que tardó en generarse (para medir el ahorro)."""
+        if self.capacity <= 0:
+            return
+        key = (route, normalize_question(text))
+        vec = self._embed(key[1])
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.capacity:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[key] = (entry_id, answer, time.time(), cost_s)
+            self._keys[entry_id] = key
+            if vec is not None:
+                if self._index is None:
+                    import faiss
+
+                    self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+                self._index.add_with_ids(vec, np.asarray([entry_id], dtype="int64"))
+
+    def invalidate(self, route: Optional[str] = None) -> int:
+        """Borra las entradas de `route` (todas si es None); devuelve cuántas se borraron."""
+        with self._lock:
+            stale = [k for k in self._entries if route is None or k[0] == route]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -1,30 +1,40 @@
 import os
-import re
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
+from langchain_groq_app.router import ROUTER
 
-from langchain_groq_app.groq_llm import GroqLLM
+# langchain, pandas and the embedding model are imported by load_resources(),
+# which runs in the background while the prompt is already shown
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 KB_INDEX_DIR = "kb_faiss"
 DATA_CSV = "data/saldos.csv"
+# memory: load the CSV with pandas into a balance_index.BalanceIndex;
+# sqlite: look balances up in an on-disk database built from the CSV by parts
+# (balance_index.open_sqlite) instead of loading it into a DataFrame
+BALANCES_BACKEND = os.environ.get("BALANCES_BACKEND", "memory")
+BALANCES_DB_DIR = os.environ.get("BALANCES_DB_DIR", "balances_db")
 
 
 def load_vectorstore(index_dir: str = KB_INDEX_DIR):
-    emb = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    idx = Path(index_dir)
+    from langchain_groq_app.index_generations import current_index_dir
+    from langchain_groq_app.index_kb import get_embeddings, load_faiss_store
+
+    # ENCODER_BACKEND / ENCODER_THREADS pick the MiniLM backend (see encoders)
+    emb = get_embeddings()
+    idx = current_index_dir(index_dir)
     if not idx.exists():
         raise FileNotFoundError(f"Índice FAISS no encontrado en {idx}. Ejecuta index_kb primero.")
-    return FAISS.load_local(str(idx), emb)
+    return load_faiss_store(str(idx), emb)
+
 
+def load_balances(csv_path: str = DATA_CSV) -> "pd.DataFrame":
+    import pandas as pd
 
-def load_balances(csv_path: str = DATA_CSV) -> pd.DataFrame:
     p = Path(csv_path)
     if not p.exists():
         raise FileNotFoundError(f"CSV de saldos no encontrado en {p}")
@@ -34,7 +44,27 @@ def load_balances(csv_path: str = DATA_CSV) -> pd.DataFrame:
     return df
 
 
-def find_balance(df: pd.DataFrame, id_value: str) -> Optional[str]:
+def load_balance_index(csv_path: str = DATA_CSV):
+    """Índice de IDs del CSV de saldos según BALANCES_BACKEND.
+
+    `memory` devuelve un `BalanceIndex` sobre el DataFrame y `sqlite` un
+    `SqliteBalanceIndex` (ver `balance_index.open_sqlite`); los dos responden
+    `find(id)` igual.
+    """
+    if BALANCES_BACKEND == "sqlite":
+        from langchain_groq_app.balance_index import open_sqlite
+
+        if not Path(csv_path).exists():
+            raise FileNotFoundError(f"CSV de saldos no encontrado en {csv_path}")
+        return open_sqlite(csv_path, BALANCES_DB_DIR)
+    from langchain_groq_app.balance_index import BalanceIndex
+
+    return BalanceIndex(load_balances(csv_path))
+
+
+def find_balance(df: "pd.DataFrame", id_value: str) -> Optional[str]:
+    """Búsqueda lineal en el DataFrame; el CLI usa `load_balance_index` y ésta
+    queda como referencia para benchmarks/run_benchmarks.py."""
     # columns that might identify the ID
     id_cols = [c for c in df.columns if any(k in c for k in ("id", "cedula", "dni", "document"))]
     if not id_cols:
@@ -50,43 +80,11 @@ def find_balance(df: pd.DataFrame, id_value: str) -> Optional[str]:
     return None
 
 
-def is_balance_query(text: str) -> Optional[str]:
-    # simple heuristics: contains palabra 'saldo' or 'balance' and un numero/ID
-    if re.search(r"\bsaldo\b|\bbalance\b|saldo de la|saldo para|consultar saldo", text, re.I):
-        # try to extract ID-like token (numbers with 6-12 digits or alphanum)
-        m = re.search(r"(\d{6,12})", text)
-        if m:
-            return m.group(1)
-        # or extract token after 'cedula' or 'id'
-        m2 = re.search(r"\b(?:cedula|cédula|dni|id)[:\s]*([A-Za-z0-9\-]+)", text, re.I)
-        if m2:
-            return m2.group(1)
-    return None
-
-
-def is_kb_query(text: str) -> bool:
-    kb_terms = [
-        "abrir cuenta",
-        "apertura de cuenta",
-        "transferencia",
-        "hacer una transferencia",
-        "deposito",
-        "depósito",
-        "tarjeta",
-        "cheque",
-        "requisitos",
-        "documentos",
-    ]
-    for t in kb_terms:
-        if t in text.lower():
-            return True
-    return False
-
+def load_resources():
+    """Carga índice, saldos, LLM y cadena QA; devuelve (balances, llm, qa_chain).
 
-def main_loop():
-    print("Iniciando aplicación LangChain + Groq (CLI). Escribe 'salir' para terminar.")
-
-    # prepare resources
+    `balances` es el índice de IDs de `load_balance_index`.
+    """
     try:
         vectorstore = load_vectorstore()
         retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
@@ -95,17 +93,29 @@ def main_loop():
         retriever = None
 
     try:
-        df = load_balances()
+        balances = load_balance_index()
     except Exception as e:
         print("Advertencia: no se pudo cargar CSV de saldos:", e)
-        df = None
+        balances = None
+
+    from langchain_groq_app.groq_llm import GroqLLM
 
     llm_model = os.environ.get("GROQ_MODEL", "groq-1")
     llm = GroqLLM(model=llm_model)
 
     qa_chain = None
     if retriever:
+        from langchain.chains import RetrievalQA
+
         qa_chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=retriever)
+    return balances, llm, qa_chain
+
+
+def main_loop():
+    print("Iniciando aplicación LangChain + Groq (CLI). Escribe 'salir' para terminar.")
+
+    # prepare resources while the user types the first question
+    loader = ThreadPoolExecutor(max_workers=1).submit(load_resources)
 
     while True:
         user = input("\nPregunta> ")
@@ -114,11 +124,14 @@ def main_loop():
         if user.strip().lower() in {"salir", "exit", "quit"}:
             print("Adiós")
             break
+        balances, llm, qa_chain = loader.result()
+
+        route = ROUTER.route(user)
 
         # 1) Balance query
-        bal_id = is_balance_query(user)
-        if bal_id and df is not None:
-            res = find_balance(df, bal_id)
+        bal_id = route.balance_id
+        if bal_id and balances is not None:
+            res = balances.find(bal_id)
             if res:
                 print("[Respuesta - Balance]")
                 print(res)
@@ -128,7 +141,7 @@ def main_loop():
                 continue
 
         # 2) KB query
-        if is_kb_query(user) and qa_chain is not None:
+        if route.kb and qa_chain is not None:
             print("[Respuesta - Base de Conocimientos] Recuperando documentos relevantes...")
             answer = qa_chain.run(user)
             print(answer)
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# pandas is only needed to build an index from a DataFrame; workers that open
+# an existing columnar export never import it
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+ID_COLUMN_KEYS = ("id", "cedula", "dni", "document")
+BALANCE_COLUMN_KEYS = ("balance", "saldo", "amount", "monto")
+NO_BALANCE = "(saldo no disponible)"
+COLUMNAR_VERSION = 1
+SQLITE_VERSION = 2
+# rows per pandas chunk when streaming the CSV into SQLite
+SQLITE_CHUNK_ROWS = 100_000
+# bound parameters per "IN (...)" query, below SQLite's historical 999 limit
+SQLITE_BATCH = 500
+
+
+def id_columns(df: "pd.DataFrame") -> List[str]:
+    return [c for c in df.columns if any(k in c for k in ID_COLUMN_KEYS)]
+
+
+def balance_columns(df: "pd.DataFrame") -> List[str]:
+    return [c for c in df.columns if any(k in c for k in BALANCE_COLUMN_KEYS)]
+
+
+class BalanceIndex:
+    """Hash index over every ID column of the balances DataFrame.
+
+    It is compiled once when the CSV is (re)loaded. `find` is a dict lookup and
+    `scan` finds every known ID contained in a text by hashing the text windows
+    whose length matches some ID length, so its cost grows with the length of
+    the text (times the handful of distinct ID lengths) and not with the number
+    of customers.
+    """
+
+    def __init__(self, df: "pd.DataFrame"):
+        self.id_cols = id_columns(df)
+        bal_cols = balance_columns(df)
+        bals = df[bal_cols[0]].tolist() if bal_cols else None
+        # normalized ID -> (rank, column, balance); rank keeps the column/row order
+        # of the original linear scan so the same row wins on duplicates
+        self._ids: Dict[str, Tuple[int, str, object]] = {}
+        rank = 0
+        for col in self.id_cols:
+            for row, key in enumerate(df[col].astype(str).str.strip().tolist()):
+                if key and key not in self._ids:
+                    bal = bals[row] if bals is not None else NO_BALANCE
+                    self._ids[key] = (rank, col, bal)
+                rank += 1
+        self._lengths = sorted({len(k) for k in self._ids}, reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def find(self, id_value: str) -> Optional[str]:
+        hit = self._ids.get(id_value.strip())
+        if hit is None:
+            return None
+        _, col, bal = hit
+        return f"ID encontrado en columna '{col}'. Saldo: {bal}"
+
+    def find_many(self, id_values: Sequence[str]) -> List[Optional[str]]:
+        return [self.find(v) for v in id_values]
+
+    def scan(self, text: str) -> List[str]:
+        """Devuelve los IDs conocidos presentes en `text`, en el orden del CSV."""
+        found = {}
+        ids = self._ids
+        n = len(text)
+        for length in self._lengths:
+            for start in range(n - length + 1):
+                key = text[start:start + length]
+                hit = ids.get(key)
+                if hit is not None:
+                    found[key] = hit[0]
+        return sorted(found, key=found.__getitem__)
+
+
+def export_columnar(df: "pd.DataFrame", out_dir: str):
+    """Escribe el índice de IDs de `df` como columnas numpy de sólo lectura para `ColumnarBalanceIndex`.
+
+    `keys.npy` tiene los IDs normalizados ordenados (UTF-8 de ancho fijo) y
+    `ranks.npy`, `columns.npy` y `balances.npy` están alineados con ellos.
+    `meta.json` va al final: un directorio sin él está incompleto.
+    """
+    index = BalanceIndex(df)
+    keys = sorted(index._ids)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    hits = [index._ids[k] for k in keys]
+    columns = index.id_cols
+    np.save(out / "keys.npy", np.array([k.encode("utf-8") for k in keys], dtype="S"))
+    np.save(out / "ranks.npy", np.array([h[0] for h in hits], dtype="int64"))
+    np.save(out / "columns.npy", np.array([columns.index(h[1]) for h in hits], dtype="int16"))
+    from pandas.api.types import is_numeric_dtype
+
+    bal_cols = balance_columns(df)
+    if bal_cols and is_numeric_dtype(df[bal_cols[0]]):
+        balances = np.array([h[2] for h in hits], dtype=df[bal_cols[0]].dtype)
+    else:
+        balances = np.array([str(h[2]).encode("utf-8") for h in hits], dtype="S")
+    np.save(out / "balances.npy", balances)
+    meta = {"version": COLUMNAR_VERSION, "columns": list(df.columns), "id_columns": columns,
+            "lengths": index._lengths}
+    with open(out / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+class ColumnarBalanceIndex:
+    """La misma interfaz que `BalanceIndex`, sobre columnas numpy mapeadas con mmap.
+
+    Los workers de uvicorn que abren el mismo directorio comparten las páginas
+    en el page cache del sistema en lugar de tener cada uno su DataFrame y su
+    dict. `find` es una búsqueda binaria (`searchsorted`) sobre los IDs
+    ordenados y `scan` busca todas las ventanas del texto en una sola llamada.
+    """
+
+    def __init__(self, index_dir: str):
+        d = Path(index_dir)
+        with open(d / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.columns: List[str] = meta["columns"]
+        self.id_cols: List[str] = meta["id_columns"]
+        self._lengths: List[int] = meta["lengths"]
+        # plain ndarray views of the maps: np.memmap adds overhead to every operation
+        self._keys = np.asarray(np.load(d / "keys.npy", mmap_mode="r"))
+        self._ranks = np.asarray(np.load(d / "ranks.npy", mmap_mode="r"))
+        self._cols = np.asarray(np.load(d / "columns.npy", mmap_mode="r"))
+        self._balances = np.asarray(np.load(d / "balances.npy", mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _positions(self, keys: List[bytes]) -> np.ndarray:
+        # position of every key in self._keys, or -1
+        width = self._keys.dtype.itemsize
+        # numpy "S" strings drop trailing NULs; longer keys cannot be stored IDs
+        keys = [k if len(k) <= width and not k.endswith(b"\0") else b"" for k in keys]
+        if not len(self._keys):
+            return np.full(len(keys), -1)
+        # same dtype as the column, or searchsorted casts the whole column on every call
+        arr = np.array(keys, dtype=self._keys.dtype)
+        pos = np.minimum(np.searchsorted(self._keys, arr), len(self._keys) - 1)
+        return np.where((self._keys[pos] == arr) & (arr != b""), pos, -1)
+
+    def _answer(self, pos: int) -> Optional[str]:
+        if pos < 0:
+            return None
+        bal = self._balances[pos]
+        bal = bal.decode("utf-8") if isinstance(bal, bytes) else bal.item()
+        return f"ID encontrado en columna '{self.id_cols[self._cols[pos]]}'. Saldo: {bal}"
+
+    def find(self, id_value: str) -> Optional[str]:
+        return self._answer(int(self._positions([id_value.strip().encode("utf-8")])[0]))
+
+    def find_many(self, id_values: Sequence[str]) -> List[Optional[str]]:
+        """Como `find` para cada ID, con una sola búsqueda binaria vectorizada."""
+        if not id_values:
+            return []
+        pos = self._positions([v.strip().encode("utf-8") for v in id_values])
+        return [self._answer(int(p)) for p in pos]
+
+    def scan(self, text: str) -> List[str]:
+        """Devuelve los IDs conocidos presentes en `text`, en el orden del CSV."""
+        windows = list(dict.fromkeys(
+            text[start:start + length]
+            for length in self._lengths
+            for start in range(len(text) - length + 1)
+        ))
+        if not windows:
+            return []
+        pos = self._positions([w.encode("utf-8") for w in windows])
+        found = {w: int(self._ranks[p]) for w, p in zip(windows, pos) if p >= 0}
+        return sorted(found, key=found.__getitem__)
+
+
+def csv_signature(csv_path: str, version: int = COLUMNAR_VERSION) -> str:
+    st = os.stat(csv_path)
+    raw = f"{os.path.abspath(csv_path)}|{st.st_mtime_ns}|{st.st_size}|{version}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def open_columnar(csv_path: str, root: str) -> ColumnarBalanceIndex:
+    """Abre la exportación columnar de `csv_path` bajo `root`, creándola si el CSV cambió.
+
+    Cada versión del CSV va a su propio subdirectorio, así que varios workers
+    que arrancan a la vez pueden exportar en paralelo: el primero que renombra
+    su directorio temporal gana y los demás descartan el suyo.
+    """
+    target = Path(root) / csv_signature(csv_path)
+    if not (target / "meta.json").exists():
+        import pandas as pd
+
+        tmp = Path(root) / f".{target.name}.{os.getpid()}"
+        df = pd.read_csv(csv_path)
+        df.columns = [c.strip().lower() for c in df.columns]
+        export_columnar(df, str(tmp))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # another worker published the same export first
+            shutil.rmtree(tmp, ignore_errors=True)
+        # exports of older CSV versions; workers still mapping them keep their pages
+        for old in Path(root).iterdir():
+            if old.is_dir() and old.name != target.name and not old.name.startswith("."):
+                shutil.rmtree(old, ignore_errors=True)
+    return ColumnarBalanceIndex(str(target))
+
+
+def export_sqlite(csv_path: str, db_path: str, chunk_rows: int = SQLITE_CHUNK_ROWS):
+    """Convierte `csv_path` en una base SQLite indexada por ID normalizado, sin cargar el CSV entero.
+
+    El CSV se lee de a `chunk_rows` filas y cada fila se inserta una vez por
+    columna de ID en una tabla `WITHOUT ROWID` cuya clave primaria es el ID,
+    así que la memoria usada no depende del tamaño del archivo. Ante IDs
+    repetidos gana la misma fila que en `BalanceIndex` (primera columna de ID,
+    luego primera fila). La fila completa se guarda una sola vez en JSON en
+    la tabla `records` y los IDs la referencian por número de fila.
+    """
+    import pandas as pd
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    # a partial file is thrown away on failure, so durability is not needed while building
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE records (row INTEGER PRIMARY KEY, record TEXT)")
+    conn.execute("CREATE TABLE ids (key TEXT PRIMARY KEY, col INTEGER, row INTEGER, balance) WITHOUT ROWID")
+    upsert = ("INSERT INTO ids VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET col = excluded.col, "
+              "row = excluded.row, balance = excluded.balance WHERE excluded.col < ids.col")
+    header: List[str] = []
+    id_cols: List[str] = []
+    lengths = set()
+    float_balances = False
+    first_row = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if not header:
+            header = [c.strip() for c in chunk.columns]
+        chunk.columns = header
+        # one JSON object per line with the original column names; pandas turns
+        # numpy scalars and NaN into plain JSON values
+        records = chunk.to_json(orient="records", lines=True, force_ascii=False).splitlines()
+        conn.executemany("INSERT INTO records VALUES (?, ?)", ((first_row + r, rec) for r, rec in enumerate(records)))
+        chunk.columns = [c.lower() for c in header]
+        id_cols = id_columns(chunk)
+        bal_cols = balance_columns(chunk)
+        if bal_cols:
+            bals = chunk[bal_cols[0]]
+            # pandas infers dtypes per chunk; a float anywhere makes the whole column float, as in read_csv
+            float_balances = float_balances or bals.dtype.kind == "f"
+            bals = bals.tolist()
+        else:
+            bals = [NO_BALANCE] * len(chunk)
+        for ci, col in enumerate(id_cols):
+            keys = chunk[col].astype(str).str.strip().tolist()
+            lengths.update(len(k) for k in keys if k)
+            # sorted by key, consecutive inserts land on neighbouring B-tree pages
+            order = sorted((k, r) for r, k in enumerate(keys) if k)
+            conn.executemany(upsert, ((k, ci, first_row + r, bals[r]) for k, r in order))
+        first_row += len(chunk)
+    meta = {"version": SQLITE_VERSION, "header": header, "columns": [c.lower() for c in header], "id_columns": id_cols,
+            "lengths": sorted(lengths, reverse=True), "float_balances": float_balances, "rows": first_row}
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", ((k, json.dumps(v, ensure_ascii=False)) for k, v in meta.items()))
+    conn.commit()
+    conn.close()
+
+
+class SqliteBalanceIndex:
+    """La misma interfaz que `BalanceIndex` sobre la base de `export_sqlite`, para CSVs que no entran en memoria.
+
+    `find` es una búsqueda en el B-tree de la clave primaria y `find_many` y
+    `scan` consultan todos sus IDs en lotes de `IN (...)`. Cada hilo usa su
+    propia conexión de sólo lectura; la memoria es la caché de páginas de
+    SQLite, no el tamaño del archivo.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        meta = {name: json.loads(value) for name, value in self._conn().execute("SELECT name, value FROM meta")}
+        self.header: List[str] = meta["header"]
+        self.columns: List[str] = meta["columns"]
+        self.id_cols: List[str] = meta["id_columns"]
+        self._lengths: List[int] = meta["lengths"]
+        self._float_balances: bool = meta["float_balances"]
+        self.rows: int = meta["rows"]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+            conn = self._local.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def _rows(self, keys: Sequence[str], fields: str) -> Dict[str, tuple]:
+        conn = self._conn()
+        out = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), SQLITE_BATCH):
+            batch = unique[i:i + SQLITE_BATCH]
+            query = f"SELECT key, {fields} FROM ids WHERE key IN ({','.join('?' * len(batch))})"
+            for row in conn.execute(query, batch):
+                out[row[0]] = row[1:]
+        return out
+
+    def _answer(self, hit: Optional[tuple]) -> Optional[str]:
+        if hit is None:
+            return None
+        col, bal = hit
+        if self._float_balances and isinstance(bal, int):
+            bal = float(bal)
+        # SQLite stores NaN as NULL
+        bal = float("nan") if bal is None else bal
+        return f"ID encontrado en columna '{self.id_cols[col]}'. Saldo: {bal}"
+
+    def find(self, id_value: str) -> Optional[str]:
+        hit = self._conn().execute("SELECT col, balance FROM ids WHERE key = ?", (id_value.strip(),)).fetchone()
+        return self._answer(hit)
+
+    def find_many(self, id_values: Sequence[str]) -> List[Optional[str]]:
+        keys = [v.strip() for v in id_values]
+        hits = self._rows(keys, "col, balance")
+        return [self._answer(hits.get(k)) for k in keys]
+
+    def record(self, id_value: str) -> Optional[dict]:
+        """La fila del CSV del ID, con los nombres de columna originales."""
+        hit = self._conn().execute("SELECT records.record FROM ids JOIN records ON records.row = ids.row WHERE key = ?",
+                                   (id_value.strip(),)).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def scan(self, text: str) -> List[str]:
+        """Devuelve los IDs conocidos presentes en `text`, en el orden del CSV."""
+        windows = [text[start:start + length] for length in self._lengths for start in range(len(text) - length + 1)]
+        found = self._rows(windows, "col, row")
+        return sorted(found, key=found.__getitem__)
+
+
+def open_sqlite(csv_path: str, root: str) -> SqliteBalanceIndex:
+    """Abre la base SQLite de `csv_path` bajo `root`, convirtiendo el CSV si cambió (ver `open_columnar`).
+
+    solution_micaela/balance_db.py publica su base de la misma forma; un
+    arreglo en uno suele hacer falta también en el otro.
+    """
+    target = Path(root) / f"{csv_signature(csv_path, SQLITE_VERSION)}.sqlite"
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.parent / f".{target.name}.{os.getpid()}"
+        export_sqlite(csv_path, str(tmp))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # another worker published the same database first
+            tmp.unlink()
+        # bases of older CSV versions; on POSIX open connections keep reading the unlinked file
+        for old in target.parent.glob("*.sqlite"):
+            if old.name != target.name:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+    return SqliteBalanceIndex(str(target))
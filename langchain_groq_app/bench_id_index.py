@@ -0,0 +1,72 @@
+"""Benchmark del escaneo de IDs de /query: búsqueda lineal vs BalanceIndex.
+
+Genera DataFrames sintéticos de saldos de distintos tamaños y mide, para una
+pregunta sin ID (el caso KB/LLM, que antes recorría todo el CSV), el costo por
+consulta de ambos métodos.
+"""
+import time
+from typing import List
+
+import pandas as pd
+
+from langchain_groq_app.balance_index import BalanceIndex, id_columns
+
+
+QUERIES = [
+    "¿Qué documentos se necesitan para abrir cuenta?",
+    "¿Cómo hago una transferencia internacional desde mi cuenta de ahorros?",
+    "Consultar saldo del cliente V-10000042",
+]
+
+
+def synthetic_balances(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "id_cedula": [f"V-{10000000 + i}" for i in range(n_rows)],
+        "nombre": [f"Cliente {i}" for i in range(n_rows)],
+        "balance": [round(i * 1.37, 2) for i in range(n_rows)],
+    })
+
+
+def linear_scan(df: pd.DataFrame, text: str) -> List[str]:
+    # the per-request scan server.query used before BalanceIndex
+    found = []
+    for col in id_columns(df):
+        for val in df[col].astype(str).tolist():
+            if val and val in text:
+                found.append(val)
+    return found
+
+
+def time_per_call(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes: List[int], linear_max: int, repeat: int):
+    print(f"{'filas':>10} {'build (ms)':>12} {'lineal (ms)':>12} {'índice (us)':>12}")
+    for n in sizes:
+        df = synthetic_balances(n)
+        start = time.perf_counter()
+        index = BalanceIndex(df)
+        build = time.perf_counter() - start
+
+        indexed = sum(time_per_call(index.scan, q, repeat) for q in QUERIES) / len(QUERIES)
+        if n <= linear_max:
+            linear = sum(time_per_call(lambda t: linear_scan(df, t), q, 1) for q in QUERIES) / len(QUERIES)
+            linear_str = f"{linear * 1000:12.2f}"
+        else:
+            linear_str = f"{'-':>12}"
+        print(f"{n:>10} {build * 1000:12.1f} {linear_str} {indexed * 1e6:12.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Compara el escaneo lineal de IDs con BalanceIndex")
+    p.add_argument("--sizes", default="1000,10000,100000,1000000", help="Tamaños de CSV separados por coma")
+    p.add_argument("--linear_max", type=int, default=100000, help="Tamaño máximo para medir el escaneo lineal")
+    p.add_argument("--repeat", type=int, default=200, help="Repeticiones por consulta para el índice")
+    args = p.parse_args()
+    run([int(s) for s in args.sizes.split(",")], args.linear_max, args.repeat)
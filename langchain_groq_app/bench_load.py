@@ -0,0 +1,192 @@
+"""Generador de carga de punta a punta contra /query con una mezcla de preguntas de saldo, KB y generales.
+
+Pensado para correr contra el servidor apuntando al stub `mock_groq`, así la
+capacidad medida es la del servidor y no la de la API de Groq:
+
+    python -m langchain_groq_app.mock_groq --port 9000 --latency lognormal --error_rate 0.01
+    $env:GROQ_API_URL = "http://127.0.0.1:9000/v1"; $env:ANSWER_CACHE_SIZE = "0"
+    uvicorn langchain_groq_app.server:app --port 8000
+    python -m langchain_groq_app.bench_load --url http://127.0.0.1:8000 --concurrency 32 --duration 30
+
+Con `--concurrency N` (lazo cerrado) hay siempre N pedidos en vuelo; con
+`--rate R` (lazo abierto) los pedidos llegan como un proceso de Poisson de R
+por segundo sin importar cuánto tarden las respuestas, que es lo que muestra
+cómo crece la latencia cerca de la saturación. Informa throughput y latencia
+p50/p95/p99 por ruta (el `source` de la respuesta: balance, kb o llm) y los
+errores por tipo de pregunta y código HTTP.
+"""
+import asyncio
+import csv
+import json
+import random
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from langchain_groq_app.balance_index import ID_COLUMN_KEYS
+from langchain_groq_app.bench_router import BALANCE_TEMPLATES, GENERAL_TEMPLATES, KB_TEMPLATES
+
+
+KINDS = ("balance", "kb", "general")
+# varied openings and closings, so identical in-flight questions (which the
+# server coalesces) stay rare and every request does its own work
+PREFIXES = ["", "Hola, ", "Buenas tardes. ", "Una consulta: ", "Disculpe, "]
+SUFFIXES = ["", " Gracias.", " Es urgente.", " Saludos.", " Muchas gracias de antemano."]
+
+
+class Result(NamedTuple):
+    kind: str
+    source: Optional[str]
+    status: int
+    seconds: float
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """"balance=0.3,kb=0.5,general=0.2" -> pesos normalizados por tipo de pregunta."""
+    weights = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise ValueError(f"Tipo de pregunta desconocido: {kind!r}. Opciones: {', '.join(KINDS)}")
+        weights[kind.strip()] = float(weight)
+    total = sum(weights.values())
+    return {kind: w / total for kind, w in weights.items()}
+
+
+def load_ids(csv_path: str, limit: int = 10_000) -> List[str]:
+    """IDs reales del CSV de saldos (hasta `limit`), para que las consultas de saldo encuentren algo."""
+    with open(csv_path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [c.strip().lower() for c in next(reader)]
+        col = next(i for i, c in enumerate(header) if any(k in c for k in ID_COLUMN_KEYS))
+        return [row[col].strip() for _, row in zip(range(limit), reader)]
+
+
+def workload(mix: Dict[str, float], ids: List[str], seed: int = 0) -> Iterator[Tuple[str, str]]:
+    """Genera (tipo, pregunta) sin fin según los pesos de `mix`."""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    while True:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "balance":
+            id_value = rng.choice(ids) if ids else str(rng.randint(1_000_000, 99_999_999))
+            yield kind, rng.choice(BALANCE_TEMPLATES).format(id=id_value)
+        else:
+            template = rng.choice(KB_TEMPLATES if kind == "kb" else GENERAL_TEMPLATES)
+            yield kind, rng.choice(PREFIXES) + template + rng.choice(SUFFIXES)
+
+
+async def send(client: httpx.AsyncClient, url: str, kind: str, text: str) -> Result:
+    start = time.perf_counter()
+    try:
+        resp = await client.post(f"{url}/query", json={"query": text})
+    except httpx.TimeoutException:
+        return Result(kind, None, 0, time.perf_counter() - start)
+    except httpx.TransportError:
+        return Result(kind, None, -1, time.perf_counter() - start)
+    elapsed = time.perf_counter() - start
+    source = resp.json().get("source") if resp.status_code == 200 else None
+    return Result(kind, source, resp.status_code, elapsed)
+
+
+async def closed_loop(url: str, items: Iterator[Tuple[str, str]], concurrency: int, duration: float,
+                      max_requests: Optional[int], timeout: float) -> List[Result]:
+    results: List[Result] = []
+    issued = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            kind, text = next(items)
+            results.append(await send(client, url, kind, text))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(url: str, items: Iterator[Tuple[str, str]], rate: float, duration: float,
+                    max_requests: Optional[int], timeout: float, seed: int = 0) -> List[Result]:
+    rng = random.Random(seed)
+    tasks = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration and (max_requests is None or len(tasks) < max_requests):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind, text = next(items)
+            tasks.append(asyncio.create_task(send(client, url, kind, text)))
+            next_at += rng.expovariate(rate)
+        return list(await asyncio.gather(*tasks))
+
+
+def summarize(results: List[Result], elapsed: float) -> dict:
+    routes = {}
+    ok = [r for r in results if r.status == 200]
+    for source in sorted({r.source for r in ok}):
+        lat = np.array([r.seconds for r in ok if r.source == source]) * 1000
+        routes[source] = {"requests": len(lat), "per_sec": len(lat) / elapsed,
+                          "p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+                          "p99_ms": float(np.percentile(lat, 99))}
+    errors = Counter(f"{r.kind}:{r.status}" for r in results if r.status != 200)
+    return {"seconds": elapsed, "requests": len(results), "ok": len(ok), "per_sec": len(ok) / elapsed,
+            "routes": routes, "errors": dict(errors)}
+
+
+def print_summary(summary: dict):
+    print(f"{summary['requests']} pedidos en {summary['seconds']:.1f} s: {summary['per_sec']:.1f} respuestas/s, "
+          f"{summary['requests'] - summary['ok']} errores")
+    print(f"{'ruta':>8} {'pedidos':>8} {'resp/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for source, row in summary["routes"].items():
+        print(f"{source:>8} {row['requests']:>8} {row['per_sec']:>8.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    if summary["errors"]:
+        # status 0 is a client timeout, -1 a connection error
+        print("errores (tipo de pregunta:código HTTP): "
+              + ", ".join(f"{key}={count}" for key, count in sorted(summary["errors"].items())))
+
+
+def run(url: str, mix: Dict[str, float], concurrency: int, rate: Optional[float], duration: float,
+        max_requests: Optional[int], csv_path: Optional[str], timeout: float, seed: int, json_path: Optional[str]) -> dict:
+    ids = load_ids(csv_path) if csv_path else []
+    items = workload(mix, ids, seed)
+    start = time.perf_counter()
+    if rate:
+        results = asyncio.run(open_loop(url, items, rate, duration, max_requests, timeout, seed))
+    else:
+        results = asyncio.run(closed_loop(url, items, concurrency, duration, max_requests, timeout))
+    summary = summarize(results, time.perf_counter() - start)
+    summary["params"] = {"mix": mix, "concurrency": None if rate else concurrency, "rate": rate, "duration": duration}
+    print_summary(summary)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Prueba de carga de /query con una mezcla de preguntas de saldo, KB y generales")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--mix", default="balance=0.3,kb=0.5,general=0.2", help="Pesos por tipo de pregunta")
+    p.add_argument("--concurrency", type=int, default=16, help="Pedidos en vuelo (lazo cerrado)")
+    p.add_argument("--rate", type=float, help="Pedidos por segundo (lazo abierto, Poisson); reemplaza --concurrency")
+    p.add_argument("--duration", type=float, default=30.0, help="Segundos de carga")
+    p.add_argument("--requests", type=int, help="Cortar después de esta cantidad de pedidos")
+    p.add_argument("--csv", help="CSV de saldos del servidor, para consultar IDs que existen")
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", help="Guardar el resumen en este archivo JSON")
+    args = p.parse_args()
+    run(args.url, parse_mix(args.mix), args.concurrency, args.rate, args.duration, args.requests,
+        args.csv, args.timeout, args.seed, args.json)
@@ -0,0 +1,103 @@
+"""Benchmark del enrutador de intenciones: reglas anteriores vs `router.Router`.
+
+Genera un corpus de preguntas realistas (saldos con distintos formatos de ID,
+consultas de KB y preguntas generales) y mide rutas por segundo de las
+funciones `is_balance_query` / `is_kb_query` anteriores, de `Router.route` y
+de `Router.route_many`.
+"""
+import random
+import re
+import time
+from typing import List, Optional
+
+from langchain_groq_app.router import ROUTER
+
+
+BALANCE_TEMPLATES = [
+    "Consultar saldo cedula V-{id}",
+    "¿Cuál es el saldo de la cuenta {id}?",
+    "Necesito el balance del cliente con DNI: {id}",
+    "saldo para id {id} por favor",
+]
+KB_TEMPLATES = [
+    "¿Qué documentos se necesitan para abrir cuenta?",
+    "¿Cómo hago una transferencia internacional desde mi cuenta de ahorros?",
+    "Requisitos para la apertura de cuenta de una empresa",
+    "¿Cuánto tarda en acreditarse un depósito en cheque?",
+    "Perdí mi tarjeta de débito, ¿qué hago?",
+]
+GENERAL_TEMPLATES = [
+    "Hola, ¿a qué hora abren las sucursales los sábados?",
+    "¿Qué opinan del aumento de la inflación este año?",
+    "Gracias por la ayuda, que tengas un buen día",
+]
+OLD_KB_TERMS = ["abrir cuenta", "apertura de cuenta", "transferencia", "hacer una transferencia", "deposito",
+                "depósito", "tarjeta", "cheque", "requisitos", "documentos"]
+
+
+def corpus(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.3:
+            out.append(rng.choice(BALANCE_TEMPLATES).format(id=rng.randint(1_000_000, 99_999_999)))
+        elif r < 0.8:
+            out.append(rng.choice(KB_TEMPLATES))
+        else:
+            out.append(rng.choice(GENERAL_TEMPLATES))
+    return out
+
+
+def old_is_balance_query(text: str) -> Optional[str]:
+    # the per-file copy server.py and app.py used before router.Router
+    if re.search(r"\bsaldo\b|\bbalance\b|saldo de la|saldo para|consultar saldo", text, re.I):
+        m = re.search(r"(\d{6,12})", text)
+        if m:
+            return m.group(1)
+        m2 = re.search(r"\b(?:cedula|cédula|dni|id)[:\s]*([A-Za-z0-9\-]+)", text, re.I)
+        if m2:
+            return m2.group(1)
+    return None
+
+
+def old_is_kb_query(text: str) -> bool:
+    for t in OLD_KB_TERMS:
+        if t in text.lower():
+            return True
+    return False
+
+
+def old_route(text: str):
+    return old_is_balance_query(text), old_is_kb_query(text)
+
+
+def routes_per_sec(fn, texts: List[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(texts)
+    return len(texts) * repeat / (time.perf_counter() - start)
+
+
+def run(n: int, repeat: int):
+    texts = corpus(n)
+    mismatches = sum(old_route(t) != tuple(ROUTER.route(t)) for t in texts)
+    rows = [
+        ("reglas anteriores", routes_per_sec(lambda ts: [old_route(t) for t in ts], texts, repeat)),
+        ("Router.route", routes_per_sec(lambda ts: [ROUTER.route(t) for t in ts], texts, repeat)),
+        ("Router.route_many", routes_per_sec(ROUTER.route_many, texts, repeat)),
+    ]
+    print(f"{len(texts)} preguntas, {mismatches} diferencias de ruta con las reglas anteriores")
+    print(f"{'método':>20} {'rutas/s':>12} {'us/ruta':>9}")
+    for name, rate in rows:
+        print(f"{name:>20} {rate:>12,.0f} {1e6 / rate:>9.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Mide rutas por segundo del enrutador de intenciones")
+    p.add_argument("--n", type=int, default=20000, help="Cantidad de preguntas del corpus sintético")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+    run(args.n, args.repeat)
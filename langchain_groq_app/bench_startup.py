@@ -0,0 +1,78 @@
+"""Mide el arranque en frío del servidor: tiempo hasta /health, hasta /ready y hasta la primera respuesta.
+
+Lanza `uvicorn langchain_groq_app.server:app` como subproceso (con el mismo
+entorno, desde `--cwd`) y consulta los endpoints hasta que responden 200.
+Todos los tiempos se cuentan desde el lanzamiento del proceso.
+
+    python -m langchain_groq_app.bench_startup --runs 3
+"""
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+import httpx
+import numpy as np
+
+
+QUESTION = "¿Qué documentos se necesitan para abrir cuenta?"
+
+
+def wait_for(client: httpx.Client, method: str, url: str, deadline: float, **kwargs) -> Optional[float]:
+    """Momento en que `url` responde 200; None si el endpoint no existe (versiones sin /ready)."""
+    while time.perf_counter() < deadline:
+        try:
+            status = client.request(method, url, **kwargs).status_code
+            if status == 200:
+                return time.perf_counter()
+            if status == 404:
+                return None
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{method} {url} no respondió 200 a tiempo")
+
+
+def cold_start(port: int, cwd: str, timeout: float) -> Dict[str, Optional[float]]:
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "langchain_groq_app.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        with httpx.Client(timeout=timeout) as client:
+            health = wait_for(client, "GET", f"{base}/health", deadline)
+            # the first answer is requested as soon as the process accepts traffic
+            answer = wait_for(client, "POST", f"{base}/query", deadline, json={"query": QUESTION})
+            ready = wait_for(client, "GET", f"{base}/ready", deadline)
+        return {key: t - start if t is not None else None
+                for key, t in (("health", health), ("ready", ready), ("first_answer", answer))}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(runs: int, port: int, cwd: str, timeout: float):
+    results = [cold_start(port, cwd, timeout) for _ in range(runs)]
+    print(f"{'medida':>22} {'mediana (s)':>12} {'máx (s)':>9}")
+    for key, name in (("health", "/health responde"), ("ready", "/ready = 200"), ("first_answer", "primera respuesta")):
+        values = [r[key] for r in results if r[key] is not None]
+        if values:
+            print(f"{name:>22} {np.median(values):>12.2f} {max(values):>9.2f}")
+        else:
+            print(f"{name:>22} {'-':>12} {'-':>9}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Tiempo de arranque en frío y hasta la primera respuesta del servidor")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--cwd", default=os.getcwd(), help="Directorio desde el que se lanza el servidor (con kb_faiss/ y data/)")
+    p.add_argument("--timeout", type=float, default=300.0)
+    args = p.parse_args()
+    run(args.runs, args.port, args.cwd, args.timeout)
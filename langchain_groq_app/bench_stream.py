@@ -0,0 +1,73 @@
+"""Mide el tiempo al primer token de /query/stream frente a la respuesta completa de /query.
+
+Pensado para correr contra el servidor apuntando al stub `mock_groq`:
+
+    python -m langchain_groq_app.mock_groq --port 9000
+    $env:GROQ_API_URL = "http://127.0.0.1:9000/v1"; $env:ANSWER_CACHE_SIZE = "0"
+    uvicorn langchain_groq_app.server:app --port 8000
+    python -m langchain_groq_app.bench_stream --url http://127.0.0.1:8000
+"""
+import json
+import time
+from typing import List
+
+import httpx
+import numpy as np
+
+
+QUERIES = [
+    "¿Qué documentos se necesitan para abrir cuenta?",
+    "¿Cómo hago una transferencia?",
+    "¿Qué tasas de interés ofrecen?",
+]
+
+
+def time_query(client: httpx.Client, url: str, text: str) -> float:
+    start = time.perf_counter()
+    client.post(f"{url}/query", json={"query": text}).raise_for_status()
+    return time.perf_counter() - start
+
+
+def time_stream(client: httpx.Client, url: str, text: str) -> "tuple[float, float]":
+    """Devuelve (segundos hasta el primer evento `token`, segundos hasta el final del stream)."""
+    start = time.perf_counter()
+    first = None
+    event = None
+    with client.stream("POST", f"{url}/query/stream", json={"query": text}) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:") and event == "token" and first is None:
+                first = time.perf_counter() - start
+            elif line.startswith("data:") and event == "error":
+                raise RuntimeError(json.loads(line[len("data:"):])["detail"])
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total
+
+
+def run(url: str, queries: List[str], repeat: int):
+    blocking, ttft, streamed = [], [], []
+    with httpx.Client(timeout=60) as client:
+        for _ in range(repeat):
+            for q in queries:
+                blocking.append(time_query(client, url, q))
+                first, total = time_stream(client, url, q)
+                ttft.append(first)
+                streamed.append(total)
+
+    print(f"{'medida':>28} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, values in (("/query (respuesta completa)", blocking),
+                         ("/query/stream primer token", ttft),
+                         ("/query/stream completo", streamed)):
+        print(f"{name:>28} {np.percentile(values, 50) * 1000:>9.1f} {np.percentile(values, 95) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Tiempo al primer token de /query/stream vs /query")
+    p.add_argument("--url", default="http://127.0.0.1:8000", help="URL base del servidor")
+    p.add_argument("--repeat", type=int, default=5, help="Repeticiones de cada pregunta")
+    args = p.parse_args()
+    run(args.url.rstrip("/"), QUERIES, args.repeat)
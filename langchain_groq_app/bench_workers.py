@@ -0,0 +1,162 @@
+"""Memoria por worker de `uvicorn --workers N`, con y sin SHARED_MEMORY (sólo Linux: lee /proc).
+
+Arma en un directorio temporal un CSV de saldos y un índice FAISS sintéticos
+(vectores aleatorios, sin pasar por el modelo), levanta `mock_groq` y, para
+cada N y cada modo, lanza el servidor, espera a que todos los workers estén
+listos, hace consultas de KB para que recorran el índice y lee RSS, PSS y
+memoria privada de cada worker en /proc/<pid>/smaps_rollup. PSS reparte las
+páginas compartidas entre los procesos que las mapean: es la medida que baja
+cuando los workers comparten el índice y los saldos. El modelo de embeddings
+se sigue cargando una vez por worker.
+
+    python -m langchain_groq_app.bench_workers --workers 1,4,8 --chunks 200000 --balances 1000000
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+
+QUESTION = "¿Qué documentos se necesitan para abrir cuenta?"
+MOCK_PORT = 9017
+
+
+def synthetic_csv(path: Path, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("ID_Cedula,Nombre,Balance\n")
+        for i in range(n):
+            f.write(f"V-{10_000_000 + i},Cliente {i},{rng.uniform(0, 100_000):.2f}\n")
+
+
+def synthetic_store(index_dir: Path, n: int, dim: int, seed: int = 0):
+    """Store LangChain FAISS con `n` vectores aleatorios y un documento corto por vector."""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    from langchain_groq_app.index_kb import save_faiss_store
+
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    ids = [str(i) for i in range(n)]
+    docs = {i: Document(page_content=f"Fragmento {i} sobre apertura de cuenta y documentos.", metadata={"source": f"doc_{i}.txt"}) for i in ids}
+    # only index.faiss and index.pkl are written; the server attaches its own embeddings
+    store = FAISS(FakeEmbeddings(size=dim), index, InMemoryDocstore(docs), dict(enumerate(ids)))
+    save_faiss_store(store, index_dir)
+
+
+def smaps(pid: int) -> Dict[str, float]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {"rss": values["Rss"], "pss": values["Pss"],
+            "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)}
+
+
+def worker_pids(master: int) -> List[int]:
+    # uvicorn --workers spawns its workers as children of the master process
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            status = (entry / "status").read_text()
+            cmdline = (entry / "cmdline").read_bytes()
+        except OSError:
+            continue
+        ppid = next(int(line.split()[1]) for line in status.splitlines() if line.startswith("PPid:"))
+        if ppid == master and b"spawn_main" in cmdline:
+            pids.append(int(entry.name))
+    return pids
+
+
+def wait_ready(client: httpx.Client, base: str, workers: int, deadline: float):
+    """Espera a que /ready responda 200 desde `workers` procesos distintos."""
+    ready = set()
+    while len(ready) < workers:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"sólo {len(ready)} de {workers} workers listos a tiempo")
+        try:
+            # a new connection each time, so the kernel spreads them over the workers
+            r = client.get(f"{base}/ready", headers={"Connection": "close"})
+            if r.status_code == 200:
+                ready.add(r.json()["pid"])
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+
+
+def measure(cwd: Path, workers: int, shared: bool, port: int, timeout: float) -> List[Dict[str, float]]:
+    env = dict(os.environ, SHARED_MEMORY="1" if shared else "0", ANSWER_CACHE_SIZE="0",
+               GROQ_API_URL=f"http://127.0.0.1:{MOCK_PORT}/v1", GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "bench"),
+               MOCK_FIRST_TOKEN_MS="0", MOCK_TOKEN_MS="0")
+    cmd = [sys.executable, "-m", "uvicorn", "langchain_groq_app.server:app", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            wait_ready(client, base, workers, time.perf_counter() + timeout)
+            # every KB query scans the whole flat index in whichever worker gets it
+            for _ in range(10 * workers):
+                client.post(f"{base}/query", json={"query": QUESTION}, headers={"Connection": "close"})
+        pids = worker_pids(proc.pid) if workers > 1 else [proc.pid]
+        return [smaps(pid) for pid in pids]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(worker_counts: List[int], chunks: int, balances: int, dim: int, port: int, timeout: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = Path(tmp)
+        synthetic_csv(cwd / "data" / "saldos.csv", balances)
+        synthetic_store(cwd / "kb_faiss", chunks, dim)
+        index_mb = (cwd / "kb_faiss" / "index.faiss").stat().st_size / 2**20
+        print(f"{chunks} vectores de {dim} dims ({index_mb:.0f} MB), {balances} saldos")
+        mock = subprocess.Popen([sys.executable, "-m", "langchain_groq_app.mock_groq", "--port", str(MOCK_PORT)],
+                                env=dict(os.environ, MOCK_FIRST_TOKEN_MS="0", MOCK_TOKEN_MS="0"),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            print(f"{'modo':>8} {'workers':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'privada/worker':>15} {'PSS total':>10}  (MB)")
+            for workers in worker_counts:
+                for shared in (False, True):
+                    rows = measure(cwd, workers, shared, port, timeout)
+                    mean = {k: float(np.mean([r[k] for r in rows])) for k in rows[0]}
+                    total = sum(r["pss"] for r in rows)
+                    print(f"{'mmap' if shared else 'copia':>8} {len(rows):>8} {mean['rss']:>11.0f} {mean['pss']:>11.0f} "
+                          f"{mean['private']:>15.0f} {total:>10.0f}")
+        finally:
+            mock.terminate()
+            mock.wait()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="RSS/PSS por worker de uvicorn con y sin SHARED_MEMORY")
+    p.add_argument("--workers", default="1,4,8", help="Cantidades de workers separadas por coma")
+    p.add_argument("--chunks", type=int, default=200_000, help="Vectores del índice FAISS sintético")
+    p.add_argument("--balances", type=int, default=1_000_000, help="Filas del CSV de saldos sintético")
+    p.add_argument("--dim", type=int, default=384, help="Dimensión de los vectores (384 para all-MiniLM-L6-v2)")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--timeout", type=float, default=600.0)
+    args = p.parse_args()
+    run([int(w) for w in args.workers.split(",")], args.chunks, args.balances, args.dim, args.port, args.timeout)
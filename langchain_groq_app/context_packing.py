@@ -0,0 +1,181 @@
+"""Empaquetado del contexto entre el retriever y el LLM, con un presupuesto de tokens.
+
+La cadena "stuff" pega los k documentos recuperados enteros en el prompt,
+incluidos los pedazos repetidos entre chunks vecinos (`CHUNK_OVERLAP`).
+`pack_documents` arma un contexto más chico con lo que importa:
+
+1. descarta los documentos casi duplicados de otro mejor rankeado (la
+   fracción de sus trigramas de palabras que ya está en ese otro supera
+   `CONTEXT_DEDUPE`);
+2. parte el resto en unidades y saltea las que ya aparecieron: cada oración
+   es una unidad, salvo las listas (pasos numerados o viñetas), que van
+   enteras junto con la línea que las presenta ("sigue estos pasos:");
+3. recorre los documentos en el orden del retriever: el que entra entero en
+   lo que queda de `CONTEXT_TOKENS` va entero; de los demás toma un tramo
+   contiguo de unidades alrededor de la que más términos de la pregunta
+   tiene (pesados por su IDF entre las unidades recuperadas; un término que
+   está en todas, como el nombre del banco, no distingue ninguna) y lo
+   extiende hacia la vecina con más puntaje mientras entre.
+
+Así un procedimiento nunca llega al LLM con pasos salteados. Los tokens se
+estiman contando palabras y signos de puntuación (los tokenizadores BPE dan
+un número parecido para texto en español).
+
+Está desactivado por defecto (`CONTEXT_TOKENS=0`): con los chunks de
+`index_kb` (800 caracteres, `k`=4) un presupuesto chico recorta respuestas
+reales. Conviene activarlo con un presupuesto medido sobre la KB
+(`run_benchmarks.py --benches context`).
+"""
+import math
+import os
+import re
+from typing import TYPE_CHECKING, List, Set
+
+from langchain_groq_app.answer_cache import normalize_question
+from langchain_groq_app.tracing import REGISTRY
+
+# the server imports this module at startup; langchain loads later in warm_up()
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", "0"))
+CONTEXT_DEDUPE = float(os.environ.get("CONTEXT_DEDUPE", "0.8"))
+# function words that would make every sentence "match" the question
+STOPWORDS = frozenset(
+    "a al algo como con cual cuales cuando de del donde el ella en es esta este esto hay la las le lo los me mi "
+    "mis muy no o para pero por puedo que se si sin sobre su sus te tengo tiene un una uno y ya yo".split()
+)
+CONTEXT_TOKENS_HIST = REGISTRY.histogram(
+    "rag_context_tokens", "Tokens estimados del contexto de KB antes (retrieved) y después (packed) de empaquetarlo",
+    buckets=(50, 100, 200, 300, 400, 600, 800, 1200, 1600, 2400, 3200, 6400),
+)
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# a sentence end followed by a capital; the period of "1." or "3.5" does not count
+_SENTENCE_END = re.compile(r"(?<=[^\d\s][.!?…])\s+(?=[¿¡\"(]?[A-ZÁÉÍÓÚÑ])")
+# "1. ...", "2) ...", "- ...", "* ...", "• ..."
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def split_sentences(text: str) -> List[str]:
+    """Oraciones de `text`; cada línea (un título, un paso numerado) es al menos una."""
+    return [s.strip() for line in text.splitlines() for s in _SENTENCE_END.split(line) if s.strip()]
+
+
+def split_units(text: str) -> List[str]:
+    """Unidades de `text` que el empaquetado no parte: oraciones, y cada lista entera con su línea de entrada."""
+    units: List[str] = []
+    items: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if _LIST_ITEM.match(line):
+            if not items and units and units[-1].endswith(":"):
+                # the line that introduces the list ("sigue estos pasos:") goes with it
+                items.append(units.pop())
+            items.append(line)
+            continue
+        if items:
+            units.append("\n".join(items))
+            items = []
+        units.extend(split_sentences(line))
+    if items:
+        units.append("\n".join(items))
+    return units
+
+
+def query_terms(text: str) -> Set[str]:
+    return {w for w in normalize_question(text).split() if w not in STOPWORDS and len(w) > 1}
+
+
+def shingles(text: str, n: int = 3) -> Set[tuple]:
+    words = normalize_question(text).split()
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def pack_documents(question: str, docs: List["Document"], budget: int = CONTEXT_TOKENS,
+                   dedupe: float = CONTEXT_DEDUPE) -> List["Document"]:
+    """Los `docs` (en orden de relevancia) recortados a tramos contiguos útiles para `question`.
+
+    Siempre queda al menos una unidad, aunque sola supere `budget`.
+    """
+    if budget <= 0 or not docs:
+        return docs
+    kept, kept_shingles = [], []
+    for doc in docs:
+        sh = shingles(doc.page_content)
+        if any(len(sh & other) / len(sh) >= dedupe for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(sh)
+
+    terms = query_terms(question)
+    seen = set()
+    # per kept document: its (question terms, tokens, unit) in document order
+    units = []
+    for doc in kept:
+        doc_units = []
+        for unit in split_units(doc.page_content):
+            key = normalize_question(unit)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            doc_units.append((terms & set(key.split()), count_tokens(unit), unit))
+        units.append(doc_units)
+    matched = [m for doc_units in units for m, _, _ in doc_units]
+    df = {t: sum(t in m for m in matched) for t in terms}
+    idf = {t: math.log(1 + len(matched) / n) for t, n in df.items() if n}
+
+    # per kept document, the contiguous [start, end) run of units that goes into the context
+    runs, used = {}, 0
+    for rank, doc_units in enumerate(units):
+        if not doc_units:
+            continue
+        costs = [c for _, c, _ in doc_units]
+        if used + sum(costs) <= budget:
+            runs[rank] = (0, len(doc_units))
+            used += sum(costs)
+            continue
+        scores = [sum(idf[t] for t in m) for m, _, _ in doc_units]
+        # the best unit, the earliest on ties
+        anchor = max(range(len(doc_units)), key=lambda p: (scores[p], -p))
+        if used + costs[anchor] > budget:
+            if not runs:
+                # always at least one unit, even if it alone exceeds the budget
+                runs[rank] = (anchor, anchor + 1)
+                used += costs[anchor]
+            continue
+        start, end = anchor, anchor + 1
+        used += costs[anchor]
+        while True:
+            # grow towards the better neighbour that still fits; the earlier one on ties
+            options = []
+            if start > 0 and used + costs[start - 1] <= budget:
+                options.append((scores[start - 1], 1, start - 1))
+            if end < len(doc_units) and used + costs[end] <= budget:
+                options.append((scores[end], 0, end))
+            if not options:
+                break
+            pos = max(options)[2]
+            start, end = min(start, pos), max(end, pos + 1)
+            used += costs[pos]
+        runs[rank] = (start, end)
+    CONTEXT_TOKENS_HIST.observe(sum(count_tokens(d.page_content) for d in docs), stage="retrieved")
+    CONTEXT_TOKENS_HIST.observe(used, stage="packed")
+
+    from langchain_core.documents import Document
+
+    packed = []
+    for rank, doc in enumerate(kept):
+        if rank in runs:
+            start, end = runs[rank]
+            # one unit per line: keeps titles and numbered steps readable
+            text = "\n".join(unit for _, _, unit in units[rank][start:end])
+            packed.append(Document(page_content=text, metadata=doc.metadata))
+    return packed
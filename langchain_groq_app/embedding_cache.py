@@ -0,0 +1,263 @@
+import json
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class EmbeddingCache:
+    """Caché en disco de embeddings direccionada por contenido.
+
+    Cada modelo tiene su propio directorio con tres archivos memory-mapped de
+    capacidad fija: `vectors.f32` (capacidad x dim), `keys.bin` (sha256 del
+    texto por slot, la tabla de offsets) y `ticks.i8` (último uso por slot).
+    Al llenarse se desalojan los slots usados hace más tiempo (LRU).
+
+    Varios procesos pueden compartir el directorio (workers de uvicorn,
+    `index_kb` junto al servidor): las escrituras toman un lock de archivo
+    (`lock`), un slot libre se vuelve a mirar en disco antes de ocuparlo y
+    cada lectura comprueba que el slot siga guardando su clave, así que un
+    slot reutilizado por otro proceso es un miss y no el vector de otro
+    texto. Dentro de un proceso usar `open_embedding_cache`, que comparte una
+    instancia por (directorio, modelo).
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, capacity: int = 200_000):
+        self.dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.model_name = model_name
+        self.capacity = capacity
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._slots: Dict[bytes, int] = {}
+        self._free: List[int] = []
+        self._tick = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        meta_path = self.dir / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") == self.model_name:
+                self.capacity = meta["capacity"]
+                self._open(meta["dim"], "r+")
+
+    def _open(self, dim: int, mode: str):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self._vectors = np.memmap(self.dir / "vectors.f32", dtype="float32", mode=mode, shape=(self.capacity, dim))
+        self._keys = np.memmap(self.dir / "keys.bin", dtype="S64", mode=mode, shape=(self.capacity,))
+        self._ticks = np.memmap(self.dir / "ticks.i8", dtype="int64", mode=mode, shape=(self.capacity,))
+        used = np.flatnonzero(self._ticks > 0)
+        self._slots = {bytes(self._keys[i]): int(i) for i in used}
+        self._free = sorted(set(range(self.capacity)) - set(self._slots.values()), reverse=True)
+        self._tick = int(self._ticks.max()) if self.capacity else 0
+        if mode == "w+":
+            with open(self.dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": dim, "capacity": self.capacity}, f)
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        # hex rather than raw digest: numpy "S" arrays drop trailing NUL bytes
+        return hashlib.sha256(text.encode("utf-8")).hexdigest().encode("ascii")
+
+    @contextmanager
+    def _file_lock(self):
+        """Excluye a las escrituras de otros procesos sobre el mismo directorio."""
+        with open(self.dir / "lock", "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                # retries for ~10 s before raising OSError
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            out = []
+            for k in keys:
+                slot = self._slots.get(k)
+                vec = None
+                if slot is not None and self._keys[slot] == k:
+                    vec = np.array(self._vectors[slot])
+                    # another process may have reused the slot while we copied it
+                    if self._keys[slot] != k:
+                        vec = None
+                if vec is None:
+                    if slot is not None:
+                        # taken over by another process: no longer ours, and not free either
+                        del self._slots[k]
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self.hits += 1
+                self._tick += 1
+                self._ticks[slot] = self._tick
+                out.append(vec)
+            return out
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                if self.dim is None:
+                    # another process may have created the files after __init__
+                    self._load()
+                if self.dim is None:
+                    self._open(vectors.shape[1], "w+")
+                # ticks on disk may come from other processes sharing the files
+                self._tick = max(self._tick, int(self._ticks.max()))
+                new = [k for k in dict.fromkeys(keys) if k not in self._slots]
+                self._evict(len(new) - len(self._free))
+                for k, vec in zip(keys, vectors):
+                    slot = self._slots.get(k)
+                    if slot is None:
+                        slot = self._claim()
+                        if slot is None:
+                            break
+                        self._slots[k] = slot
+                    # key last: readers check it before and after copying the vector
+                    self._keys[slot] = b""
+                    self._vectors[slot] = vec
+                    self._keys[slot] = k
+                    self._tick += 1
+                    self._ticks[slot] = self._tick
+
+    def _claim(self) -> Optional[int]:
+        # a slot free for this instance may have been taken by another process
+        while self._free:
+            slot = self._free.pop()
+            if self._ticks[slot] == 0:
+                return slot
+            self._slots[bytes(self._keys[slot])] = slot
+        return None
+
+    def _evict(self, n: int):
+        if n <= 0:
+            return
+        used = self._ticks[:] > 0
+        n = min(n, int(used.sum()))
+        if n <= 0:
+            return
+        ticks = np.where(used, self._ticks[:], np.iinfo("int64").max)
+        victims = np.argpartition(ticks, n - 1)[:n]
+        by_slot = {slot: k for k, slot in self._slots.items()}
+        for slot in victims.tolist():
+            # the victim may belong to another process's map; it stops matching there on read
+            k = by_slot.get(slot)
+            if k is not None:
+                del self._slots[k]
+            self._keys[slot] = b""
+            self._ticks[slot] = 0
+            self._free.append(slot)
+        self.evictions += n
+
+    def flush(self):
+        with self._lock:
+            if self.dim is not None:
+                self._vectors.flush()
+                self._keys.flush()
+                self._ticks.flush()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_CACHES: Dict[tuple, EmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def open_embedding_cache(cache_dir: str, model_name: str, capacity: int = 200_000) -> EmbeddingCache:
+    """La `EmbeddingCache` de (`cache_dir`, `model_name`) del proceso; la crea la primera vez.
+
+    Dos instancias sobre los mismos archivos llevarían cada una su propio
+    mapa de slots libres, así que el proceso usa siempre la misma.
+    """
+    key = (os.path.abspath(cache_dir), model_name)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = _CACHES[key] = EmbeddingCache(cache_dir, model_name, capacity)
+        return cache
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings de LangChain con caché persistente delante del modelo.
+
+    El modelo real se construye con `factory` recién ante el primer miss, así
+    que un rebuild o una consulta repetida que se resuelve por completo desde
+    la caché no llega a cargarlo.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings], cache: EmbeddingCache):
+        self.factory = factory
+        self.cache = cache
+        self._model: Optional[Embeddings] = None
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            self._model = self.factory()
+        return self._model
+
+    def _embed(self, texts: List[str], query: bool) -> List[List[float]]:
+        keys = [self.cache.key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+        if missing:
+            # sentence-transformers encodes queries and documents the same way,
+            # so both share one cache namespace
+            if query:
+                from langchain_groq_app.encoders import embed_queries
+
+                computed = embed_queries(self.model, missing)
+            else:
+                computed = self.model.embed_documents(missing)
+            vectors = np.asarray(computed, dtype="float32")
+            self.cache.put_many([self.cache.key(t) for t in missing], vectors)
+            self.cache.flush()
+            by_text = dict(zip(missing, vectors))
+            found = [v if v is not None else by_text[t] for t, v in zip(texts, found)]
+        return [v.tolist() for v in found]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), query=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], query=True)[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), query=True)
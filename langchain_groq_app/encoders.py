@@ -0,0 +1,268 @@
+"""Encoder de MiniLM para CPU con backends fp32, int8 (cuantización dinámica) u ONNX.
+
+Los tres backends producen vectores de la misma dimensión que el modelo fp32,
+así que un índice construido con uno se puede consultar con otro sin
+reindexar. `ENCODER_THREADS` fija los hilos de torch en fp32/int8 y los de
+la sesión de ONNX Runtime en onnx (0 deja el valor por defecto). `QueryCache` es una LRU en memoria de embeddings de preguntas
+recientes que va delante del encoder y de la caché en disco
+(`QUERY_CACHE_SIZE`, 0 la desactiva).
+
+Para verificar un backend contra el fp32 sobre un índice guardado (coincidencia
+del top-k y latencia por pregunta; sale con código 1 si la coincidencia queda
+por debajo de `--threshold`):
+
+    python -m langchain_groq_app.encoders --store kb_faiss --backends int8,onnx --threshold 0.9
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+BACKENDS = ("fp32", "int8", "onnx")
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "fp32")
+# 0 keeps torch's default (one thread per core)
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", "0"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+BATCH_SIZE = 32
+
+
+def load_sentence_transformer(model_name: str, backend: str = "fp32", threads: int = 0):
+    """Carga el modelo en CPU con el backend pedido.
+
+    `int8` cuantiza los pesos de las capas lineales a int8 (las activaciones
+    se cuantizan al vuelo); `onnx` usa el backend ONNX Runtime de
+    sentence-transformers (requiere sentence-transformers>=3.2 y
+    `optimum[onnxruntime]`; exporta el grafo la primera vez si el modelo no
+    lo trae).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de encoder desconocido: {backend!r}. Opciones: {', '.join(BACKENDS)}")
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        # ONNX Runtime keeps its own thread pool, so torch.set_num_threads does not reach it
+        model_kwargs = {}
+        if threads > 0:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    if threads > 0:
+        # process-wide: also applies to any other torch model in the process
+        torch.set_num_threads(threads)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class SentenceEncoder(Embeddings):
+    """Embeddings de LangChain sobre sentence-transformers con el backend pedido;
+    en fp32 da los mismos vectores que `SentenceTransformerEmbeddings`."""
+
+    def __init__(self, model_name: str, backend: str = ENCODER_BACKEND, threads: int = ENCODER_THREADS, model=None):
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.client = model if model is not None else load_sentence_transformer(model_name, backend, threads)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # same preprocessing as SentenceTransformerEmbeddings, so vectors match the existing indexes
+        texts = [t.replace("\n", " ") for t in texts]
+        return self.client.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # MiniLM encodes questions like documents, so a batch of questions is one encode
+        return self.embed_documents(texts)
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """`embed_query` de cada texto, en un solo lote si `embeddings` lo permite (`embed_queries`)."""
+    method = getattr(embeddings, "embed_queries", None)
+    if method is not None:
+        return method(texts)
+    return [embeddings.embed_query(t) for t in texts]
+
+
+class QueryCache(Embeddings):
+    """LRU en memoria de los embeddings de preguntas delante de `inner`.
+
+    Sólo `embed_query` y `embed_queries` (lotes de preguntas, p. ej. de
+    `/query/batch`) pasan por la LRU; los lotes de documentos van directo a
+    `inner`. En el servidor la misma pregunta se embebe para la caché de
+    respuestas y otra vez para el retriever, y la segunda vez sale de acá.
+    """
+
+    def __init__(self, inner: Embeddings, capacity: int = QUERY_CACHE_SIZE):
+        self.inner = inner
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._vectors.get(text)
+            if vector is not None:
+                self._vectors.move_to_end(text)
+                self.hits += 1
+                # a copy: callers may turn it into an array and modify it
+                return list(vector)
+            self.misses += 1
+        vector = self.inner.embed_query(text)
+        with self._lock:
+            self._vectors[text] = vector
+            if len(self._vectors) > self.capacity:
+                self._vectors.popitem(last=False)
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Como `embed_query` para cada texto; los que no están en la LRU se embeben en un solo lote."""
+        out: List[Optional[List[float]]] = []
+        missing = []
+        with self._lock:
+            for text in texts:
+                vector = self._vectors.get(text)
+                if vector is not None:
+                    self._vectors.move_to_end(text)
+                    self.hits += 1
+                    out.append(list(vector))
+                else:
+                    self.misses += 1
+                    out.append(None)
+                    missing.append(text)
+        if not missing:
+            return out
+        missing = list(dict.fromkeys(missing))
+        computed = dict(zip(missing, embed_queries(self.inner, missing)))
+        with self._lock:
+            for text, vector in computed.items():
+                self._vectors[text] = vector
+            while len(self._vectors) > self.capacity:
+                self._vectors.popitem(last=False)
+        return [v if v is not None else list(computed[t]) for t, v in zip(texts, out)]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._vectors),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def sample_queries(texts: Sequence[str], n: int, words: int = 8, seed: int = 0) -> List[str]:
+    """`n` preguntas de `words` palabras consecutivas de chunks al azar."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        tokens = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(tokens) - words))
+        out.append(" ".join(tokens[start:start + words]))
+    return out
+
+
+def compare_backends(store_dir: str, backends: Sequence[str], queries: List[str], k: int = 4, threads: int = 0,
+                     model_name: Optional[str] = None) -> List[dict]:
+    """Compara cada backend con el fp32 sobre el índice de `store_dir`.
+
+    Para cada backend informa la coincidencia media del top-k con el del fp32
+    (1.0 = mismos chunks), el coseno medio entre sus vectores y los del fp32,
+    y la latencia de encodear una pregunta por vez.
+    """
+    import faiss
+
+    from langchain_groq_app.index_kb import EMBEDDING_MODEL
+
+    model_name = model_name or EMBEDDING_MODEL
+    index = faiss.read_index(os.path.join(store_dir, "index.faiss"))
+    rows, reference, reference_ids = [], None, None
+    for backend in ["fp32"] + [b for b in backends if b != "fp32"]:
+        start = time.perf_counter()
+        encoder = SentenceEncoder(model_name, backend, threads)
+        load_seconds = time.perf_counter() - start
+        encoder.embed_query("warm-up")
+        latencies, vectors = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            vectors.append(encoder.embed_query(q))
+            latencies.append(time.perf_counter() - t0)
+        vectors = np.asarray(vectors, dtype="float32")
+        ids = index.search(vectors, k)[1]
+        if reference is None:
+            reference, reference_ids = vectors, ids
+        cosine = (vectors * reference).sum(1) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+        agreement = np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, reference_ids)])
+        lat = np.array(latencies) * 1000
+        rows.append({"backend": backend, f"agreement@{k}": float(agreement), "cosine": float(cosine.mean()),
+                     "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99)),
+                     "load_s": load_seconds})
+    return rows
+
+
+def print_report(rows: List[dict]):
+    agreement_key = next(key for key in rows[0] if key.startswith("agreement@"))
+    base = rows[0]["p50_ms"]
+    print(f"{'backend':>8} {agreement_key:>12} {'coseno':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'vs fp32':>8} {'carga (s)':>9}")
+    for r in rows:
+        print(f"{r['backend']:>8} {r[agreement_key]:>12.3f} {r['cosine']:>8.4f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{base / r['p50_ms']:>7.2f}x {r['load_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    p = argparse.ArgumentParser(description="Compara backends del encoder MiniLM con el fp32: coincidencia del top-k y latencia")
+    p.add_argument("--store", default="kb_faiss", help="Directorio de un índice FAISS guardado por index_kb")
+    p.add_argument("--backends", default="int8", help=f"Backends a evaluar, separados por coma: {', '.join(BACKENDS)}")
+    p.add_argument("--queries", type=int, default=200, help="Preguntas tomadas de los chunks del índice")
+    p.add_argument("--queries_file", help="Archivo con una pregunta por línea (en lugar de muestrear chunks)")
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--threads", type=int, default=ENCODER_THREADS, help="Hilos de torch u ONNX Runtime (0 = por defecto)")
+    p.add_argument("--threshold", type=float, default=0.9, help="Coincidencia mínima del top-k contra fp32")
+    p.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    args = p.parse_args()
+
+    from langchain_groq_app.index_generations import current_index_dir
+
+    store_dir = str(current_index_dir(args.store))
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            qs = [line.strip() for line in f if line.strip()]
+    else:
+        import pickle
+
+        # the same unpickling FAISS.load_local does; the index is always one we wrote ourselves
+        with open(os.path.join(store_dir, "index.pkl"), "rb") as f:
+            docstore, _ = pickle.load(f)
+        qs = sample_queries([d.page_content for d in docstore._dict.values()], args.queries)
+    results = compare_backends(store_dir, args.backends.split(","), qs, args.k, args.threads)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    failed = [r["backend"] for r in results if r[f"agreement@{args.k}"] < args.threshold]
+    if failed:
+        print(f"Coincidencia del top-k por debajo de {args.threshold}: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
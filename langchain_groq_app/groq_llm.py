@@ -1,11 +1,80 @@
 import os
 import json
+import time
+import random
+import asyncio
 import requests
-from typing import Optional, Mapping, Any
+import httpx
+from typing import Optional, Mapping, Any, Dict, Iterator, AsyncIterator
 
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain.llms.base import LLM
+from langchain.schema.output import GenerationChunk
 from pydantic import BaseModel, Extra
 
+from langchain_groq_app.tracing import REGISTRY, span
+
+
+# status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", "100"))
+MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "100"))
+# longest wait between retries, also for a server-sent Retry-After
+MAX_BACKOFF = 8.0
+
+# one keep-alive session for the sync path; async clients are per event loop
+# because httpx pools and asyncio semaphores are bound to the loop that created them
+_SESSION = requests.Session()
+_ASYNC_CLIENTS: Dict[int, "tuple[httpx.AsyncClient, asyncio.Semaphore]"] = {}
+
+GROQ_REQUESTS = REGISTRY.counter("groq_requests_total", "Intentos HTTP a Groq por código de respuesta (reintentos incluidos)")
+GROQ_BYTES = REGISTRY.counter("groq_bytes_total", "Bytes enviados a y recibidos de Groq")
+GROQ_TOKENS = REGISTRY.counter("groq_tokens_total", "Tokens de prompt y de respuesta informados por Groq")
+
+
+def _async_client() -> "tuple[httpx.AsyncClient, asyncio.Semaphore]":
+    loop = asyncio.get_running_loop()
+    entry = _ASYNC_CLIENTS.get(id(loop))
+    if entry is None or entry[0].is_closed:
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        entry = (httpx.AsyncClient(limits=limits), asyncio.Semaphore(MAX_CONCURRENCY))
+        _ASYNC_CLIENTS[id(loop)] = entry
+    return entry
+
+
+async def aclose_clients():
+    """Cierra los clientes HTTP async (llamar al apagar el servidor)."""
+    while _ASYNC_CLIENTS:
+        _, (client, _) = _ASYNC_CLIENTS.popitem()
+        await client.aclose()
+
+
+def _record_usage(data: Any, streamed_chunks: int = 0):
+    """Suma los tokens del campo `usage` (o `x_groq.usage` en streaming).
+
+    Si la respuesta no lo trae, en streaming se cuentan los chunks recibidos
+    como tokens de respuesta.
+    """
+    usage = None
+    if isinstance(data, dict):
+        usage = data.get("usage") or (data.get("x_groq") or {}).get("usage")
+    if usage:
+        GROQ_TOKENS.inc(usage.get("prompt_tokens") or 0, kind="prompt")
+        GROQ_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+    elif streamed_chunks:
+        GROQ_TOKENS.inc(streamed_chunks, kind="completion")
+
+
+def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+    if retry_after:
+        try:
+            # a long Retry-After would stall the request for max_retries times that wait
+            return min(max(float(retry_after), 0.0), MAX_BACKOFF)
+        except ValueError:
+            pass
+    # exponential backoff with full jitter: 0.5s, 1s, 2s, ... capped at MAX_BACKOFF
+    return random.uniform(0, min(MAX_BACKOFF, 0.5 * 2 ** attempt))
+
 
 class GroqConfig(BaseModel):
     api_key: Optional[str]
@@ -24,11 +93,26 @@ class GroqLLM(LLM):
 
     The wrapper sends POST requests with JSON: {"model": model, "prompt": prompt, "max_tokens": max_tokens}
     and expects the provider to return a JSON with a text/completion field. If the response shape differs,
-    adjust `GroqLLM._call()` accordingly.
+    adjust `GroqLLM._extract_text()` accordingly.
+
+    Both `_call` and the async `_acall` reuse pooled keep-alive connections and
+    retry 429/5xx responses and dropped connections with exponential backoff. `_acall` also caps the
+    number of in-flight requests per event loop (`GROQ_MAX_CONCURRENCY`); the
+    slot is released while waiting to retry. Waits never exceed `MAX_BACKOFF`,
+    even when the server asks for a longer `Retry-After`.
+
+    `_stream` / `_astream` send `"stream": true` and parse the Server-Sent
+    Events the provider returns (`data: {...}` lines, ending in `data: [DONE]`),
+    yielding each text delta as soon as it arrives.
+
+    Every HTTP attempt is counted in the `groq_*` metrics of `tracing.REGISTRY`
+    (status, bytes, tokens) and each call is timed as the `groq_http` span.
     """
 
     model: str = "groq-1"
     max_tokens: int = 512
+    timeout: float = 30.0
+    max_retries: int = 3
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -38,7 +122,7 @@ class GroqLLM(LLM):
     def _llm_type(self) -> str:
         return "groq"
 
-    def _call(self, prompt: str, stop: Optional[list[str]] = None) -> str:
+    def _request(self, prompt: str, stream: bool = False) -> "tuple[str, Dict[str, str], str]":
         api_key = os.environ.get("GROQ_API_KEY")
         api_url = os.environ.get("GROQ_API_URL", "https://api.groq.com/v1")
 
@@ -46,17 +130,193 @@ class GroqLLM(LLM):
             raise ValueError("GROQ_API_KEY no está seteada en el entorno. Setea la variable y vuelve a intentar.")
 
         payload = {"model": self.model, "prompt": prompt, "max_tokens": self.max_tokens}
+        if stream:
+            payload["stream"] = True
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
         # The exact endpoint path may vary; user can set GROQ_API_URL including path if necessary.
-        resp = requests.post(api_url, headers=headers, data=json.dumps(payload), timeout=30)
+        return api_url, headers, json.dumps(payload)
+
+    def _call(self, prompt: str, stop: Optional[list[str]] = None) -> str:
+        api_url, headers, body = self._request(prompt)
+        with span("groq_http"):
+            for attempt in range(self.max_retries + 1):
+                GROQ_BYTES.inc(len(body), direction="sent")
+                try:
+                    resp = _SESSION.post(api_url, headers=headers, data=body, timeout=self.timeout)
+                except requests.ConnectionError:
+                    # dropped keep-alive connection or unreachable host
+                    GROQ_REQUESTS.inc(status="connection_error")
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(_backoff(attempt, None))
+                    continue
+                GROQ_REQUESTS.inc(status=str(resp.status_code))
+                GROQ_BYTES.inc(len(resp.content), direction="received")
+                if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    break
+                time.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
         try:
             resp.raise_for_status()
         except Exception as e:
             raise RuntimeError(f"Error al llamar a Groq API: {e} - response: {resp.text}")
+        data = resp.json()
+        _record_usage(data)
+        return self._extract_text(data)
 
+    async def _acall(self, prompt: str, stop: Optional[list[str]] = None) -> str:
+        api_url, headers, body = self._request(prompt)
+        client, limit = _async_client()
+        # the span includes the wait for a free slot under GROQ_MAX_CONCURRENCY
+        with span("groq_http"):
+            for attempt in range(self.max_retries + 1):
+                GROQ_BYTES.inc(len(body), direction="sent")
+                try:
+                    # the slot is held per attempt, not across the backoff sleeps
+                    async with limit:
+                        resp = await client.post(api_url, headers=headers, content=body, timeout=self.timeout)
+                except (httpx.ConnectError, httpx.ReadError, httpx.RemoteProtocolError):
+                    GROQ_REQUESTS.inc(status="connection_error")
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(_backoff(attempt, None))
+                    continue
+                GROQ_REQUESTS.inc(status=str(resp.status_code))
+                GROQ_BYTES.inc(len(resp.content), direction="received")
+                if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    break
+                await asyncio.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
+        try:
+            resp.raise_for_status()
+        except Exception as e:
+            raise RuntimeError(f"Error al llamar a Groq API: {e} - response: {resp.text}")
         data = resp.json()
+        _record_usage(data)
+        return self._extract_text(data)
+
+    def _stream(self, prompt: str, stop: Optional[list[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        api_url, headers, body = self._request(prompt, stream=True)
+        with span("groq_http"):
+            for attempt in range(self.max_retries + 1):
+                GROQ_BYTES.inc(len(body), direction="sent")
+                try:
+                    resp = _SESSION.post(api_url, headers=headers, data=body, timeout=self.timeout, stream=True)
+                except requests.ConnectionError:
+                    # dropped keep-alive connection or unreachable host
+                    GROQ_REQUESTS.inc(status="connection_error")
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(_backoff(attempt, None))
+                    continue
+                GROQ_REQUESTS.inc(status=str(resp.status_code))
+                if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    break
+                resp.close()
+                time.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
+            with resp:
+                try:
+                    resp.raise_for_status()
+                except Exception as e:
+                    raise RuntimeError(f"Error al llamar a Groq API: {e} - response: {resp.text}")
+                chunks, usage = 0, None
+                for line in resp.iter_lines(decode_unicode=True):
+                    GROQ_BYTES.inc(len(line or "") + 1, direction="received")
+                    usage = self._stream_usage(line) or usage
+                    text = self._parse_stream_line(line)
+                    if text:
+                        chunks += 1
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            run_manager.on_llm_new_token(text, chunk=chunk)
+                        yield chunk
+                _record_usage(usage, chunks)
+
+    async def _astream(self, prompt: str, stop: Optional[list[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        api_url, headers, body = self._request(prompt, stream=True)
+        client, limit = _async_client()
+        with span("groq_http"):
+            for attempt in range(self.max_retries + 1):
+                GROQ_BYTES.inc(len(body), direction="sent")
+                req = client.build_request("POST", api_url, headers=headers, content=body, timeout=self.timeout)
+                # the slot is held while the response streams, but not across the backoff sleeps
+                await limit.acquire()
+                try:
+                    resp = await client.send(req, stream=True)
+                except (httpx.ConnectError, httpx.ReadError, httpx.RemoteProtocolError):
+                    limit.release()
+                    GROQ_REQUESTS.inc(status="connection_error")
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(_backoff(attempt, None))
+                    continue
+                except BaseException:
+                    limit.release()
+                    raise
+                GROQ_REQUESTS.inc(status=str(resp.status_code))
+                if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    break
+                try:
+                    await resp.aclose()
+                finally:
+                    limit.release()
+                await asyncio.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
+            try:
+                if resp.is_error:
+                    await resp.aread()
+                    raise RuntimeError(f"Error al llamar a Groq API: {resp.status_code} - response: {resp.text}")
+                chunks, usage = 0, None
+                async for line in resp.aiter_lines():
+                    GROQ_BYTES.inc(len(line) + 1, direction="received")
+                    usage = self._stream_usage(line) or usage
+                    text = self._parse_stream_line(line)
+                    if text:
+                        chunks += 1
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            await run_manager.on_llm_new_token(text, chunk=chunk)
+                        yield chunk
+                _record_usage(usage, chunks)
+            finally:
+                try:
+                    await resp.aclose()
+                finally:
+                    limit.release()
+
+    @staticmethod
+    def _stream_usage(line: str) -> Optional[dict]:
+        # providers send token usage on one of the last events; the substring
+        # check keeps the other events from being parsed twice
+        if not line or '"usage"' not in line or not line.startswith("data:"):
+            return None
+        try:
+            return json.loads(line[len("data:"):])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[str]:
+        # SSE: only "data:" lines carry payload; comments, event names and the
+        # final "[DONE]" marker yield nothing
+        if not line or not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return data
+        if isinstance(event, dict) and "choices" in event and event["choices"]:
+            first = event["choices"][0]
+            delta = first.get("delta") or {}
+            return delta.get("content") or first.get("text") or ""
+        if isinstance(event, dict):
+            return event.get("text") or event.get("completion") or ""
+        return None
 
+    @staticmethod
+    def _extract_text(data: Any) -> str:
         # Heurística para extraer texto de la respuesta.
         # Ajusta según el formato real de la API de Groq (p. ej. data.choices[0].text)
         if isinstance(data, dict):
@@ -76,4 +336,4 @@ class GroqLLM(LLM):
                         return msg["content"]
 
         # fallback: return the raw JSON string
-        return json.dumps(data)
\ No newline at end of file
+        return json.dumps(data)
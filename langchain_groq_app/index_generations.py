@@ -0,0 +1,106 @@
+"""Generaciones del índice FAISS: cada reindexado escribe un directorio nuevo y se publica de forma atómica.
+
+Layout dentro del directorio del índice (p. ej. `kb_faiss/`):
+
+    kb_faiss/CURRENT              nombre de la generación publicada
+    kb_faiss/generations/000003/  index.faiss, index.pkl, manifest.json
+
+Sin `CURRENT` el índice se lee del propio directorio (el layout anterior).
+Una generación nueva empieza como copia de la publicada, así el build sigue
+siendo incremental, y se publica reemplazando `CURRENT` con `os.replace`, que
+es atómico: quien lo lee ve la generación vieja o la nueva, nunca una a medias.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+CURRENT_FILE = "CURRENT"
+GENERATIONS_DIR = "generations"
+# the published generation plus the previous one, to roll back by editing CURRENT
+KEEP_GENERATIONS = int(os.environ.get("INDEX_GENERATIONS_KEEP", "2"))
+
+
+def current_generation(root: str) -> Optional[str]:
+    path = Path(root) / CURRENT_FILE
+    if not path.exists():
+        return None
+    name = path.read_text(encoding="utf-8").strip()
+    return name or None
+
+
+def current_index_dir(root: str) -> Path:
+    """Directorio con los archivos del índice publicado en `root`."""
+    name = current_generation(root)
+    if name is None:
+        return Path(root)
+    return Path(root) / GENERATIONS_DIR / name
+
+
+def list_generations(root: str) -> List[str]:
+    gens = Path(root) / GENERATIONS_DIR
+    if not gens.exists():
+        return []
+    return sorted(p.name for p in gens.iterdir() if p.is_dir() and p.name.isdigit())
+
+
+def new_generation_dir(root: str) -> Path:
+    """Crea la próxima generación como copia de los archivos del índice publicado."""
+    existing = list_generations(root)
+    number = int(existing[-1]) + 1 if existing else 1
+    gen = Path(root) / GENERATIONS_DIR / f"{number:06d}"
+    gen.mkdir(parents=True)
+    source = current_index_dir(root)
+    if source.exists():
+        for f in source.iterdir():
+            if f.is_file() and f.name != CURRENT_FILE:
+                shutil.copy2(f, gen / f.name)
+    return gen
+
+
+def publish(root: str, gen: Path):
+    tmp = Path(root) / (CURRENT_FILE + ".tmp")
+    tmp.write_text(gen.name, encoding="utf-8")
+    os.replace(tmp, Path(root) / CURRENT_FILE)
+
+
+def collect_garbage(root: str, keep: int = KEEP_GENERATIONS) -> List[str]:
+    """Borra las generaciones viejas (y las de builds fallidos); conserva la publicada y las `keep - 1` anteriores.
+
+    Los stores ya cargados en memoria no dependen de sus archivos y, con
+    SHARED_MEMORY, un archivo borrado sigue mapeado hasta que se suelta, así
+    que borrar una generación no afecta a las consultas que todavía la usan.
+    """
+    current = current_generation(root)
+    if current is None:
+        return []
+    older = [g for g in list_generations(root) if g < current]
+    kept = {current, *(older[-(keep - 1):] if keep > 1 else [])}
+    removed = []
+    for name in list_generations(root):
+        if name not in kept:
+            shutil.rmtree(Path(root) / GENERATIONS_DIR / name, ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def build_generation(kb_dir: str, root: str, **build_kwargs) -> Tuple[Optional[Path], dict]:
+    """Indexa `kb_dir` en una generación nueva de `root` y la publica.
+
+    Devuelve `(generación, estadísticas)`; la generación es None cuando no
+    cambió ningún archivo y se sigue usando la publicada.
+    """
+    from langchain_groq_app.index_kb import build_and_save_faiss
+
+    gen = new_generation_dir(root)
+    try:
+        stats = build_and_save_faiss(kb_dir, str(gen), **build_kwargs)
+    except BaseException:
+        shutil.rmtree(gen, ignore_errors=True)
+        raise
+    if not (stats["files"] or stats["deleted"]):
+        shutil.rmtree(gen, ignore_errors=True)
+        return None, stats
+    publish(root, gen)
+    return gen, stats
@@ -1,39 +1,275 @@
 import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from langchain_community.embeddings import SentenceTransformerEmbeddings
+import faiss
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 
+from langchain_groq_app.ann_index import INDEX_TYPES, NO_REMOVE_TYPES, build_ann_index
+from langchain_groq_app.embedding_cache import CachedEmbeddings, open_embedding_cache
+from langchain_groq_app.encoders import BACKENDS, ENCODER_BACKEND, QUERY_CACHE_SIZE, QueryCache, SentenceEncoder
 
-def load_knowledge_texts(kb_dir: Path) -> List[str]:
-    texts = []
+
+MANIFEST_FILE = "manifest.json"
+# 2: chunk ids are "<path>#<n>"; a version 1 manifest forces a full rebuild
+MANIFEST_VERSION = 2
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# empty string disables the on-disk embedding cache
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "200000"))
+# ~800 characters stay well inside MiniLM's 256-token window for Spanish text
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+BATCH_SIZE = 64
+# flat | ivf_flat | ivf_pq | hnsw (see ann_index)
+INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat")
+
+
+def iter_knowledge_files(kb_dir: Path) -> Iterator[Tuple[str, str]]:
+    """Genera (ruta relativa, texto) de los .txt/.md de la KB, un archivo a la vez."""
     for p in sorted(kb_dir.glob("**/*")):
         if p.is_file() and p.suffix.lower() in {".txt", ".md"}:
             with open(p, "r", encoding="utf-8") as f:
-                texts.append(f.read())
-    return texts
+                yield p.relative_to(kb_dir).as_posix(), f.read()
+
+
+def load_knowledge_files(kb_dir: Path) -> Dict[str, str]:
+    return dict(iter_knowledge_files(kb_dir))
+
+
+def load_knowledge_texts(kb_dir: Path) -> List[str]:
+    return list(load_knowledge_files(kb_dir).values())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def iter_chunks(files: Iterable[Tuple[str, str]], manifest_files: dict) -> Iterator[Tuple[str, dict, str]]:
+    """Parte cada archivo en chunks y genera (texto, metadata, id).
+
+    Los ids (`<ruta>#<n>`) son estables entre rebuilds; a medida que pasan se
+    registran en `manifest_files` junto con el hash del archivo.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for src, text in files:
+        entry = manifest_files[src] = {"sha256": content_hash(text), "ids": []}
+        for i, chunk in enumerate(splitter.split_text(text)):
+            chunk_id = f"{src}#{i}"
+            entry["ids"].append(chunk_id)
+            yield chunk, {"source": src, "chunk": i}, chunk_id
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest(store: Optional[FAISS], chunks: Iterable[Tuple[str, dict, str]], embeddings, batch_size: int = BATCH_SIZE) -> Tuple[Optional[FAISS], int]:
+    """Embebe los chunks en lotes de `batch_size` y los agrega al índice a medida que llegan.
+
+    Sólo un lote de textos y vectores vive en memoria a la vez (además del
+    docstore del propio índice). Devuelve el store (creado con el primer lote
+    si era None) y la cantidad de chunks agregados.
+    """
+    added = 0
+    for batch in batched(chunks, batch_size):
+        texts = [c[0] for c in batch]
+        vectors = embeddings.embed_documents(texts)
+        pairs = list(zip(texts, vectors))
+        metadatas = [c[1] for c in batch]
+        ids = [c[2] for c in batch]
+        if store is None:
+            store = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        added += len(batch)
+    return store, added
+
+
+def load_manifest(index_dir: Path) -> Optional[dict]:
+    path = index_dir / MANIFEST_FILE
+    if not path.exists() or not (index_dir / "index.faiss").exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
 
+def save_manifest(index_dir: Path, manifest: dict):
+    with open(index_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
 
-def build_and_save_faiss(kb_dir: str = "knowledge_base", output_dir: str = "kb_faiss"):
+
+def make_encoder(model_name: str = EMBEDDING_MODEL, backend: str = ENCODER_BACKEND):
+    # SentenceEncoder for fp32 too (same vectors as SentenceTransformerEmbeddings), so ENCODER_THREADS applies
+    return SentenceEncoder(model_name, backend)
+
+
+def get_embeddings(model_name: str = EMBEDDING_MODEL, backend: str = ENCODER_BACKEND, query_cache_size: int = QUERY_CACHE_SIZE):
+    """El encoder de `backend` (ver `encoders`) detrás de la caché persistente de
+    embeddings y de la LRU de preguntas (`encoders.QueryCache`).
+
+    Los vectores cuantizados difieren un poco de los fp32, así que cada
+    backend tiene su propio espacio en la caché en disco.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de encoder desconocido: {backend!r}. Opciones: {', '.join(BACKENDS)}")
+    if not EMBEDDING_CACHE_DIR:
+        emb = make_encoder(model_name, backend)
+    else:
+        cache_name = model_name if backend == "fp32" else f"{model_name}-{backend}"
+        cache = open_embedding_cache(EMBEDDING_CACHE_DIR, cache_name, capacity=EMBEDDING_CACHE_SIZE)
+        emb = CachedEmbeddings(lambda: make_encoder(model_name, backend), cache)
+    return QueryCache(emb, query_cache_size) if query_cache_size > 0 else emb
+
+
+def load_faiss_store(index_dir: str, embeddings, mmap: bool = False) -> FAISS:
+    """Carga un índice guardado con `save_faiss_store`.
+
+    Con `mmap` los vectores no se copian a memoria: se mapean desde
+    `index.faiss` (faiss >= 1.8, `IO_FLAG_MMAP_IFC`), así que los procesos que
+    cargan el mismo archivo comparten sus páginas en el page cache.
+    """
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and flag is not None:
+        index = faiss.read_index(str(Path(index_dir) / "index.faiss"), flag)
+        # the same unpickling FAISS.load_local does; the index is always one we wrote ourselves
+        with open(Path(index_dir) / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+    if mmap:
+        print("Esta versión de faiss no soporta IO_FLAG_MMAP_IFC; el índice se carga en memoria")
+    # langchain-community >= 0.1 requires an explicit opt-in to unpickle the
+    # docstore; the index is always one we wrote ourselves
+    try:
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    except TypeError:
+        return FAISS.load_local(index_dir, embeddings)
+
+
+def save_faiss_store(faiss_store: FAISS, index_dir: Path):
+    """Guarda el store y reemplaza los archivos con `os.replace`.
+
+    Un proceso que tiene `index.faiss` mapeado (ver `load_faiss_store`) sigue
+    leyendo el archivo anterior; escribir encima lo truncaría bajo sus pies.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    partial = index_dir / ".partial"
+    faiss_store.save_local(str(partial))
+    for name in ("index.faiss", "index.pkl"):
+        os.replace(partial / name, index_dir / name)
+    shutil.rmtree(partial, ignore_errors=True)
+
+
+def use_index_type(faiss_store: FAISS, index_type: str):
+    """Reemplaza el índice flat del store por uno `index_type`, entrenado sobre sus vectores.
+
+    Las posiciones se conservan, así que `index_to_docstore_id` sigue siendo válido.
+    """
+    if index_type == "flat":
+        return
+    flat = faiss_store.index
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    faiss_store.index = build_ann_index(index_type, vectors, flat.metric_type)
+
+
+def build_and_save_faiss(kb_dir: str = "knowledge_base", output_dir: str = "kb_faiss", full: bool = False, batch_size: int = BATCH_SIZE, index_type: str = INDEX_TYPE, embeddings=None) -> dict:
+    """Indexa la KB en FAISS de forma incremental y en streaming.
+
+    Los archivos se leen uno a uno, se parten en chunks y se embeben en lotes
+    de `batch_size` que se agregan al índice a medida que llegan, así que la
+    memoria pico no depende del tamaño del corpus.
+
+    Junto al índice se guarda `manifest.json` con el hash de contenido de cada
+    archivo y los ids de sus chunks en el docstore. Si el manifiesto existe
+    (y `full` es False) sólo se re-embeben los archivos nuevos o modificados y
+    se eliminan los chunks de los borrados. Devuelve estadísticas del build.
+
+    `index_type` elige el índice FAISS (ver `ann_index`); los aproximados se
+    entrenan sobre el corpus completo una vez embebido. `embeddings` permite
+    reusar un modelo ya cargado (p. ej. el del servidor); por defecto se crea
+    uno con `get_embeddings()`.
+    """
     kb_path = Path(kb_dir)
     if not kb_path.exists():
         raise FileNotFoundError(f"Knowledge base directory not found: {kb_path}")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: {index_type!r}. Opciones: {', '.join(INDEX_TYPES)}")
 
-    texts = load_knowledge_texts(kb_path)
-    if not texts:
-        raise ValueError("No text files found in knowledge_base/ to index.")
+    out = Path(output_dir)
+    manifest = None if full else load_manifest(out)
+    if manifest is not None and manifest.get("index_type", "flat") != index_type:
+        print(f"El índice existente es {manifest.get('index_type', 'flat')}; se reconstruye como {index_type}")
+        manifest = None
+    start = time.perf_counter()
 
-    print(f"Indexando {len(texts)} documento(s) desde {kb_path}")
+    if manifest is None:
+        print(f"Indexando documentos desde {kb_path}")
+        # Use sentence-transformers model as requested (behind the embedding cache)
+        embeddings = embeddings or get_embeddings()
+        files: dict = {}
+        faiss_store, added = ingest(None, iter_chunks(iter_knowledge_files(kb_path), files), embeddings, batch_size)
+        if faiss_store is None:
+            raise ValueError("No text files found in knowledge_base/ to index.")
+        use_index_type(faiss_store, index_type)
+        manifest = {"version": MANIFEST_VERSION, "index_type": index_type, "files": files}
+        changed, deleted = list(files), []
+    else:
+        # first pass only hashes, one file at a time, to find what changed
+        hashes = {src: content_hash(text) for src, text in iter_knowledge_files(kb_path)}
+        if not hashes:
+            raise ValueError("No text files found in knowledge_base/ to index.")
+        known = manifest["files"]
+        changed = [src for src in hashes if known.get(src, {}).get("sha256") != hashes[src]]
+        deleted = [src for src in known if src not in hashes]
+        if not changed and not deleted:
+            print(f"Índice FAISS al día en {out.resolve()}: no hay archivos nuevos, modificados ni borrados.")
+            return {"files": 0, "deleted": 0, "chunks": 0, "seconds": time.perf_counter() - start, "chunks_per_sec": 0.0}
+        if index_type in NO_REMOVE_TYPES and any(known.get(src) for src in changed + deleted):
+            print(f"Un índice {index_type} no permite borrar vectores en el lugar; se reconstruye completo")
+            return build_and_save_faiss(kb_dir, output_dir, full=True, batch_size=batch_size, index_type=index_type, embeddings=embeddings)
+        print(f"Actualización incremental desde {kb_path}: {len(changed)} nuevo(s)/modificado(s), {len(deleted)} borrado(s)")
 
-    # Use sentence-transformers model as requested
-    embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+        embeddings = embeddings or get_embeddings()
+        faiss_store = load_faiss_store(str(out), embeddings)
+        present = set(faiss_store.index_to_docstore_id.values())
+        stale = [i for src in changed + deleted for i in known.get(src, {}).get("ids", []) if i in present]
+        if stale:
+            faiss_store.delete(stale)
+        for src in deleted:
+            del known[src]
+        wanted = set(changed)
+        changed_files = ((src, text) for src, text in iter_knowledge_files(kb_path) if src in wanted)
+        faiss_store, added = ingest(faiss_store, iter_chunks(changed_files, known), embeddings, batch_size)
 
-    faiss_store = FAISS.from_texts(texts, embeddings)
-    out = Path(output_dir)
-    out.mkdir(parents=True, exist_ok=True)
-    faiss_store.save_local(str(out))
-    print(f"Índice FAISS guardado en: {out.resolve()}")
+    save_faiss_store(faiss_store, out)
+    # written last: an interrupted build leaves the previous manifest, so the
+    # next run redoes the same changes
+    save_manifest(out, manifest)
+    elapsed = time.perf_counter() - start
+    stats = {
+        "files": len(changed),
+        "deleted": len(deleted),
+        "chunks": added,
+        "seconds": elapsed,
+        "chunks_per_sec": added / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"Índice FAISS guardado en: {out.resolve()} ({added} chunks de {len(changed)} archivo(s), {stats['chunks_per_sec']:.1f} chunks/s)")
+    return stats
 
 
 if __name__ == "__main__":
@@ -42,5 +278,18 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser(description="Indexar knowledge_base/ a FAISS usando all-MiniLM-L6-v2")
     p.add_argument("--kb_dir", default="knowledge_base", help="Carpeta con archivos de la base de conocimientos")
     p.add_argument("--out", default="kb_faiss", help="Directorio destino para guardar el índice FAISS")
+    p.add_argument("--full", action="store_true", help="Ignorar el manifiesto y reconstruir todo el índice")
+    p.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Chunks por lote de embedding")
+    p.add_argument("--index_type", choices=INDEX_TYPES, default=INDEX_TYPE, help="Tipo de índice FAISS (exacto o aproximado)")
+    p.add_argument("--encoder", choices=BACKENDS, default=ENCODER_BACKEND, help="Backend del encoder MiniLM (el índice es el mismo)")
     args = p.parse_args()
-    build_and_save_faiss(args.kb_dir, args.out)
+    from langchain_groq_app.index_generations import build_generation, collect_garbage, current_generation
+
+    if current_generation(args.out) is not None:
+        # the server publishes generations here; build the next one instead of the stale top-level files
+        build_generation(args.kb_dir, args.out, full=args.full, batch_size=args.batch_size, index_type=args.index_type,
+                         embeddings=get_embeddings(backend=args.encoder))
+        collect_garbage(args.out)
+    else:
+        build_and_save_faiss(args.kb_dir, args.out, full=args.full, batch_size=args.batch_size, index_type=args.index_type,
+                             embeddings=get_embeddings(backend=args.encoder))
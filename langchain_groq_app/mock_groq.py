@@ -0,0 +1,142 @@
+"""Servidor stub de la API de Groq para pruebas locales sin red ni API key.
+
+Responde cualquier POST con un texto fijo. Sin `"stream": true` espera el
+tiempo de generación completo y devuelve un JSON; con `"stream": true` emite
+un evento SSE por palabra, así que el tiempo al primer token es sólo
+`first_token_ms`.
+
+Para pruebas de carga la latencia al primer token puede seguir una
+distribución (`MOCK_LATENCY`: fixed, uniform, exponential o lognormal, con
+media `first_token_ms`), una fracción `MOCK_ERROR_RATE` de las llamadas
+responde `MOCK_ERROR_STATUS` y con `MOCK_STREAM=0` el streaming manda la
+respuesta entera en un solo evento al final, como un proveedor sin streaming
+incremental. Con `MOCK_PROMPT_TOKEN_MS` cada palabra del prompt suma ese
+tiempo al primer token (el prefill), así que los prompts más largos tardan
+más, como en la API real. `GET /stats` cuenta llamadas y errores inyectados.
+
+    python -m langchain_groq_app.mock_groq --port 9000 --latency lognormal --error_rate 0.01
+    $env:GROQ_API_URL = "http://127.0.0.1:9000/v1"
+"""
+import asyncio
+import json
+import math
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+FIRST_TOKEN_MS = float(os.environ.get("MOCK_FIRST_TOKEN_MS", "300"))
+TOKEN_MS = float(os.environ.get("MOCK_TOKEN_MS", "30"))
+# prefill cost per prompt token, added to the first-token latency
+PROMPT_TOKEN_MS = float(os.environ.get("MOCK_PROMPT_TOKEN_MS", "0"))
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+LATENCY = os.environ.get("MOCK_LATENCY", "fixed")
+# spread of the lognormal distribution (sigma of the underlying normal)
+LATENCY_SIGMA = float(os.environ.get("MOCK_LATENCY_SIGMA", "0.5"))
+ERROR_RATE = float(os.environ.get("MOCK_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.environ.get("MOCK_ERROR_STATUS", "503"))
+STREAM = os.environ.get("MOCK_STREAM", "1") == "1"
+RNG = random.Random(int(os.environ.get("MOCK_SEED", "0")))
+STATS = {"requests": 0, "streamed": 0, "errors": 0}
+ANSWER = (
+    "Para abrir una cuenta necesitas tu documento de identidad vigente, un comprobante de domicilio "
+    "y un depósito inicial. Puedes iniciar el trámite en la banca en línea o en cualquier sucursal."
+)
+
+app = FastAPI(title="Groq mock")
+
+
+def tokens(text: str):
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def first_token_ms() -> float:
+    """Latencia al primer token de una llamada, según `LATENCY` y con media FIRST_TOKEN_MS."""
+    if LATENCY == "uniform":
+        return RNG.uniform(0, 2 * FIRST_TOKEN_MS)
+    if LATENCY == "exponential":
+        return RNG.expovariate(1 / FIRST_TOKEN_MS) if FIRST_TOKEN_MS > 0 else 0.0
+    if LATENCY == "lognormal" and FIRST_TOKEN_MS > 0:
+        # mu chosen so the mean (not the median) stays at FIRST_TOKEN_MS
+        return RNG.lognormvariate(math.log(FIRST_TOKEN_MS) - LATENCY_SIGMA ** 2 / 2, LATENCY_SIGMA)
+    return FIRST_TOKEN_MS
+
+
+def usage(prompt: str) -> dict:
+    # whitespace-separated words stand in for tokens
+    prompt_tokens, completion_tokens = len(prompt.split()), len(tokens(ANSWER))
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def sse_events(model: str, first_ms: float, prompt: str):
+    await asyncio.sleep(first_ms / 1000)
+    # like Groq, token usage travels in `x_groq` on the last event
+    last = {"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage(prompt)}}
+    if not STREAM:
+        # the whole answer in one event once generation is done
+        await asyncio.sleep(TOKEN_MS * (len(tokens(ANSWER)) - 1) / 1000)
+        event = {"model": model, "choices": [{"index": 0, "delta": {"content": ANSWER}}]}
+        yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    else:
+        for i, tok in enumerate(tokens(ANSWER)):
+            if i:
+                await asyncio.sleep(TOKEN_MS / 1000)
+            event = {"model": model, "choices": [{"index": 0, "delta": {"content": tok}}]}
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    yield f"data: {json.dumps(last)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/stats")
+async def stats():
+    return STATS
+
+
+@app.post("/{path:path}")
+async def completions(path: str, request: Request):
+    payload = await request.json()
+    model = payload.get("model", "groq-1")
+    STATS["requests"] += 1
+    first_ms = first_token_ms() + PROMPT_TOKEN_MS * len(payload.get("prompt", "").split())
+    if ERROR_RATE and RNG.random() < ERROR_RATE:
+        STATS["errors"] += 1
+        # errors come back after a normal first-token delay, like a loaded provider
+        await asyncio.sleep(first_ms / 1000)
+        headers = {"Retry-After": "1"} if ERROR_STATUS == 429 else None
+        return JSONResponse({"error": {"message": "mock: error inyectado"}}, status_code=ERROR_STATUS, headers=headers)
+    if payload.get("stream"):
+        STATS["streamed"] += 1
+        return StreamingResponse(sse_events(model, first_ms, payload.get("prompt", "")), media_type="text/event-stream")
+    await asyncio.sleep((first_ms + TOKEN_MS * (len(tokens(ANSWER)) - 1)) / 1000)
+    return {"model": model, "choices": [{"index": 0, "text": ANSWER}], "usage": usage(payload.get("prompt", ""))}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    p = argparse.ArgumentParser(description="Stub local de la API de Groq (respuestas JSON y streaming SSE)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--first_token_ms", type=float, default=FIRST_TOKEN_MS, help="Latencia hasta el primer token")
+    p.add_argument("--token_ms", type=float, default=TOKEN_MS, help="Latencia entre tokens")
+    p.add_argument("--prompt_token_ms", type=float, default=PROMPT_TOKEN_MS, help="Latencia extra al primer token por token del prompt")
+    p.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default=LATENCY, help="Distribución de la latencia al primer token")
+    p.add_argument("--latency_sigma", type=float, default=LATENCY_SIGMA, help="Dispersión de la distribución lognormal")
+    p.add_argument("--error_rate", type=float, default=ERROR_RATE, help="Fracción de llamadas que responden con error")
+    p.add_argument("--error_status", type=int, default=ERROR_STATUS, help="Código HTTP de los errores inyectados")
+    p.add_argument("--no_stream", action="store_true", help="Responder los pedidos con stream en un solo evento al final")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+    FIRST_TOKEN_MS, TOKEN_MS, PROMPT_TOKEN_MS = args.first_token_ms, args.token_ms, args.prompt_token_ms
+    LATENCY, LATENCY_SIGMA = args.latency, args.latency_sigma
+    ERROR_RATE, ERROR_STATUS = args.error_rate, args.error_status
+    STREAM = STREAM and not args.no_stream
+    RNG = random.Random(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port)
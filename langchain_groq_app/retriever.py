@@ -0,0 +1,121 @@
+"""Retrievers del servidor sobre el store FAISS de LangChain, con spans por etapa.
+
+- `FAISSRetriever`: búsqueda densa (MiniLM) sobre el índice completo.
+- `CascadeRetriever`: TF-IDF elige `candidates` chunks y sólo sus vectores
+  MiniLM ya guardados en el índice se comparan con la pregunta.
+"""
+from typing import Any, List, Sequence
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from langchain_groq_app.encoders import embed_queries
+from langchain_groq_app.sparse_index import TfidfIndex
+from langchain_groq_app.tracing import span
+
+
+def dense_search(store, query: str, k: int) -> List[Document]:
+    with span("embed_query"):
+        vector = store.embedding_function.embed_query(query)
+    with span("faiss_search"):
+        return store.similarity_search_by_vector(vector, k=k)
+
+
+class FAISSRetriever(BaseRetriever):
+    """Como `store.as_retriever(search_kwargs={"k": k})`, pero mide por separado
+    el encode de la pregunta (`embed_query`) y la búsqueda en el índice con la
+    lectura del docstore (`faiss_search`)."""
+
+    vectorstore: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return dense_search(self.vectorstore, query, self.k)
+
+    def retrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """Las mismas búsquedas que `invoke` para varias preguntas, con un encode y un `index.search` del lote."""
+        store = self.vectorstore
+        with span("embed_query"):
+            vectors = np.asarray(embed_queries(store.embedding_function, queries), dtype="float32")
+        with span("faiss_search"):
+            if getattr(store, "_normalize_L2", False):
+                faiss.normalize_L2(vectors)
+            _, idxs = store.index.search(vectors, self.k)
+            return [[store.docstore.search(store.index_to_docstore_id[int(i)]) for i in row if i != -1]
+                    for row in idxs]
+
+
+class CascadeRetriever(BaseRetriever):
+    """Recuperación en dos etapas: candidatos TF-IDF y re-rank con los vectores MiniLM del índice.
+
+    El TF-IDF se ajusta sobre los textos del docstore y `ids` guarda, para
+    cada fila, el id FAISS del chunk (el de `index_to_docstore_id`), así que
+    un candidato se traduce a un id cuyo vector se lee con `reconstruct_batch`
+    (sin recorrer el resto del índice). El puntaje final usa la misma métrica que el índice, de modo
+    que si el chunk correcto está entre los candidatos el orden es el de la
+    búsqueda densa. Si la pregunta no comparte términos con la KB (menos de
+    `k` candidatos) se hace la búsqueda densa completa. Crear con `from_vectorstore`.
+    """
+
+    vectorstore: Any
+    tfidf: Any
+    # FAISS id of every TF-IDF row
+    ids: Any
+    k: int = 4
+    candidates: int = 100
+
+    @classmethod
+    def from_vectorstore(cls, store, k: int = 4, candidates: int = 100) -> "CascadeRetriever":
+        index = store.index
+        try:
+            # IVF indexes can only reconstruct by id through a direct map
+            faiss.extract_index_ivf(index).make_direct_map()
+        except RuntimeError:
+            pass
+        # FAISS ids need not be 0..ntotal-1 (e.g. an IndexIDMap): never assume they are positions
+        ids = np.array(sorted(store.index_to_docstore_id), dtype="int64")
+        texts = [store.docstore.search(store.index_to_docstore_id[int(i)]).page_content for i in ids]
+        return cls(vectorstore=store, tfidf=TfidfIndex(texts), ids=ids, k=k, candidates=max(candidates, k))
+
+    def rerank(self, vector: np.ndarray, rows: Sequence[int]) -> List[Document]:
+        store = self.vectorstore
+        ids = self.ids[np.asarray(rows, dtype="int64")]
+        vectors = store.index.reconstruct_batch(ids)
+        if getattr(store, "_normalize_L2", False):
+            vector = vector / np.linalg.norm(vector)
+        if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = vectors @ vector
+        else:
+            scores = -((vectors - vector) ** 2).sum(axis=1)
+        best = ids[np.argsort(-scores, kind="stable")[:self.k]]
+        return [store.docstore.search(store.index_to_docstore_id[int(i)]) for i in best]
+
+    def retrieve_many(self, queries: List[str]) -> List[List[Document]]:
+        """Las mismas búsquedas que `invoke` para varias preguntas, con un solo encode del lote."""
+        store = self.vectorstore
+        with span("candidates"):
+            hits = self.tfidf.top(queries, self.candidates)
+        with span("embed_query"):
+            vectors = np.asarray(embed_queries(store.embedding_function, queries), dtype="float32")
+        results = []
+        with span("rerank"):
+            for query, vector, rows in zip(queries, vectors, hits):
+                if len(rows) < self.k:
+                    results.append(store.similarity_search_by_vector(vector.tolist(), k=self.k))
+                else:
+                    results.append(self.rerank(vector, rows))
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("candidates"):
+            rows = self.tfidf.top([query], self.candidates)[0]
+        if len(rows) < self.k:
+            # no lexical overlap with the KB: fall back to the full dense search
+            return dense_search(self.vectorstore, query, self.k)
+        with span("embed_query"):
+            vector = np.asarray(self.vectorstore.embedding_function.embed_query(query), dtype="float32")
+        with span("rerank"):
+            return self.rerank(vector, rows)
@@ -0,0 +1,147 @@
+"""Enrutador de intenciones compartido por app.py y server.py.
+
+Todas las reglas (disparadores de saldo, patrones de ID y términos de KB) se
+compilan una sola vez en una única expresión regular con grupos nombrados, así
+que clasificar una pregunta es una sola pasada sobre el texto que devuelve a la
+vez la intención y el ID extraído. La regex corre sobre el texto en minúsculas.
+
+solution_micaela/router.py tiene una copia reducida de este enrutador (sus
+scripts importan módulos por nombre y no este paquete); un arreglo en uno
+suele hacer falta también en el otro.
+"""
+import bisect
+import re
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+
+# regex fragments; "consultar saldo" also catches "consultar saldos"
+BALANCE_TERMS = (r"\bsaldo\b", r"\bbalance\b", r"consultar saldo")
+# in priority order: a 6-12 digit run anywhere wins over a "cedula: X" style tag
+ID_PATTERNS = (
+    r"\d{6,12}",
+    r"\b(?:cedula|cédula|dni|id)[:\s]*(?=(?P<value>[A-Za-z0-9\-]+))",
+)
+KB_TERMS = (
+    "abrir cuenta",
+    "apertura de cuenta",
+    "transferencia",
+    "hacer una transferencia",
+    "deposito",
+    "depósito",
+    "tarjeta",
+    "cheque",
+    "requisitos",
+    "documentos",
+)
+# joins the texts of route_many; no rule can match across it
+SEPARATOR = "\x00"
+
+
+class Route(NamedTuple):
+    balance_id: Optional[str]
+    kb: bool
+
+    @property
+    def intent(self) -> str:
+        if self.balance_id is not None:
+            return "balance"
+        return "kb" if self.kb else "general"
+
+
+class Router:
+    """Clasifica preguntas en saldo / KB / general.
+
+    Si hay `balance_terms` (fragmentos de regex), un ID sólo cuenta cuando el
+    texto también nombra alguno de ellos; sin `balance_terms` basta con el ID.
+    Los `id_patterns` van en orden de prioridad y pueden capturar el valor en
+    un grupo `(?P<value>...)`; si no, el ID es el match completo. Las reglas
+    se aplican sobre el texto en minúsculas; el ID se devuelve tal como
+    aparece en el texto original.
+    """
+
+    def __init__(self, kb_terms: Iterable[str] = KB_TERMS, balance_terms: Iterable[str] = BALANCE_TERMS,
+                 id_patterns: Sequence[str] = ID_PATTERNS):
+        self.kb_terms = tuple(kb_terms)
+        self.balance_terms = tuple(balance_terms)
+        self.id_patterns = tuple(id_patterns)
+        parts = []
+        for i, pat in enumerate(self.id_patterns):
+            parts.append(f"(?P<id{i}>{pat.replace('(?P<value>', f'(?P<value{i}>')})")
+        if self.balance_terms:
+            parts.append("(?P<bal>" + "|".join(self.balance_terms) + ")")
+        if self.kb_terms:
+            # longest first, so a long term is not shadowed by a shorter one at the same position
+            terms = sorted({t.lower() for t in self.kb_terms}, key=len, reverse=True)
+            parts.append("(?P<kb>" + "|".join(re.escape(t) for t in terms) + ")")
+        rules = "|".join(parts)
+        self.pattern = re.compile(rules)
+        # for the rare texts whose length changes when lowercased (e.g. "İ")
+        self._pattern_ci = re.compile(rules, re.I)
+
+    def _matches(self, text: str):
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return self.pattern.finditer(lowered)
+        return self._pattern_ci.finditer(text)
+
+    def _id_value(self, m: re.Match, i: int, text: str) -> str:
+        # spans are the same in the lowercased text, so slice the original
+        name = f"value{i}" if m.groupdict().get(f"value{i}") is not None else f"id{i}"
+        start, end = m.span(name)
+        return text[start:end]
+
+    def _decide(self, ids: List[Optional[str]], bal: bool, kb: bool) -> Route:
+        balance_id = None
+        if bal or not self.balance_terms:
+            balance_id = next((v for v in ids if v is not None), None)
+        return Route(balance_id, kb)
+
+    def route(self, text: str) -> Route:
+        ids: List[Optional[str]] = [None] * len(self.id_patterns)
+        bal = kb = False
+        for m in self._matches(text):
+            name = m.lastgroup
+            if name == "kb":
+                kb = True
+            elif name == "bal":
+                bal = True
+            else:
+                i = int(name[2:])
+                if ids[i] is None:
+                    ids[i] = self._id_value(m, i, text)
+        return self._decide(ids, bal, kb)
+
+    def route_many(self, texts: Sequence[str]) -> List[Route]:
+        """Clasifica un lote con una sola pasada de la regex sobre los textos concatenados."""
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + 1
+        n_ids = len(self.id_patterns)
+        ids = [[None] * n_ids for _ in texts]
+        bal = [False] * len(texts)
+        kb = [False] * len(texts)
+        joined = SEPARATOR.join(texts)
+        for m in self._matches(joined):
+            j = bisect.bisect_right(starts, m.start()) - 1
+            name = m.lastgroup
+            if name == "bal":
+                bal[j] = True
+            elif name == "kb":
+                kb[j] = True
+            else:
+                i = int(name[2:])
+                if ids[j][i] is None:
+                    ids[j][i] = self._id_value(m, i, joined)
+        return [self._decide(ids[j], bal[j], kb[j]) for j in range(len(texts))]
+
+
+ROUTER = Router()
+
+
+def is_balance_query(text: str) -> Optional[str]:
+    return ROUTER.route(text).balance_id
+
+
+def is_kb_query(text: str) -> bool:
+    return ROUTER.route(text).kb
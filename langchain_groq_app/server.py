@@ -1,21 +1,59 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import asyncio
+import json
 import os
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from pathlib import Path
-import re
-import pandas as pd
+import time
 
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import FAISS
+from starlette.concurrency import run_in_threadpool
 
-from langchain_groq_app.groq_llm import GroqLLM
-from langchain_groq_app.index_kb import build_and_save_faiss
+from langchain_groq_app.answer_cache import AnswerCache, normalize_question
+from langchain_groq_app.context_packing import pack_documents
+from langchain_groq_app.index_generations import current_generation, current_index_dir
+from langchain_groq_app.router import ROUTER, Route
+from langchain_groq_app.singleflight import SingleFlight
+from langchain_groq_app.tracing import REGISTRY, STAGE_SECONDS, span, trace
+
+# langchain, faiss, pandas and the embedding model are imported and loaded by
+# warm_up() in a background thread, so the process starts serving /health and
+# /ready right away
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 KB_INDEX_DIR = "kb_faiss"
 DATA_CSV = "data/saldos.csv"
+# with several uvicorn workers: map the FAISS vectors and a columnar export of
+# the balances from disk so the workers share those pages instead of copying them
+SHARED_MEMORY = os.environ.get("SHARED_MEMORY", "0") == "1"
+BALANCES_MMAP_DIR = os.environ.get("BALANCES_MMAP_DIR", "balances_mmap")
+# sqlite: stream the CSV into an indexed on-disk database (balance_index.open_sqlite)
+# for files that do not fit in RAM; memory: load it with pandas (or SHARED_MEMORY)
+BALANCES_BACKEND = os.environ.get("BALANCES_BACKEND", "memory")
+BALANCES_DB_DIR = os.environ.get("BALANCES_DB_DIR", "balances_db")
+# query-time knobs for approximate indexes (ignored by flat)
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "64"))
+RETRIEVER_K = 4
+# dense: MiniLM over the whole index; cascade: TF-IDF picks CASCADE_CANDIDATES
+# chunks and only their stored MiniLM vectors are scored (retriever.CascadeRetriever)
+KB_RETRIEVER = os.environ.get("KB_RETRIEVER", "dense")
+CASCADE_CANDIDATES = int(os.environ.get("CASCADE_CANDIDATES", "100"))
+# answer cache in front of QA_CHAIN / LLM; size 0 disables it
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.92"))
+# finished reindex jobs kept for GET /reindex/{id}
+REINDEX_JOBS_KEEP = 100
 
 
 class QueryRequest(BaseModel):
@@ -27,18 +65,70 @@ class QueryResponse(BaseModel):
     answer: str
 
 
-app = FastAPI(title="LangChain Groq Router")
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
+
+
+class BalanceLookupRequest(BaseModel):
+    ids: List[str]
+
+
+class BalanceLookupResult(BaseModel):
+    id: str
+    found: bool
+    answer: str
+
 
+class BalanceLookupResponse(BaseModel):
+    results: List[BalanceLookupResult]
 
-def load_vectorstore(index_dir: str = KB_INDEX_DIR):
-    emb = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    idx = Path(index_dir)
+
+app = FastAPI(title="LangChain Groq Router")
+# identical concurrent /query and /reindex calls share one computation
+FLIGHTS = SingleFlight()
+REINDEX_LOCK = asyncio.Lock()
+REINDEX_JOBS: "OrderedDict[str, dict]" = OrderedDict()
+# keeps the background tasks referenced until they finish
+REINDEX_TASKS: Dict[str, asyncio.Task] = {}
+
+VECTORSTORE = None
+RETRIEVER = None
+BALANCES_DF = None
+BALANCE_INDEX = None
+BALANCE_COLUMNS: List[str] = []
+LLM = None
+QA_CHAIN = None
+# exact matches only until warm_up() attaches the KB embeddings
+ANSWER_CACHE = AnswerCache(None, capacity=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD)
+
+RESOURCES = ("balances", "llm", "vectorstore", "qa_chain", "embeddings")
+READINESS: Dict[str, dict] = {name: {"state": "pending"} for name in RESOURCES}
+WARM_UP_DONE = threading.Event()
+_WARM_UP_LOCK = threading.Lock()
+_WARM_UP_THREAD: Optional[threading.Thread] = None
+
+
+def load_vectorstore(index_dir: str = KB_INDEX_DIR, embeddings=None):
+    """Carga la generación publicada en `index_dir` (o un directorio de generación concreto)."""
+    from langchain_groq_app.ann_index import set_search_params
+    from langchain_groq_app.index_kb import get_embeddings, load_faiss_store
+
+    emb = embeddings or get_embeddings()
+    idx = current_index_dir(index_dir)
     if not idx.exists():
         raise FileNotFoundError(f"Índice FAISS no encontrado en {idx}. Ejecuta index_kb primero.")
-    return FAISS.load_local(str(idx), emb)
+    store = load_faiss_store(str(idx), emb, mmap=SHARED_MEMORY)
+    set_search_params(store.index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+    return store
+
 
+def load_balances(csv_path: str = DATA_CSV) -> "pd.DataFrame":
+    import pandas as pd
 
-def load_balances(csv_path: str = DATA_CSV) -> pd.DataFrame:
     p = Path(csv_path)
     if not p.exists():
         raise FileNotFoundError(f"CSV de saldos no encontrado en {p}")
@@ -47,7 +137,39 @@ def load_balances(csv_path: str = DATA_CSV) -> pd.DataFrame:
     return df
 
 
-def find_balance(df: pd.DataFrame, id_value: str) -> Optional[str]:
+def reload_balances(csv_path: str = DATA_CSV):
+    """Carga el CSV de saldos y recompila el índice de IDs usado por /query.
+
+    Con SHARED_MEMORY el índice es la exportación columnar mapeada con mmap
+    (`balance_index.open_columnar`) y no se guarda el DataFrame. Con
+    BALANCES_BACKEND=sqlite el CSV se convierte por partes a una base SQLite
+    (`balance_index.open_sqlite`) y las búsquedas van al disco.
+    """
+    global BALANCES_DF, BALANCE_INDEX, BALANCE_COLUMNS
+    if BALANCES_BACKEND == "sqlite":
+        from langchain_groq_app.balance_index import open_sqlite
+
+        if not Path(csv_path).exists():
+            raise FileNotFoundError(f"CSV de saldos no encontrado en {csv_path}")
+        index = open_sqlite(csv_path, BALANCES_DB_DIR)
+        BALANCES_DF, BALANCE_INDEX, BALANCE_COLUMNS = None, index, index.columns
+        return
+    if SHARED_MEMORY:
+        from langchain_groq_app.balance_index import open_columnar
+
+        if not Path(csv_path).exists():
+            raise FileNotFoundError(f"CSV de saldos no encontrado en {csv_path}")
+        index = open_columnar(csv_path, BALANCES_MMAP_DIR)
+        BALANCES_DF, BALANCE_INDEX, BALANCE_COLUMNS = None, index, index.columns
+        return
+    from langchain_groq_app.balance_index import BalanceIndex
+
+    df = load_balances(csv_path)
+    index = BalanceIndex(df)
+    BALANCES_DF, BALANCE_INDEX, BALANCE_COLUMNS = df, index, list(df.columns)
+
+
+def find_balance(df: "pd.DataFrame", id_value: str) -> Optional[str]:
     id_cols = [c for c in df.columns if any(k in c for k in ("id", "cedula", "dni", "document"))]
     if not id_cols:
         return None
@@ -60,73 +182,123 @@ def find_balance(df: pd.DataFrame, id_value: str) -> Optional[str]:
     return None
 
 
-def is_balance_query(text: str) -> Optional[str]:
-    if re.search(r"\bsaldo\b|\bbalance\b|saldo de la|saldo para|consultar saldo", text, re.I):
-        m = re.search(r"(\d{6,12})", text)
-        if m:
-            return m.group(1)
-        m2 = re.search(r"\b(?:cedula|cédula|dni|id)[:\s]*([A-Za-z0-9\-]+)", text, re.I)
-        if m2:
-            return m2.group(1)
-    return None
+@contextmanager
+def loading(name: str):
+    """Registra en READINESS el estado y la duración de la carga de un recurso; los errores no se propagan."""
+    READINESS[name] = {"state": "loading"}
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        READINESS[name] = {"state": "error", "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+        print(f"No se cargó {name}:", e)
+    else:
+        READINESS[name] = {"state": "ready", "seconds": round(time.perf_counter() - start, 3)}
 
 
-def is_kb_query(text: str) -> bool:
-    kb_terms = [
-        "abrir cuenta",
-        "apertura de cuenta",
-        "transferencia",
-        "hacer una transferencia",
-        "deposito",
-        "depósito",
-        "tarjeta",
-        "cheque",
-        "requisitos",
-        "documentos",
-    ]
-    for t in kb_terms:
-        if t in text.lower():
-            return True
-    return False
+def make_retriever(store):
+    from langchain_groq_app.retriever import CascadeRetriever, FAISSRetriever
 
+    if KB_RETRIEVER == "cascade":
+        return CascadeRetriever.from_vectorstore(store, k=RETRIEVER_K, candidates=CASCADE_CANDIDATES)
+    if KB_RETRIEVER != "dense":
+        raise ValueError(f"KB_RETRIEVER desconocido: {KB_RETRIEVER!r}. Opciones: dense, cascade")
+    return FAISSRetriever(vectorstore=store, k=RETRIEVER_K)
 
-@app.on_event("startup")
-def startup_event():
-    global VECTORSTORE, RETRIEVER, BALANCES_DF, LLM, QA_CHAIN
-    VECTORSTORE = None
-    RETRIEVER = None
-    BALANCES_DF = None
-    QA_CHAIN = None
 
+def make_qa_chain(retriever):
+    from langchain.chains import RetrievalQA
+
+    return RetrievalQA.from_chain_type(llm=LLM, chain_type="stuff", retriever=retriever)
+
+
+def swap_vectorstore(store):
+    """Pone en servicio `store` junto con su retriever y su cadena QA.
+
+    Las consultas en curso terminan con los objetos que ya tomaron; las
+    siguientes usan los nuevos.
+    """
+    global VECTORSTORE, RETRIEVER, QA_CHAIN
+    retriever = make_retriever(store)
+    qa_chain = make_qa_chain(retriever) if LLM is not None else None
+    VECTORSTORE, RETRIEVER, QA_CHAIN = store, retriever, qa_chain
+
+
+def load_vectorstore_or_index():
+    global VECTORSTORE, RETRIEVER
     try:
-        VECTORSTORE = load_vectorstore()
-        RETRIEVER = VECTORSTORE.as_retriever(search_kwargs={"k": 4})
+        store = load_vectorstore()
         print("Vectorstore cargado")
     except Exception as e:
         print("No se cargó vectorstore:", e)
         # Intentar indexar desde la KB adjunta (HW - LangChain II/knowledge_base)
-        try:
-            kb_dir = os.path.join(os.getcwd(), "HW - LangChain II", "knowledge_base")
-            print(f"Intentando indexar KB desde: {kb_dir}")
-            build_and_save_faiss(kb_dir=kb_dir, output_dir=KB_INDEX_DIR)
-            VECTORSTORE = load_vectorstore()
-            RETRIEVER = VECTORSTORE.as_retriever(search_kwargs={"k": 4})
-            print("Vectorstore creado y cargado desde KB adjunta")
-        except Exception as e2:
-            print("Fallo al indexar la KB adjunta:", e2)
+        from langchain_groq_app.index_kb import build_and_save_faiss
+
+        kb_dir = os.path.join(os.getcwd(), "HW - LangChain II", "knowledge_base")
+        print(f"Intentando indexar KB desde: {kb_dir}")
+        build_and_save_faiss(kb_dir=kb_dir, output_dir=KB_INDEX_DIR)
+        store = load_vectorstore()
+        print("Vectorstore creado y cargado desde KB adjunta")
+    VECTORSTORE, RETRIEVER = store, make_retriever(store)
 
+
+def warm_up():
+    """Carga todos los recursos en orden, del más barato al más caro; corre en un hilo aparte."""
+    global LLM, QA_CHAIN
     try:
-        BALANCES_DF = load_balances()
-        print("CSV de saldos cargado")
-    except Exception as e:
-        print("No se cargó CSV de saldos:", e)
+        with loading("balances"):
+            reload_balances()
+        with loading("llm"):
+            from langchain_groq_app.groq_llm import GroqLLM
+
+            LLM = GroqLLM(model=os.environ.get("GROQ_MODEL", "groq-1"))
+        with loading("vectorstore"):
+            load_vectorstore_or_index()
+        with loading("qa_chain"):
+            if RETRIEVER is None or LLM is None:
+                raise RuntimeError("requiere vectorstore y llm")
+            QA_CHAIN = make_qa_chain(RETRIEVER)
+        with loading("embeddings"):
+            if VECTORSTORE is None:
+                raise RuntimeError("requiere vectorstore")
+            from langchain_groq_app.embedding_cache import CachedEmbeddings
+
+            emb = VECTORSTORE.embedding_function
+            inner = getattr(emb, "inner", emb)
+            # load the model now (a cache hit would skip it) so the first question does not pay for it
+            (inner.model if isinstance(inner, CachedEmbeddings) else inner).embed_query("warm-up")
+            # near-duplicate questions are matched with the same embeddings as the KB
+            ANSWER_CACHE.embeddings = emb
+    finally:
+        WARM_UP_DONE.set()
+
+
+def start_warm_up():
+    global _WARM_UP_THREAD
+    with _WARM_UP_LOCK:
+        if _WARM_UP_THREAD is None:
+            _WARM_UP_THREAD = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _WARM_UP_THREAD.start()
+
+
+async def warmed_up():
+    """Espera a que termine el warm-up (lo arranca si nadie lo hizo, p. ej. TestClient sin startup)."""
+    start_warm_up()
+    if not WARM_UP_DONE.is_set():
+        await run_in_threadpool(WARM_UP_DONE.wait)
 
-    LLM = GroqLLM(model=os.environ.get("GROQ_MODEL", "groq-1"))
 
-    if RETRIEVER is not None:
-        from langchain.chains import RetrievalQA
+@app.on_event("startup")
+async def startup_event():
+    start_warm_up()
+
 
-        QA_CHAIN = RetrievalQA.from_chain_type(llm=LLM, chain_type="stuff", retriever=RETRIEVER)
+@app.on_event("shutdown")
+async def shutdown_event():
+    # only loaded once warm-up got as far as creating the LLM
+    groq_llm = sys.modules.get("langchain_groq_app.groq_llm")
+    if groq_llm is not None:
+        await groq_llm.aclose_clients()
 
 
 @app.get("/health")
@@ -134,50 +306,399 @@ def health():
     return {"ok": True}
 
 
-@app.post("/reindex")
-def reindex(kb_dir: Optional[str] = None):
-    try:
-        build_and_save_faiss(kb_dir or "knowledge_base", output_dir=KB_INDEX_DIR)
-        return {"ok": True, "detail": "Reindexado completado"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/ready")
+def ready(response: Response):
+    """200 cuando terminó el warm-up (503 mientras tanto), con el estado de cada recurso."""
+    done = WARM_UP_DONE.is_set()
+    if not done:
+        response.status_code = 503
+    # pid tells apart the workers of `uvicorn --workers N`
+    return {"ready": done, "pid": os.getpid(), "resources": READINESS}
+
+
+def reindex_and_swap(kb_dir: str) -> Tuple[Optional[str], dict]:
+    """Construye una generación nueva del índice, la publica y la pone en servicio.
+
+    Mientras se construye, las consultas siguen usando el store cargado.
+    Devuelve `(generación, estadísticas)`; la generación es None si ningún
+    archivo cambió.
+    """
+    from langchain_groq_app.index_generations import build_generation, collect_garbage
+
+    # reuse the loaded model instead of loading a second copy for the build
+    emb = VECTORSTORE.embedding_function if VECTORSTORE is not None else None
+    gen, stats = build_generation(kb_dir, KB_INDEX_DIR, embeddings=emb)
+    if gen is None:
+        return None, stats
+    swap_vectorstore(load_vectorstore(str(gen), embeddings=emb))
+    # KB answers may quote documents that just changed
+    ANSWER_CACHE.invalidate("kb")
+    removed = collect_garbage(KB_INDEX_DIR)
+    if removed:
+        print(f"Generaciones del índice borradas: {', '.join(removed)}")
+    return gen.name, stats
+
+
+async def run_reindex_job(job: dict):
+    # one build at a time; the next queued job starts from the generation this one publishes
+    async with REINDEX_LOCK:
+        job.update(state="running", started=time.time())
+        try:
+            job["generation"], job["stats"] = await run_in_threadpool(reindex_and_swap, job["kb_dir"])
+            job["state"] = "done"
+        except Exception as e:
+            job.update(state="error", error=str(e))
+        finally:
+            job["finished"] = time.time()
+
+
+def submit_reindex(kb_dir: str) -> dict:
+    """Encola un reindexado en segundo plano; un pedido igual que todavía espera turno se reusa."""
+    for job in REINDEX_JOBS.values():
+        # a queued job has not read the files yet, so it will also pick up this request's changes
+        if job["kb_dir"] == kb_dir and job["state"] == "queued":
+            job["requests"] += 1
+            return job
+    job = {"id": uuid.uuid4().hex, "kb_dir": kb_dir, "state": "queued", "requests": 1, "created": time.time(),
+           "started": None, "finished": None, "generation": None, "stats": None, "error": None}
+    REINDEX_JOBS[job["id"]] = job
+    while len(REINDEX_JOBS) > REINDEX_JOBS_KEEP:
+        oldest = next(iter(REINDEX_JOBS.values()))
+        if oldest["state"] in ("queued", "running"):
+            break
+        REINDEX_JOBS.popitem(last=False)
+    task = asyncio.ensure_future(run_reindex_job(job))
+    REINDEX_TASKS[job["id"]] = task
+    task.add_done_callback(lambda _: REINDEX_TASKS.pop(job["id"], None))
+    return job
+
+
+@app.post("/reindex", status_code=202)
+async def reindex(response: Response, kb_dir: Optional[str] = None, wait: bool = False):
+    """Lanza un reindexado en segundo plano y devuelve su id; el estado se consulta en GET /reindex/{id}.
+
+    Con `wait=true` responde cuando el reindexado terminó (el comportamiento anterior).
+    """
+    kb_dir = kb_dir or "knowledge_base"
+    await warmed_up()
+    job = submit_reindex(kb_dir)
+    if not wait:
+        return {"ok": True, "job": job}
+    task = REINDEX_TASKS.get(job["id"])
+    if task is not None:
+        await asyncio.shield(task)
+    if job["state"] == "error":
+        raise HTTPException(status_code=500, detail=job["error"])
+    response.status_code = 200
+    return {"ok": True, "detail": "Reindexado completado", "job": job}
+
+
+@app.get("/reindex/{job_id}")
+def reindex_status(job_id: str):
+    job = REINDEX_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindexado no encontrado")
+    return job
+
+
+def llm_prompt(text: str) -> str:
+    return f"Responde brevemente en español. Pregunta: {text}\nRespuesta:"
+
+
+def answer_balance(text: str, route: Route) -> Optional[QueryResponse]:
+    bal_id = route.balance_id
+    if bal_id and BALANCE_INDEX is not None:
+        with span("balance_lookup"):
+            res = BALANCE_INDEX.find(bal_id)
+        if res:
+            return QueryResponse(source="balance", answer=res)
+        return QueryResponse(source="balance", answer="ID no encontrado")
+
+    # Fallback: try to detect any ID from the balances index present in the text
+    if BALANCE_INDEX is not None:
+        with span("id_scan"):
+            found = BALANCE_INDEX.scan(text)
+        for val in found:
+            res = BALANCE_INDEX.find(val)
+            if res:
+                return QueryResponse(source="balance", answer=res)
+    return None
+
+
+async def cached(route: str, text: str, produce) -> str:
+    """Devuelve la respuesta cacheada para `text` o la genera con `generate_once`."""
+    with span("answer_cache"):
+        hit = await run_in_threadpool(ANSWER_CACHE.get, route, text)
+    if hit is not None:
+        return hit
+    return await generate_once(route, text, produce)
+
+
+async def generate_once(route: str, text: str, produce) -> str:
+    """Genera la respuesta con `produce()` y la guarda en la caché.
+
+    Mientras una pregunta se está generando, las idénticas (misma ruta y mismo
+    texto normalizado) esperan ese resultado en lugar de llamar otra vez al LLM.
+    """
+
+    async def generate() -> str:
+        start = time.perf_counter()
+        answer = await produce()
+        await run_in_threadpool(ANSWER_CACHE.put, route, text, answer, time.perf_counter() - start)
+        return answer
+
+    return await FLIGHTS.do((route, normalize_question(text)), generate)
+
+
+async def kb_answer(qa_chain, text: str) -> str:
+    """Lo mismo que `qa_chain.arun(text)` con el contexto empaquetado (`context_packing`) y spans por etapa."""
+    with span("retrieve"):
+        docs = await run_in_threadpool(qa_chain.retriever.invoke, text)
+    return await kb_generate(qa_chain, text, docs)
+
+
+async def kb_generate(qa_chain, text: str, docs: list) -> str:
+    """Respuesta del LLM a `text` con los `docs` ya recuperados como contexto."""
+    with span("pack"):
+        docs = pack_documents(text, docs)
+    with span("prompt"):
+        prompt = kb_prompt(qa_chain, text, docs)
+    with span("llm"):
+        return await LLM.ainvoke(prompt)
+
+
+async def llm_answer(text: str) -> str:
+    with span("llm"):
+        return await LLM.ainvoke(llm_prompt(text))
 
 
 @app.post("/query", response_model=QueryResponse)
-def query(req: QueryRequest):
+async def query(req: QueryRequest):
+    await warmed_up()
     text = req.query
+    with trace("/query") as t:
+        with span("route"):
+            route = ROUTER.route(text)
+
+        # 1) Balance
+        res = answer_balance(text, route)
+        if res is not None:
+            t.source = res.source
+            return res
+
+        # 2) KB (retrieval runs in the threadpool, the LLM call awaits on the shared pool)
+        qa_chain = QA_CHAIN
+        if route.kb and qa_chain is not None:
+            t.source = "kb"
+            try:
+                answer = await cached("kb", text, lambda: kb_answer(qa_chain, text))
+            except Exception as e:
+                # an unhandled error would make uvicorn drop the keep-alive connection
+                raise HTTPException(status_code=500, detail=str(e))
+            return QueryResponse(source="kb", answer=answer)
+
+        # 3) LLM
+        t.source = "llm"
+        try:
+            out = await cached("llm", text, lambda: llm_answer(text))
+            return QueryResponse(source="llm", answer=out)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def kb_prompt(qa_chain, text: str, docs: list) -> str:
+    """El mismo prompt que arma la cadena "stuff" de `qa_chain` con `docs` como contexto."""
+    # langchain is imported lazily, in warm_up()
+    from langchain.schema import format_document
+
+    chain = qa_chain.combine_documents_chain
+    context = chain.document_separator.join(format_document(d, chain.document_prompt) for d in docs)
+    return chain.llm_chain.prompt.format(**{chain.document_variable_name: context, "question": text})
 
-    # 1) Balance
-    bal_id = is_balance_query(text)
-    if bal_id and BALANCES_DF is not None:
-        res = find_balance(BALANCES_DF, bal_id)
-        if res:
-            return QueryResponse(source="balance", answer=res)
-        return QueryResponse(source="balance", answer="ID no encontrado")
 
-    # Fallback: try to detect any ID from the balances dataframe present in the text
-    if BALANCES_DF is not None:
-        id_cols = [c for c in BALANCES_DF.columns if any(k in c for k in ("id", "cedula", "dni", "document"))]
-        if id_cols:
-            for col in id_cols:
-                for val in BALANCES_DF[col].astype(str).tolist():
-                    if val and val in text:
-                        res = find_balance(BALANCES_DF, val)
-                        if res:
-                            return QueryResponse(source="balance", answer=res)
-
-    # 2) KB
-    if is_kb_query(text) and QA_CHAIN is not None:
-        answer = QA_CHAIN.run(text)
+async def stream_answer(text: str):
+    """Genera los eventos SSE de /query/stream: `route`, `sources` (sólo KB), `token`... y `done`."""
+    try:
+        with trace("/query/stream") as t:
+            with span("route"):
+                route = ROUTER.route(text)
+            res = answer_balance(text, route)
+            if res is not None:
+                t.source = res.source
+                yield sse("route", {"source": res.source})
+                yield sse("token", {"text": res.answer})
+                yield sse("done", {})
+                return
+
+            qa_chain = QA_CHAIN
+            if route.kb and qa_chain is not None:
+                source = t.source = "kb"
+                yield sse("route", {"source": source})
+                with span("answer_cache"):
+                    hit = await run_in_threadpool(ANSWER_CACHE.get, source, text)
+                if hit is None:
+                    # sources go out before the first token so the client can render them right away
+                    with span("retrieve"):
+                        docs = await run_in_threadpool(qa_chain.retriever.invoke, text)
+                    with span("pack"):
+                        docs = pack_documents(text, docs)
+                    yield sse("sources", [d.metadata for d in docs])
+                    with span("prompt"):
+                        prompt = kb_prompt(qa_chain, text, docs)
+            else:
+                source = t.source = "llm"
+                yield sse("route", {"source": source})
+                with span("answer_cache"):
+                    hit = await run_in_threadpool(ANSWER_CACHE.get, source, text)
+                prompt = llm_prompt(text)
+
+            if hit is not None:
+                yield sse("token", {"text": hit})
+            else:
+                start = time.perf_counter()
+                parts = []
+                # "llm_first_token" is the time to first token, "llm" the whole generation
+                with span("llm"):
+                    first = time.perf_counter()
+                    async for token in LLM.astream(prompt):
+                        if not parts:
+                            STAGE_SECONDS.observe(time.perf_counter() - first, stage="llm_first_token")
+                        parts.append(token)
+                        yield sse("token", {"text": token})
+                await run_in_threadpool(ANSWER_CACHE.put, source, text, "".join(parts), time.perf_counter() - start)
+            yield sse("done", {})
+    except Exception as e:
+        yield sse("error", {"detail": str(e)})
+
+
+@app.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """Como /query, pero devuelve la respuesta token a token como Server-Sent Events."""
+    await warmed_up()
+    return StreamingResponse(stream_answer(req.query), media_type="text/event-stream")
+
+
+async def answer_kb(qa_chain, text: str, docs: list) -> QueryResponse:
+    try:
+        answer = await generate_once("kb", text, lambda: kb_generate(qa_chain, text, docs))
         return QueryResponse(source="kb", answer=answer)
+    except Exception as e:
+        return QueryResponse(source="error", answer=str(e))
+
 
-    # 3) LLM
+async def answer_llm(text: str) -> QueryResponse:
     try:
-        prompt = f"Responde brevemente en español. Pregunta: {text}\nRespuesta:"
-        out = LLM(prompt)
-        return QueryResponse(source="llm", answer=out)
+        return QueryResponse(source="llm", answer=await generate_once("llm", text, lambda: llm_answer(text)))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return QueryResponse(source="error", answer=str(e))
+
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(req: BatchQueryRequest):
+    """Enruta varias preguntas a la vez; las de KB comparten un encode y una búsqueda FAISS.
+
+    Como en /query, cada pregunta se busca primero en la caché de respuestas
+    y las que se están generando en otro pedido se esperan en lugar de
+    repetirlas. Las llamadas al LLM del lote se hacen en paralelo. Los
+    resultados vuelven en el mismo orden. Un error del LLM en una pregunta se
+    informa con `source="error"` sin abortar el resto del lote.
+    """
+    await warmed_up()
+    with trace("/query/batch") as t:
+        t.source = "batch"
+        with span("route"):
+            routes = ROUTER.route_many(req.queries)
+        results: List[Optional[QueryResponse]] = [answer_balance(text, r) for text, r in zip(req.queries, routes)]
+        # one snapshot for the whole batch: a reindex may swap QA_CHAIN meanwhile
+        qa_chain = QA_CHAIN
+        sources = {i: "kb" if routes[i].kb and qa_chain is not None else "llm"
+                   for i, r in enumerate(results) if r is None}
+        with span("answer_cache"):
+            hits = await run_in_threadpool(lambda: {i: ANSWER_CACHE.get(s, req.queries[i]) for i, s in sources.items()})
+        for i, hit in hits.items():
+            if hit is not None:
+                results[i] = QueryResponse(source=sources[i], answer=hit)
+        kb_pos = [i for i, s in sources.items() if s == "kb" and results[i] is None]
+        pending = {}
+        if kb_pos:
+            with span("retrieve"):
+                kb_docs = await run_in_threadpool(qa_chain.retriever.retrieve_many, [req.queries[i] for i in kb_pos])
+            for i, docs in zip(kb_pos, kb_docs):
+                pending[i] = answer_kb(qa_chain, req.queries[i], docs)
+        for i, s in sources.items():
+            if s == "llm" and results[i] is None:
+                pending[i] = answer_llm(req.queries[i])
+
+        answers = await asyncio.gather(*pending.values())
+        for i, answer in zip(pending, answers):
+            results[i] = answer
+        return BatchQueryResponse(results=results)
+
+
+@app.post("/balances/lookup", response_model=BalanceLookupResponse)
+async def balances_lookup(req: BalanceLookupRequest):
+    """Busca el saldo de varios IDs a la vez, en el mismo orden del pedido."""
+    await warmed_up()
+    if BALANCE_INDEX is None:
+        raise HTTPException(status_code=503, detail="Saldos no cargados")
+    with trace("/balances/lookup") as t:
+        t.source = "balance"
+        with span("balance_lookup"):
+            answers = await run_in_threadpool(BALANCE_INDEX.find_many, req.ids)
+        return BalanceLookupResponse(results=[
+            BalanceLookupResult(id=i, found=a is not None, answer=a or "ID no encontrado")
+            for i, a in zip(req.ids, answers)
+        ])
+
+
+def embedding_cache_stats() -> Optional[dict]:
+    emb = getattr(VECTORSTORE, "embedding_function", None)
+    # the disk cache sits behind the query LRU (encoders.QueryCache)
+    cache = getattr(getattr(emb, "inner", emb), "cache", None)
+    return cache.stats() if cache is not None else None
+
+
+def query_cache_stats() -> Optional[dict]:
+    emb = getattr(VECTORSTORE, "embedding_function", None)
+    return emb.stats() if hasattr(emb, "inner") else None
+
+
+ANSWER_CACHE_LOOKUPS = REGISTRY.counter("rag_answer_cache_lookups_total", "Consultas a la caché de respuestas por resultado")
+ANSWER_CACHE_ENTRIES = REGISTRY.gauge("rag_answer_cache_entries", "Respuestas guardadas en la caché")
+EMBEDDING_CACHE_LOOKUPS = REGISTRY.counter("rag_embedding_cache_lookups_total", "Consultas a la caché de embeddings por resultado")
+QUERY_CACHE_LOOKUPS = REGISTRY.counter("rag_query_embedding_cache_lookups_total", "Consultas a la LRU de embeddings de preguntas por resultado")
+SINGLEFLIGHT_COALESCED = REGISTRY.counter("rag_singleflight_coalesced_total", "Preguntas que esperaron una generación idéntica en curso, por ruta")
+SINGLEFLIGHT_IN_FLIGHT = REGISTRY.gauge("rag_singleflight_in_flight", "Generaciones en curso")
+RESOURCE_READY = REGISTRY.gauge("rag_resource_ready", "1 si el recurso terminó de cargar")
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato Prometheus: latencias por endpoint y etapa, errores, Groq y cachés."""
+    # the caches keep their own counters; mirror them at scrape time
+    answers = ANSWER_CACHE.stats()
+    for result in ("exact_hits", "semantic_hits", "misses"):
+        ANSWER_CACHE_LOOKUPS.set(answers[result], result=result)
+    ANSWER_CACHE_ENTRIES.set(answers["entries"])
+    embeddings = embedding_cache_stats()
+    if embeddings is not None:
+        for result in ("hits", "misses"):
+            EMBEDDING_CACHE_LOOKUPS.set(embeddings[result], result=result)
+    queries = query_cache_stats()
+    if queries is not None:
+        for result in ("hits", "misses"):
+            QUERY_CACHE_LOOKUPS.set(queries[result], result=result)
+    flights = FLIGHTS.stats()
+    for route, n in flights["coalesced"].items():
+        SINGLEFLIGHT_COALESCED.set(n, route=str(route))
+    SINGLEFLIGHT_IN_FLIGHT.set(flights["in_flight"])
+    for name, info in READINESS.items():
+        RESOURCE_READY.set(1 if info["state"] == "ready" else 0, resource=name)
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/status")
@@ -187,6 +708,13 @@ def status():
         "vectorstore_loaded": bool(VECTORSTORE),
         "retriever_loaded": bool(RETRIEVER),
         "qa_chain_loaded": bool(QA_CHAIN),
-        "balances_loaded": bool(BALANCES_DF),
-        "balance_columns": list(BALANCES_DF.columns) if BALANCES_DF is not None else [],
+        "balances_loaded": BALANCE_INDEX is not None,
+        "balance_columns": BALANCE_COLUMNS,
+        "shared_memory": SHARED_MEMORY,
+        "balances_backend": BALANCES_BACKEND,
+        "index_generation": current_generation(KB_INDEX_DIR),
+        "embedding_cache": embedding_cache_stats(),
+        "query_embedding_cache": query_cache_stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "singleflight": FLIGHTS.stats(),
     }
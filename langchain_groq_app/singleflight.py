@@ -0,0 +1,37 @@
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Agrupa llamadas async idénticas que están en vuelo al mismo tiempo.
+
+    La primera llamada con una clave `(ruta, ...)` lanza `fn()` como tarea;
+    las que llegan con la misma clave mientras corre esperan esa misma tarea y
+    reciben su resultado (o su excepción) en lugar de repetir el trabajo.
+    Cancelar a uno de los que esperan no cancela la tarea compartida.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[Hashable, ...], asyncio.Task] = {}
+        self.calls: Counter = Counter()
+        self.coalesced: Counter = Counter()
+
+    async def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls[key[0]] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced[key[0]] += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": dict(self.calls),
+            "coalesced": dict(self.coalesced),
+            "coalesced_total": sum(self.coalesced.values()),
+        }
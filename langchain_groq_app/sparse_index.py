@@ -0,0 +1,50 @@
+"""Índice TF-IDF disperso para generar candidatos baratos antes de un re-rank denso.
+
+La matriz se guarda transpuesta (términos x documentos): cada fila es la
+lista de postings de un término, así que puntuar una consulta sólo toca los
+postings de sus términos y el costo no crece con el tamaño del corpus como
+un recorrido denso completo.
+
+`sparse_top_k` está repetida en solution_micaela/query_agent.py; un arreglo
+en una suele hacer falta también en la otra.
+"""
+from typing import List, Sequence
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def sparse_top_k(q_vecs, postings, top_k: int) -> List[List[int]]:
+    """Para cada fila de `q_vecs`, las `top_k` posiciones con mayor puntaje según las listas de postings."""
+    scores = (q_vecs @ postings).tocsr()
+    hits = []
+    for r in range(scores.shape[0]):
+        lo, hi = scores.indptr[r], scores.indptr[r + 1]
+        data, ids = scores.data[lo:hi], scores.indices[lo:hi]
+        if len(data) > top_k:
+            part = np.argpartition(-data, top_k - 1)[:top_k]
+        else:
+            part = np.arange(len(data))
+        order = part[np.argsort(-data[part], kind="stable")]
+        hits.append(ids[order].tolist())
+    return hits
+
+
+class TfidfIndex:
+    """TF-IDF de palabras sueltas sobre `texts`; `top` devuelve posiciones de `texts`.
+
+    Las consultas que no comparten ningún término con el corpus no tienen
+    candidatos (lista vacía).
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        # accents and casing vary a lot in user questions; sublinear tf keeps long chunks from dominating
+        self.vectorizer = TfidfVectorizer(strip_accents="unicode", sublinear_tf=True)
+        self.postings = self.vectorizer.fit_transform(texts).T.tocsr()
+
+    def __len__(self) -> int:
+        return self.postings.shape[1]
+
+    def top(self, queries: Sequence[str], n: int) -> List[List[int]]:
+        # TfidfVectorizer rows are already L2-normalized: the dot product is the cosine
+        return sparse_top_k(self.vectorizer.transform(queries), self.postings, n)
@@ -0,0 +1,320 @@
+"""Spans por etapa, métricas en formato Prometheus y un profiler por muestreo para consultas lentas.
+
+`span("faiss_search")` mide una etapa y la suma al histograma
+`rag_stage_duration_seconds{stage=...}`; si corre dentro de un
+`trace("/query")` también queda en la lista de spans de esa consulta. Los
+spans sólo leen el trace activo de un `ContextVar`, así que funcionan igual en
+el event loop y en el threadpool (starlette y langchain copian el contexto al
+pasar trabajo a un hilo). `REGISTRY.render()` devuelve todas las métricas en
+el formato de texto de Prometheus (lo sirve `GET /metrics`).
+
+Con `PROFILE_SLOW_MS` > 0 un hilo muestrea las pilas de todos los hilos cada
+`PROFILE_INTERVAL_MS` mientras hay consultas en curso, y cada consulta que
+tarda más que el umbral deja en `PROFILE_DIR` sus muestras en formato
+"folded" (una pila por línea, listo para flamegraph.pl o speedscope) y sus
+spans en JSON. Las muestras son de todo el proceso, así que con consultas
+concurrentes incluyen también el trabajo de las demás.
+
+solution_micaela/tracing.py repite `span` y `trace` sin métricas ni
+profiler; un arreglo en uno suele hacer falta también en el otro.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 0 disables the profiler
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: str):
+        # mirrors a count kept elsewhere (e.g. the cache hit counters)
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(key)} {_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (last one is +Inf), sum]
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(sorted(labels.items())))
+        return sum(entry[0]) if entry else 0
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        out = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append(f"{self.name}_bucket{_labels(key, (('le', le),))} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(key)} {_value(total)}")
+            out.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    def render(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        out = []
+        for name, metric in sorted(self._metrics.items()):
+            out.append(f"# HELP {name} {metric.help}")
+            out.append(f"# TYPE {name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("rag_stage_duration_seconds", "Duración de cada etapa de una consulta")
+REQUEST_SECONDS = REGISTRY.histogram("rag_request_duration_seconds", "Duración de las consultas por endpoint y ruta")
+REQUEST_ERRORS = REGISTRY.counter("rag_request_errors_total", "Consultas que terminaron en error, por endpoint")
+
+
+class Trace:
+    """Los spans de una consulta, con tiempos relativos a su inicio."""
+
+    def __init__(self, endpoint: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.source: Optional[str] = None
+        self.start = time.perf_counter()
+        self.seconds: Optional[float] = None
+        # (stage, offset from the start, seconds); list.append is atomic, spans may come from other threads
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, seconds: float):
+        self.spans.append((name, start - self.start, seconds))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "endpoint": self.endpoint, "source": self.source, "seconds": self.seconds,
+                "spans": [{"stage": n, "start_ms": o * 1000, "ms": s * 1000} for n, o, s in self.spans]}
+
+    def format(self) -> str:
+        stages = " | ".join(f"{n} {s * 1000:.1f} ms" for n, _, s in self.spans)
+        total = f"{self.seconds * 1000:.1f} ms" if self.seconds is not None else "en curso"
+        return f"{total}: {stages}" if stages else total
+
+
+_CURRENT: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        t = _CURRENT.get()
+        if t is not None:
+            t.add(name, start, seconds)
+
+
+@contextmanager
+def trace(endpoint: str) -> Iterator[Trace]:
+    """Mide una consulta completa; el que la atiende pone `t.source` (balance, kb, llm...)."""
+    t = Trace(endpoint)
+    token = _CURRENT.set(t)
+    profiler = PROFILER if PROFILE_SLOW_MS > 0 else None
+    if profiler is not None:
+        profiler.enter()
+    try:
+        yield t
+    except Exception:
+        t.source = t.source or "error"
+        REQUEST_ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        t.seconds = time.perf_counter() - t.start
+        try:
+            _CURRENT.reset(token)
+        except ValueError:
+            # an async generator closed from another context (client went away mid-stream)
+            pass
+        REQUEST_SECONDS.observe(t.seconds, endpoint=endpoint, source=t.source or "none")
+        if profiler is not None:
+            profiler.exit()
+            if t.seconds * 1000 >= PROFILE_SLOW_MS:
+                profiler.dump(t)
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de Python de todos los hilos mientras haya consultas en curso."""
+
+    # threads parked in these frames are idle (threadpool workers, the event loop waiting for I/O)
+    IDLE = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+    def __init__(self, interval: float, out_dir: str, max_samples: int = 200_000):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.dumps = 0
+        self._samples: "deque[Tuple[float, str, str]]" = deque(maxlen=max_samples)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self._wake.clear()
+
+    @classmethod
+    def collapse(cls, frame) -> Optional[str]:
+        """Pila de `frame` en formato folded (raíz primero, separada por ';'); None si el hilo está ocioso."""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in cls.IDLE:
+            return None
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = self.collapse(frame)
+                if stack is not None:
+                    stacks.append((now, names.get(tid, str(tid)), stack))
+            with self._lock:
+                self._samples.extend(stacks)
+            time.sleep(self.interval)
+
+    def folded(self, start: float, end: float) -> Dict[str, int]:
+        with self._lock:
+            samples = list(self._samples)
+        counts: Dict[str, int] = {}
+        for t, thread, stack in samples:
+            if start <= t <= end:
+                key = f"{thread};{stack}"
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def dump(self, t: Trace) -> str:
+        """Escribe `<fecha>-<id>.folded` y `<fecha>-<id>.json` para el trace `t`; devuelve la ruta sin extensión."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{t.id}")
+        counts = self.folded(t.start, t.start + (t.seconds or 0.0))
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, n in sorted(counts.items()):
+                f.write(f"{stack} {n}\n")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({**t.to_dict(), "samples": sum(counts.values())}, f, indent=2)
+        self.dumps += 1
+        return base
+
+
+PROFILER = SamplingProfiler(PROFILE_INTERVAL_MS / 1000, PROFILE_DIR)
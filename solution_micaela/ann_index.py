@@ -0,0 +1,71 @@
+"""FAISS index factory (flat, IVF, IVF-PQ, HNSW) for the dense backend.
+
+Scripts here import it by bare name, so it cannot import
+langchain_groq_app/ann_index.py, which has the same defaults; a fix to one
+usually belongs in both.
+"""
+import faiss
+import numpy as np
+
+# exact flat search or approximate IVF / IVF-PQ / HNSW for the dense backend
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+# HNSW cannot remove vectors, so incremental builds rebuild it; IVF indexes
+# remove_ids by the stable chunk ids they were added with
+NO_REMOVE_TYPES = ('hnsw',)
+# below this many vectors training IVF/PQ is meaningless; fall back to flat
+MIN_TRAIN_VECTORS = 256
+
+def default_nlist(n):
+    # ~4*sqrt(n) lists, keeping at least 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def default_pq_m(dim):
+    # largest number of sub-quantizers with at least 8 dims each that divides dim
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def default_pq_nbits(n):
+    return int(min(8, max(4, np.floor(np.log2(max(n, 2) / 39)))))
+
+def factory_string(kind, dim, n):
+    if kind == 'flat':
+        return 'Flat'
+    if kind == 'hnsw':
+        return 'HNSW32'
+    if kind == 'ivf_flat':
+        return f'IVF{default_nlist(n)},Flat'
+    if kind == 'ivf_pq':
+        return f'IVF{default_nlist(n)},PQ{default_pq_m(dim)}x{default_pq_nbits(n)}'
+    raise ValueError(f'Unknown index type {kind!r}; expected one of {INDEX_TYPES}')
+
+def build_ann_index(kind, vectors, metric, ids):
+    """Create, train on `vectors` and fill an index of type `kind`, keyed by `ids`.
+
+    IVF accepts add_with_ids natively; flat and HNSW are wrapped in IDMap2.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    n, dim = vectors.shape
+    if kind != 'flat' and n < MIN_TRAIN_VECTORS:
+        print(f'Only {n} vectors: using a flat index instead of {kind}')
+        kind = 'flat'
+    desc = factory_string(kind, dim, n)
+    if kind in ('flat', 'hnsw'):
+        desc = 'IDMap2,' + desc
+    index = faiss.index_factory(dim, desc, metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    return index
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Set nprobe (IVF) and efSearch (HNSW); the ones that do not apply to `index` are ignored."""
+    ps = faiss.ParameterSpace()
+    for name, value in (('nprobe', nprobe), ('efSearch', ef_search)):
+        if value is None:
+            continue
+        try:
+            ps.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
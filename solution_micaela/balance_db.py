@@ -0,0 +1,96 @@
+"""saldos.csv converted by chunks into a SQLite table, for CSVs that do not fit in memory.
+
+csv_signature and the write-aside-then-rename publishing follow
+langchain_groq_app/balance_index.py (open_sqlite); a fix to one usually
+belongs in both.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+VERSION = 1
+# rows per pandas chunk when streaming the CSV into SQLite
+CHUNK_ROWS = 100_000
+
+def csv_signature(csv_path):
+    st = os.stat(csv_path)
+    raw = f'{os.path.abspath(csv_path)}|{st.st_mtime_ns}|{st.st_size}|{VERSION}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def export_balances(csv_path, db_path, chunk_rows=CHUNK_ROWS):
+    """Convert saldos.csv into a SQLite table keyed by the stripped ID_Cedula, without loading it whole.
+
+    The CSV is read `chunk_rows` rows at a time, so memory stays flat whatever
+    its size. For duplicated IDs the first row wins, as in BalanceStore.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    # a partial file is thrown away on failure, so durability is not needed while building
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('CREATE TABLE balances (key TEXT PRIMARY KEY, id_cedula, nombre, balance REAL) WITHOUT ROWID')
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        keys = chunk['ID_Cedula'].astype(str).str.strip().tolist()
+        rows = list(zip(keys, chunk['ID_Cedula'].tolist(), chunk['Nombre'].tolist(), chunk['Balance'].tolist()))
+        # sorted by key (then row), consecutive inserts land on neighbouring B-tree pages
+        # and OR IGNORE keeps the first row of a duplicated ID
+        order = sorted(range(len(rows)), key=lambda r: (keys[r], r))
+        conn.executemany('INSERT OR IGNORE INTO balances VALUES (?, ?, ?, ?)',
+                         ((k, _plain(i), _plain(n), float(b)) for k, i, n, b in (rows[r] for r in order)))
+    conn.commit()
+    conn.close()
+
+def _plain(value):
+    # numpy scalars are not valid SQLite parameters
+    return value.item() if hasattr(value, 'item') else value
+
+class BalanceDb:
+    """Read-only lookups on the database written by export_balances; one connection per thread."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = Path(os.path.abspath(self.db_path)).as_uri() + '?mode=ro'
+            conn = self._local.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return conn
+
+    def get(self, key):
+        """(ID_Cedula, Nombre, Balance) for the stripped `key`, or None."""
+        row = self._conn().execute('SELECT id_cedula, nombre, balance FROM balances WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        # SQLite stores NaN as NULL
+        return (row[0], row[1], float('nan') if row[2] is None else row[2])
+
+def open_balance_db(csv_path, db_dir):
+    """Open the database of the current `csv_path` under `db_dir`, converting the CSV if it changed.
+
+    Each CSV version gets its own file, written aside and renamed into place,
+    so a process still reading an older one is never handed a half-written file.
+    """
+    target = Path(db_dir) / f'{csv_signature(csv_path)}.sqlite'
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.parent / f'.{target.name}.{os.getpid()}'
+        export_balances(csv_path, str(tmp))
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            tmp.unlink()
+        # databases of older CSV versions; on POSIX open connections keep reading the unlinked file
+        for old in target.parent.glob('*.sqlite'):
+            if old.name != target.name:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+    return BalanceDb(str(target))
@@ -0,0 +1,77 @@
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import chunk_store
+from bench_retrieval import FILLER
+
+def synthetic_chunks(n, seed=0):
+    """n (chunk_id, text, meta) triples of ~600 characters, 20 chunks per source file."""
+    rng = random.Random(seed)
+    vocab = FILLER + [f'term{i}' for i in range(1500)]
+    for i in range(n):
+        text = ' '.join(rng.choices(vocab, k=80))[:600]
+        yield i, text, {'source': f'doc_{i // 20:06d}.txt', 'chunk': i % 20}
+
+def write_legacy(out_dir, n):
+    ids, texts, metas = [], [], []
+    for chunk_id, text, meta in synthetic_chunks(n):
+        ids.append(chunk_id)
+        texts.append(text)
+        metas.append(meta)
+    with open(os.path.join(out_dir, chunk_store.LEGACY_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'ids': ids, 'texts': texts, 'metadatas': metas}, f, ensure_ascii=False, indent=2)
+
+def measure(index_dir, n, lookups=1000, top_k=4, seed=1):
+    """Load time, Python heap held after load, and p50 latency of reading top_k random chunks by id."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    store = chunk_store.open_chunk_store(index_dir)
+    load = time.perf_counter() - t0
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rng = random.Random(seed)
+    lat = []
+    for _ in range(lookups):
+        ids = [rng.randrange(n) for _ in range(top_k)]
+        t0 = time.perf_counter()
+        docs = [(store.text(store.row_of(i)), store.meta(store.row_of(i))) for i in ids]
+        lat.append(time.perf_counter() - t0)
+    assert len(docs) == top_k
+    store.close()
+    return load, heap, float(np.percentile(lat, 50))
+
+def dir_bytes(path, names):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in names)
+
+def run(sizes, lookups=1000, top_k=4):
+    print(f"{'chunks':>9} {'format':>8} {'disk (MB)':>10} {'load (ms)':>10} {'heap (MB)':>10} {f'top-{top_k} (us)':>11}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_dir, store_dir = os.path.join(tmp, 'legacy'), os.path.join(tmp, 'store')
+            os.makedirs(legacy_dir)
+            os.makedirs(store_dir)
+            write_legacy(legacy_dir, n)
+            chunk_store.write_chunk_store(store_dir, synthetic_chunks(n), n)
+            for name, path, files in (('json', legacy_dir, (chunk_store.LEGACY_FILE,)),
+                                      ('mmap', store_dir, chunk_store.STORE_FILES)):
+                load, heap, p50 = measure(path, n, lookups, top_k)
+                print(f'{n:>9} {name:>8} {dir_bytes(path, files) / 2**20:>10.1f} {load * 1000:>10.2f} '
+                      f'{heap / 2**20:>10.2f} {p50 * 1e6:>11.1f}')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare metadata.json vs the mmap chunk store: load time, heap and lookup latency')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated number of synthetic chunks')
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--top_k', type=int, default=4)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',')], args.lookups, args.top_k)
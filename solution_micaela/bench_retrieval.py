@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import build_index
+import query_agent
+
+TOPICS = ['cuenta', 'transferencia', 'tarjeta', 'credito', 'deposito', 'cheque', 'prestamo', 'seguro']
+FILLER = ['banco', 'henry', 'cliente', 'solicitud', 'requisitos', 'documento', 'plazo', 'comision',
+          'interes', 'sucursal', 'linea', 'formulario', 'identidad', 'saldo', 'monto', 'limite']
+
+def synthetic_kb(kb_dir, n_docs, seed=0):
+    """Write n_docs .txt files of a few paragraphs each, mixing topic words with a long-tail vocabulary."""
+    rng = random.Random(seed)
+    vocab = FILLER + [f'term{i}' for i in range(1500)]
+    for d in range(n_docs):
+        topic = TOPICS[d % len(TOPICS)]
+        paras = []
+        for _ in range(rng.randint(2, 5)):
+            words = [topic] + rng.choices(vocab, k=rng.randint(40, 120))
+            rng.shuffle(words)
+            paras.append(' '.join(words))
+        with open(os.path.join(kb_dir, f'doc_{d:06d}.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(paras))
+
+def sample_queries(texts, n, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 6))
+        queries.append(' '.join(words[start:start + 6]))
+    return queries
+
+def index_bytes(engine):
+    index = engine.state()[2]
+    if engine.backend == 'sparse':
+        return index.data.nbytes + index.indices.nbytes + index.indptr.nbytes
+    return index.ntotal * index.d * 4
+
+def latencies(engine, queries, top_k):
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        engine.retrieve(q, top_k=top_k)
+        out.append(time.perf_counter() - t0)
+    return np.array(out)
+
+def run(sizes, n_queries=200, top_k=4):
+    print(f"{'docs':>8} {'chunks':>8} {'backend':>8} {'memory (KB)':>12} {'p50 (ms)':>9} {'p99 (ms)':>9} {'overlap':>8}")
+    for n_docs in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            kb_dir, out_dir = os.path.join(tmp, 'kb'), os.path.join(tmp, 'index')
+            os.makedirs(kb_dir)
+            synthetic_kb(kb_dir, n_docs)
+            build_index.build_index(kb_dir, out_dir, backend='all')
+            engines = {b: query_agent.QueryEngine(out_dir, backend=b) for b in build_index.BACKENDS}
+            chunks = engines['dense'].state()[3]
+            texts = [chunks.text(i) for i in range(len(chunks))]
+            queries = sample_queries(texts, n_queries)
+            dense_hits = [[r['meta'] for r in engines['dense'].retrieve(q, top_k)] for q in queries]
+            for name, engine in engines.items():
+                lat = latencies(engine, queries, top_k)
+                hits = [[r['meta'] for r in engine.retrieve(q, top_k)] for q in queries]
+                overlap = np.mean([len([h for h in a if h in b]) / max(1, len(b)) for a, b in zip(hits, dense_hits)])
+                print(f'{n_docs:>8} {len(texts):>8} {name:>8} {index_bytes(engine) / 1024:>12.1f} '
+                      f'{np.percentile(lat, 50) * 1000:>9.3f} {np.percentile(lat, 99) * 1000:>9.3f} {overlap:>8.3f}')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare dense FAISS vs sparse TF-IDF retrieval memory and latency')
+    parser.add_argument('--sizes', default='100,1000,5000', help='Comma-separated number of synthetic documents')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top_k', type=int, default=4)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',')], args.queries, args.top_k)
@@ -1,15 +1,22 @@
 import os
 import glob
 import json
+import hashlib
 import numpy as np
 import faiss
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
 import joblib
 
+from ann_index import INDEX_TYPES, NO_REMOVE_TYPES, build_ann_index
+from chunk_store import open_chunk_store, write_chunk_store
+
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
 KB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'knowledge_base'))
 OUT_DIR = os.path.join(os.path.dirname(__file__), 'index')
 os.makedirs(OUT_DIR, exist_ok=True)
+BACKENDS = ('dense', 'sparse')
+MANIFEST_VERSION = 1
 
 def load_kb_files(kb_dir):
     files = glob.glob(os.path.join(kb_dir, '*.txt'))
@@ -18,7 +25,8 @@ def load_kb_files(kb_dir):
         with open(fp, 'r', encoding='utf-8') as f:
             text = f.read().strip()
             if text:
-                docs.append({'source': os.path.basename(fp), 'text': text})
+                sha = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                docs.append({'source': os.path.basename(fp), 'text': text, 'sha256': sha})
     return docs
 
 def chunk_text(text, max_len=500, overlap=100):
@@ -61,16 +69,49 @@ def chunk_text(text, max_len=500, overlap=100):
         chunks.append(cur)
     return chunks
 
-def build_index():
-    print('Loading knowledge base from', KB_DIR)
-    docs = load_kb_files(KB_DIR)
-    all_texts = []
-    metadata = []
+def chunk_docs(docs):
+    texts, metas = [], []
     for d in docs:
-        chunks = chunk_text(d['text'], max_len=800)
-        for i, c in enumerate(chunks):
-            all_texts.append(c)
-            metadata.append({'source': d['source'], 'chunk': i})
+        for i, c in enumerate(chunk_text(d['text'], max_len=800)):
+            texts.append(c)
+            metas.append({'source': d['source'], 'chunk': i})
+    return texts, metas
+
+def dense_vectors(matrix):
+    embeddings = matrix.toarray()
+    # normalize for cosine similarity with inner product index
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms==0] = 1
+    return embeddings / norms
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_index(out_dir, backends, manifest, chunks, matrix, embeddings=None, index=None):
+    """Write the artifacts; `chunks` yields (chunk_id, text, meta) in matrix/embedding row order."""
+    if 'dense' in backends:
+        faiss.write_index(index, os.path.join(out_dir, 'faiss_index.bin'))
+        np.save(os.path.join(out_dir, 'embeddings.npy'), embeddings)
+
+    if 'sparse' in backends:
+        # TfidfVectorizer already L2-normalizes each row, so no densify/normalize step
+        sp.save_npz(os.path.join(out_dir, 'tfidf_matrix.npz'), matrix.tocsr())
+
+    write_chunk_store(out_dir, chunks, manifest['next_id'])
+    # the manifest goes last: if a build is interrupted the next run sees the old
+    # manifest and redoes the same changes
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+def full_build(docs, out_dir, backends, index_type):
+    all_texts, metadata = chunk_docs(docs)
     if not all_texts:
         print('No documents found in knowledge base. Aborting index build.')
         return
@@ -79,25 +120,142 @@ def build_index():
     # Use a TF-IDF vectorizer with n-grams as a lightweight embedding fallback
     # Increase max_features and use unigrams+bigrams for better recall
     vectorizer = TfidfVectorizer(max_features=2048, ngram_range=(1, 2))
-    embeddings = vectorizer.fit_transform(all_texts).toarray().astype('float32')
+    matrix = vectorizer.fit_transform(all_texts).astype('float32')
     # save vectorizer for query time
-    joblib.dump(vectorizer, os.path.join(OUT_DIR, 'vectorizer.joblib'))
+    joblib.dump(vectorizer, os.path.join(out_dir, 'vectorizer.joblib'))
 
-    # normalize for cosine similarity with inner product index
-    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-    norms[norms==0] = 1
-    embeddings = embeddings / norms
+    ids = list(range(len(all_texts)))
+    files = {}
+    for chunk_id, meta in zip(ids, metadata):
+        files.setdefault(meta['source'], {'ids': []})['ids'].append(chunk_id)
+    for d in docs:
+        if d['source'] in files:
+            files[d['source']]['sha256'] = d['sha256']
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'backends': sorted(backends),
+        'index_type': index_type,
+        'next_id': len(ids),
+        'fitted_chunks': len(ids),
+        'stale_chunks': 0,
+        'files': files,
+    }
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
+    embeddings = index = None
+    if 'dense' in backends:
+        embeddings = dense_vectors(matrix)
+        # ID-mapped so incremental builds can remove/add chunks by their stable id;
+        # approximate index types are trained on the whole corpus here
+        index = build_ann_index(index_type, embeddings, faiss.METRIC_INNER_PRODUCT, ids=np.array(ids, dtype='int64'))
 
-    faiss.write_index(index, os.path.join(OUT_DIR, 'faiss_index.bin'))
-    np.save(os.path.join(OUT_DIR, 'embeddings.npy'), embeddings)
-    with open(os.path.join(OUT_DIR, 'metadata.json'), 'w', encoding='utf-8') as f:
-        json.dump({'texts': all_texts, 'metadatas': metadata}, f, ensure_ascii=False, indent=2)
+    save_index(out_dir, backends, manifest, zip(ids, all_texts, metadata), matrix, embeddings, index)
+    print('Index saved to', out_dir)
 
-    print('Index saved to', OUT_DIR)
+def incremental_build(docs, out_dir, backends, manifest, refit_ratio):
+    """Apply only the added/modified/deleted files to the existing index.
+
+    Returns False when a full rebuild is needed instead. The TF-IDF vocabulary
+    and IDF weights stay those of the last full build; once the chunks
+    re-embedded since then exceed `refit_ratio` of the fitted corpus, the
+    vectorizer is refit from scratch.
+    """
+    files = manifest['files']
+    current = {d['source']: d for d in docs}
+    changed = [d for d in docs if files.get(d['source'], {}).get('sha256') != d['sha256']]
+    deleted = [src for src in files if src not in current]
+    if not changed and not deleted:
+        print('Index is up to date: no added, modified or deleted files.')
+        return True
+
+    drop_ids = set()
+    for src in deleted + [d['source'] for d in changed]:
+        drop_ids.update(files.get(src, {}).get('ids', []))
+    index_type = manifest.get('index_type', 'flat')
+    if drop_ids and 'dense' in backends and index_type in NO_REMOVE_TYPES:
+        print(f'A {index_type} index cannot remove vectors; rebuilding from scratch.')
+        return False
+    new_texts, new_metas = chunk_docs(changed)
+    stale = manifest['stale_chunks'] + len(drop_ids) + len(new_texts)
+    if stale > refit_ratio * max(1, manifest['fitted_chunks']):
+        print(f'{stale} chunks changed since the vectorizer was fit; refitting from scratch.')
+        return False
+
+    print(f'Incremental update: {len(changed)} added/modified, {len(deleted)} deleted file(s); '
+          f'embedding {len(new_texts)} chunk(s), dropping {len(drop_ids)}.')
+    vectorizer = joblib.load(os.path.join(out_dir, 'vectorizer.joblib'))
+    old = open_chunk_store(out_dir)
+    old_ids = [int(chunk_id) for chunk_id in old.ids]
+    keep = [i for i, chunk_id in enumerate(old_ids) if chunk_id not in drop_ids]
+    # kept chunks are copied as raw UTF-8 bytes; the old store is closed before
+    # its files are replaced
+    kept = [(old_ids[i], old.raw_text(i), old.meta(i)) for i in keep]
+    old.close()
+    new_ids = list(range(manifest['next_id'], manifest['next_id'] + len(new_texts)))
+    new_matrix = vectorizer.transform(new_texts).astype('float32') if new_texts else None
+
+    matrix = embeddings = index = None
+    if 'sparse' in backends:
+        matrix = sp.load_npz(os.path.join(out_dir, 'tfidf_matrix.npz'))[keep]
+        if new_matrix is not None:
+            matrix = sp.vstack([matrix, new_matrix])
+    if 'dense' in backends:
+        index = faiss.read_index(os.path.join(out_dir, 'faiss_index.bin'))
+        embeddings = np.load(os.path.join(out_dir, 'embeddings.npy'))[keep]
+        if drop_ids:
+            index.remove_ids(np.array(sorted(drop_ids), dtype='int64'))
+        if new_matrix is not None:
+            new_dense = dense_vectors(new_matrix)
+            index.add_with_ids(new_dense, np.array(new_ids, dtype='int64'))
+            embeddings = np.vstack([embeddings, new_dense])
+
+    for src in deleted:
+        del files[src]
+    for d in changed:
+        files[d['source']] = {'sha256': d['sha256'], 'ids': []}
+    for chunk_id, m in zip(new_ids, new_metas):
+        files[m['source']]['ids'].append(chunk_id)
+    manifest['next_id'] += len(new_ids)
+    manifest['stale_chunks'] = stale
+
+    save_index(out_dir, backends, manifest, kept + list(zip(new_ids, new_texts, new_metas)), matrix, embeddings, index)
+    print('Index saved to', out_dir)
+    return True
+
+def build_index(kb_dir=KB_DIR, out_dir=OUT_DIR, backend='all', full=False, refit_ratio=0.5, index_type='flat'):
+    """Build the retrieval artifacts for `backend` ('dense', 'sparse' or 'all').
+
+    - dense: L2-normalized float32 vectors in an ID-mapped inner-product FAISS index of
+      `index_type` (flat, ivf_flat, ivf_pq or hnsw; faiss_index.bin, embeddings.npy)
+    - sparse: the TF-IDF CSR matrix as-is (tfidf_matrix.npz), scored via posting lists at query time
+
+    Chunk texts and metadata go to the binary chunk store (chunks.bin, chunks.npy,
+    chunk_rows.npy; see chunk_store.py), which replaces metadata.json.
+
+    A manifest.json with per-file content hashes and chunk ids is stored next to
+    the index. Unless `full` is set, later runs only re-chunk and re-embed the
+    files whose hash changed and drop the chunks of deleted files.
+    """
+    backends = BACKENDS if backend == 'all' else (backend,)
+    os.makedirs(out_dir, exist_ok=True)
+    print('Loading knowledge base from', kb_dir)
+    docs = load_kb_files(kb_dir)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f'Unknown index type {index_type!r}; expected one of {INDEX_TYPES}')
+    manifest = None if full else load_manifest(out_dir)
+    if (manifest is not None and manifest['backends'] == sorted(backends)
+            and manifest.get('index_type', 'flat') == index_type and docs):
+        if incremental_build(docs, out_dir, backends, manifest, refit_ratio):
+            return
+    full_build(docs, out_dir, backends, index_type)
 
 if __name__ == '__main__':
-    build_index()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the knowledge base retrieval index')
+    parser.add_argument('--backend', choices=BACKENDS + ('all',), default='all',
+                        help='dense: FAISS IndexFlatIP; sparse: TF-IDF CSR matrix; all: both')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and rebuild everything')
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat',
+                        help='FAISS index for the dense backend (exact flat or approximate IVF/PQ/HNSW)')
+    args = parser.parse_args()
+    build_index(backend=args.backend, full=args.full, index_type=args.index_type)
@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# chunks.bin holds every chunk text and every source name as UTF-8, back to back;
+# chunks.npy is one fixed-width row per chunk (in index/matrix row order) pointing
+# into it, and chunk_rows.npy maps a stable chunk id (the FAISS id) to its row
+BLOB_FILE = 'chunks.bin'
+TABLE_FILE = 'chunks.npy'
+ROWS_FILE = 'chunk_rows.npy'
+LEGACY_FILE = 'metadata.json'
+STORE_FILES = (BLOB_FILE, TABLE_FILE, ROWS_FILE)
+ROW_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('source_offset', '<u8'),
+    ('source_length', '<u4'),
+    ('chunk', '<u4'),
+])
+# the same packed layout for reading one row without building numpy scalars
+ROW_STRUCT = struct.Struct('<qQIQII')
+ID_STRUCT = struct.Struct('<q')
+
+def _save(path, array):
+    # written next to the target and renamed over it: a reader that already
+    # mapped the old file keeps a consistent view
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+def write_chunk_store(out_dir, chunks, next_id):
+    """Write (chunk_id, text, meta) triples, given in row order, as a binary chunk store.
+
+    `text` may be str or already-encoded UTF-8 bytes (incremental builds copy the
+    bytes of kept chunks without decoding them). Ids must be below `next_id`.
+    Any legacy metadata.json in `out_dir` is removed.
+    """
+    rows = []
+    sources = {}
+    blob_path = os.path.join(out_dir, BLOB_FILE)
+    tmp_blob = blob_path + '.tmp'
+    with open(tmp_blob, 'wb') as f:
+        pos = 0
+        for chunk_id, text, meta in chunks:
+            data = text if isinstance(text, bytes) else text.encode('utf-8')
+            source = sources.get(meta['source'])
+            if source is None:
+                name = meta['source'].encode('utf-8')
+                f.write(name)
+                source = sources[meta['source']] = (pos, len(name))
+                pos += len(name)
+            f.write(data)
+            rows.append((chunk_id, pos, len(data), source[0], source[1], meta['chunk']))
+            pos += len(data)
+    table = np.array(rows, dtype=ROW_DTYPE)
+    id_to_row = np.full(next_id, -1, dtype='<i8')
+    id_to_row[table['id']] = np.arange(len(table))
+    os.replace(tmp_blob, blob_path)
+    _save(os.path.join(out_dir, TABLE_FILE), table)
+    _save(os.path.join(out_dir, ROWS_FILE), id_to_row)
+    legacy = os.path.join(out_dir, LEGACY_FILE)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+def _map(path):
+    with open(path, 'rb') as f:
+        # mmap refuses empty files; an empty blob has nothing to read anyway
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _map_npy(path):
+    """Map a .npy file; returns (mmap, offset of the data, number of rows)."""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return _map(path), offset, shape[0]
+
+class ChunkStore:
+    """Read-only chunk texts and metadata opened with mmap.
+
+    Opening maps the files without reading them, and `text(row)`/`meta(row)`
+    only touch the pages of that row and its bytes in the blob, so load time
+    and resident memory do not grow with the number of chunks.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._table, self._table_offset, self._n = _map_npy(os.path.join(index_dir, TABLE_FILE))
+        self._rows, self._rows_offset, self._n_ids = _map_npy(os.path.join(index_dir, ROWS_FILE))
+        self.blob = _map(os.path.join(index_dir, BLOB_FILE))
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def ids(self):
+        # copied out, so no numpy view keeps the mmap from being closed
+        return np.frombuffer(self._table, dtype=ROW_DTYPE, count=self._n, offset=self._table_offset)['id'].copy()
+
+    def row_of(self, chunk_id):
+        """Row of a stable chunk id (the FAISS id), or -1 if it is not in the store."""
+        if chunk_id < 0 or chunk_id >= self._n_ids:
+            return -1
+        return ID_STRUCT.unpack_from(self._rows, self._rows_offset + chunk_id * ID_STRUCT.size)[0]
+
+    def _row(self, row):
+        return ROW_STRUCT.unpack_from(self._table, self._table_offset + row * ROW_STRUCT.size)
+
+    def raw_text(self, row):
+        _, offset, length, _, _, _ = self._row(row)
+        return self.blob[offset:offset + length]
+
+    def text(self, row):
+        return self.raw_text(row).decode('utf-8')
+
+    def meta(self, row):
+        _, _, _, source_offset, source_length, chunk = self._row(row)
+        return {'source': self.blob[source_offset:source_offset + source_length].decode('utf-8'), 'chunk': chunk}
+
+    def close(self):
+        # Windows cannot replace a file that is still mapped
+        for m in (self._table, self._rows, self.blob):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        self._table = self._rows = self.blob = None
+
+class LegacyChunkStore:
+    """The same interface over an index that still has metadata.json (parsed whole into memory)."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, LEGACY_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.texts = meta['texts']
+        self.metadatas = meta['metadatas']
+        # indexes built with a manifest carry stable chunk ids (the FAISS ids);
+        # older ones are addressed by position
+        self._ids = meta.get('ids')
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)} if self._ids is not None else None
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def ids(self):
+        return self._ids if self._ids is not None else list(range(len(self.texts)))
+
+    def row_of(self, chunk_id):
+        if self._rows is None:
+            return chunk_id if 0 <= chunk_id < len(self.texts) else -1
+        return self._rows.get(chunk_id, -1)
+
+    def raw_text(self, row):
+        return self.texts[row].encode('utf-8')
+
+    def text(self, row):
+        return self.texts[row]
+
+    def meta(self, row):
+        return self.metadatas[row]
+
+    def close(self):
+        pass
+
+def store_files(index_dir):
+    """Files that make up the chunk store in `index_dir`: the binary ones, else metadata.json."""
+    if os.path.exists(os.path.join(index_dir, TABLE_FILE)):
+        return STORE_FILES
+    return (LEGACY_FILE,)
+
+def open_chunk_store(index_dir):
+    if os.path.exists(os.path.join(index_dir, TABLE_FILE)):
+        return ChunkStore(index_dir)
+    if os.path.exists(os.path.join(index_dir, LEGACY_FILE)):
+        return LegacyChunkStore(index_dir)
+    raise FileNotFoundError('Index not found. Run build_index.py first.')
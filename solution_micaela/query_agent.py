@@ -1,91 +1,346 @@
 import os
-import re
-import json
+import threading
+import time
 import faiss
 import numpy as np
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 import pandas as pd
+import scipy.sparse as sp
+
+from ann_index import set_search_params
+from balance_db import open_balance_db
+from chunk_store import open_chunk_store, store_files
+from router import Router
+from tracing import span, trace
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
 INDEX_DIR = os.path.join(os.path.dirname(__file__), 'index')
 SALDOS_CSV = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'saldos.csv'))
+# plus the chunk store files (chunk_store.store_files)
+INDEX_FILES = {
+    'dense': ('vectorizer.joblib', 'faiss_index.bin'),
+    'sparse': ('vectorizer.joblib', 'tfidf_matrix.npz'),
+}
+DEFAULT_BACKEND = os.environ.get('KB_BACKEND', 'dense')
+# query-time knobs for approximate FAISS indexes (ignored by flat)
+FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', '16'))
+FAISS_EF_SEARCH = int(os.environ.get('FAISS_EF_SEARCH', '64'))
+# 'sqlite' keeps saldos.csv in an on-disk database instead of a dict (SqliteBalanceStore)
+BALANCES_BACKEND = os.environ.get('BALANCES_BACKEND', 'memory')
+BALANCES_DB_DIR = os.path.join(os.path.dirname(__file__), 'balances_db')
 
-def load_index():
-    idx_path = os.path.join(INDEX_DIR, 'faiss_index.bin')
-    meta_path = os.path.join(INDEX_DIR, 'metadata.json')
-    if not os.path.exists(idx_path) or not os.path.exists(meta_path):
+def load_index(index_dir=INDEX_DIR):
+    idx_path = os.path.join(index_dir, 'faiss_index.bin')
+    if not os.path.exists(idx_path):
         raise FileNotFoundError('Index not found. Run build_index.py first.')
     index = faiss.read_index(idx_path)
-    with open(meta_path, 'r', encoding='utf-8') as f:
-        meta = json.load(f)
-    texts = meta['texts']
-    metadatas = meta['metadatas']
-    return index, texts, metadatas
+    # chunk texts are memory-mapped (or metadata.json for indexes built before the chunk store)
+    return index, open_chunk_store(index_dir)
+
+def load_sparse_index(index_dir=INDEX_DIR):
+    mat_path = os.path.join(index_dir, 'tfidf_matrix.npz')
+    if not os.path.exists(mat_path):
+        raise FileNotFoundError('Sparse index not found. Run build_index.py --backend sparse first.')
+    # store the matrix transposed (terms x chunks): each row is the posting list
+    # of one term, so scoring a query only touches the postings of its terms
+    postings = sp.load_npz(mat_path).T.tocsr()
+    # matrix rows follow chunk store order, so sparse hits are already row positions
+    return postings, open_chunk_store(index_dir)
+
+def sparse_top_k(q_vecs, postings, top_k):
+    """For each row of `q_vecs`, the `top_k` best scoring chunk rows from the term posting lists.
+
+    Same algorithm as langchain_groq_app/sparse_index.py:sparse_top_k; fix both.
+    """
+    scores = (q_vecs @ postings).tocsr()
+    hits = []
+    for r in range(scores.shape[0]):
+        lo, hi = scores.indptr[r], scores.indptr[r + 1]
+        data, ids = scores.data[lo:hi], scores.indices[lo:hi]
+        if len(data) > top_k:
+            part = np.argpartition(-data, top_k - 1)[:top_k]
+        else:
+            part = np.arange(len(data))
+        order = part[np.argsort(-data[part], kind='stable')]
+        hits.append(ids[order].tolist())
+    return hits
+
+class BalanceStore:
+    """In-memory hash index of saldos.csv keyed by the normalized ID_Cedula.
+
+    The CSV is parsed once and lookups are a dict access. The file is stat'ed
+    at most every `check_interval` seconds; when its mtime or size changes a
+    background thread rebuilds the index while lookups keep being answered
+    from the previous one, which is then swapped out in a single assignment.
+    """
+
+    def __init__(self, csv_path=SALDOS_CSV, check_interval=1.0):
+        self.csv_path = csv_path
+        self.check_interval = check_interval
+        self.loads = 0
+        self._state = None
+        self._last_check = 0.0
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _build(self, sig):
+        df = pd.read_csv(self.csv_path)
+        keys = df['ID_Cedula'].astype(str).str.strip().tolist()
+        rows = zip(keys, df['ID_Cedula'].tolist(), df['Nombre'].tolist(), df['Balance'].tolist())
+        index = {}
+        for key, id_val, name, balance in rows:
+            # keep the first row for duplicated IDs, like the previous row[0] lookup
+            if key not in index:
+                index[key] = (id_val, name, float(balance))
+        self._state = (sig, index)
+        self.loads += 1
+
+    def _rebuild_in_background(self, sig):
+        def run():
+            try:
+                self._build(sig)
+            except Exception as e:
+                print('Error reloading balances:', e)
+            finally:
+                self._rebuilding = False
+
+        self._rebuilding = True
+        threading.Thread(target=run, name='balance-store-reload', daemon=True).start()
+
+    def _index(self):
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - self._last_check < self.check_interval:
+            return state[1]
+        with self._lock:
+            self._last_check = now
+            sig = self._signature()
+            if sig is None:
+                self._state = None
+                return None
+            state = self._state
+            if state is None:
+                self._build(sig)
+            elif state[0] != sig and not self._rebuilding:
+                self._rebuild_in_background(sig)
+            return self._state[1]
+
+    def lookup(self, id_cedula):
+        index = self._index()
+        if index is None:
+            return None
+        hit = index.get(id_cedula.strip())
+        if hit is None:
+            return None
+        return {'ID_Cedula': hit[0], 'Nombre': hit[1], 'Balance': hit[2]}
+
+class SqliteBalanceStore(BalanceStore):
+    """BalanceStore over an indexed SQLite copy of the CSV, for files larger than RAM.
+
+    The CSV is converted in chunks (balance_db.open_balance_db), so memory stays
+    flat whatever its size; each lookup is a primary-key search on disk. A
+    changed CSV is converted again in the background, as with the dict index.
+    """
+
+    def __init__(self, csv_path=SALDOS_CSV, check_interval=1.0, db_dir=BALANCES_DB_DIR):
+        super().__init__(csv_path, check_interval)
+        self.db_dir = db_dir
+
+    def _build(self, sig):
+        # BalanceDb.get has the dict interface lookup() uses
+        self._state = (sig, open_balance_db(self.csv_path, self.db_dir))
+        self.loads += 1
+
+BALANCES = SqliteBalanceStore() if BALANCES_BACKEND == 'sqlite' else BalanceStore()
 
 def lookup_balance(id_cedula):
-    if not os.path.exists(SALDOS_CSV):
-        return None
-    df = pd.read_csv(SALDOS_CSV)
-    row = df[df['ID_Cedula'].astype(str).str.strip() == id_cedula.strip()]
-    if row.empty:
-        return None
-    return {'ID_Cedula': row.iloc[0]['ID_Cedula'], 'Nombre': row.iloc[0]['Nombre'], 'Balance': float(row.iloc[0]['Balance'])}
+    return BALANCES.lookup(id_cedula)
+
+class QueryEngine:
+    """Keeps the TF-IDF vectorizer and search index resident in memory, next to the mmap'd chunk store.
+
+    Artifacts are loaded lazily on first use and reloaded only when one of the
+    files in the index directory changes on disk (keyed on mtime and size).
+    A reload builds a complete new state and swaps it in with a single
+    assignment, so concurrent readers never see a half-loaded index.
+
+    `backend` selects the search structure: 'dense' searches the FAISS index
+    over densified vectors (nprobe/ef_search tune approximate index types),
+    'sparse' scores the TF-IDF CSR matrix directly through its term posting lists.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, backend=DEFAULT_BACKEND, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH):
+        if backend not in INDEX_FILES:
+            raise ValueError(f'Unknown backend {backend!r}; expected one of {sorted(INDEX_FILES)}')
+        self.index_dir = index_dir
+        self.backend = backend
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.loads = 0
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        sig = []
+        for name in INDEX_FILES[self.backend] + store_files(self.index_dir):
+            try:
+                st = os.stat(os.path.join(self.index_dir, name))
+            except FileNotFoundError:
+                raise FileNotFoundError('Index not found. Run build_index.py first.')
+            sig.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _load(self):
+        # load TF-IDF vectorizer produced during indexing
+        vectorizer = joblib.load(os.path.join(self.index_dir, 'vectorizer.joblib'))
+        if self.backend == 'sparse':
+            return (vectorizer,) + load_sparse_index(self.index_dir)
+        loaded = load_index(self.index_dir)
+        set_search_params(loaded[0], nprobe=self.nprobe, ef_search=self.ef_search)
+        return (vectorizer,) + loaded
+
+    def state(self):
+        """Return (signature, vectorizer, index, chunks), reloading if stale."""
+        sig = self._signature()
+        state = self._state
+        if state is not None and state[0] == sig:
+            return state
+        with self._lock:
+            state = self._state
+            if state is None or state[0] != sig:
+                # the signature is taken before loading: if the files change
+                # mid-load the next call sees a newer signature and reloads again
+                state = (sig,) + self._load()
+                self._state = state
+                self.loads += 1
+        return state
+
+    def retrieve(self, query, top_k=3):
+        return self.retrieve_batch([query], top_k=top_k)[0]
+
+    def retrieve_batch(self, queries, top_k=3):
+        """Retrieve for several queries with one vectorizer transform and one index search.
+
+        Results come back as one list of {'text', 'meta'} dicts per query, in order.
+        """
+        if not queries:
+            return []
+        _, vectorizer, index, chunks = self.state()
+        with span('vectorize'):
+            q_vecs = vectorizer.transform(queries)
+        with span('index_search'):
+            if self.backend == 'sparse':
+                # TfidfVectorizer rows are already L2-normalized: the dot product is the cosine
+                hits = sparse_top_k(q_vecs, index, top_k)
+            else:
+                q_emb = q_vecs.toarray().astype('float32')
+                q_emb = q_emb / np.linalg.norm(q_emb, axis=1, keepdims=True)
+                D, I = index.search(q_emb, top_k)
+                # FAISS returns stable chunk ids; -1 pads missing hits
+                hits = [[chunks.row_of(int(i)) for i in row] for row in I]
+        results = []
+        with span('chunk_read'):
+            for ids in hits:
+                docs = []
+                for idx in ids:
+                    if idx < 0 or idx >= len(chunks):
+                        continue
+                    # only the top-k rows are read from the chunk store
+                    docs.append({'text': chunks.text(idx), 'meta': chunks.meta(idx)})
+                results.append(docs)
+        return results
+
+ENGINE = QueryEngine()
 
 def retrieve_docs(query, top_k=3):
-    # load TF-IDF vectorizer produced during indexing
-    vec_path = os.path.join(INDEX_DIR, 'vectorizer.joblib')
-    if not os.path.exists(vec_path):
-        raise FileNotFoundError('Vectorizer not found. Run build_index.py first.')
-    vectorizer = joblib.load(vec_path)
-    q_emb = vectorizer.transform([query]).toarray().astype('float32')
-    q_emb = q_emb / np.linalg.norm(q_emb, axis=1, keepdims=True)
-    index, texts, metas = load_index()
-    D, I = index.search(q_emb, top_k)
-    results = []
-    for idx in I[0]:
-        if idx < 0 or idx >= len(texts):
-            continue
-        results.append({'text': texts[idx], 'meta': metas[idx]})
-    return results
-
-def route_and_respond(question):
-    # detect ID pattern like V-12345678
-    id_match = re.search(r"\b[Vv]-?\d{6,8}\b", question)
-    if id_match:
-        id_val = id_match.group(0).replace(' ', '')
+    return ENGINE.retrieve(query, top_k=top_k)
+
+def retrieve_docs_batch(queries, top_k=3):
+    return ENGINE.retrieve_batch(queries, top_k=top_k)
+
+KB_KEYWORDS = ['abrir cuenta', 'transferencia', 'tarjeta', 'tarjetas', 'cuenta', 'transferir']
+# an ID like V-12345678 is enough for a balance lookup, no trigger word needed
+ROUTER = Router(kb_terms=KB_KEYWORDS, id_pattern=r"\b[Vv]-?\d{6,8}\b")
+GENERAL_ANSWER = "Consulta general detectada. Si desea una respuesta generada por un LLM configure `OPENAI_API_KEY` y actualice este script para usar LangChain/OpenAI."
+
+def classify_question(question):
+    """Return ('balance', id), ('kb', None) or ('general', None)."""
+    return ROUTER.route(question)
+
+def balance_answer(id_val):
+    with span('balance_lookup'):
         bal = lookup_balance(id_val)
-        if bal:
-            return f"Balance para {bal['Nombre']} ({bal['ID_Cedula']}): {bal['Balance']}"
-        else:
-            return f"No se encontró balance para el ID {id_val}."
-
-    # detect keywords for KB
-    kb_keywords = ['abrir cuenta', 'transferencia', 'tarjeta', 'tarjetas', 'cuenta', 'transferir']
-    lowered = question.lower()
-    if any(k in lowered for k in kb_keywords):
-        docs = retrieve_docs(question, top_k=4)
-        # If OpenAI key present, you could call an LLM to synthesize; fallback to returning retrieved docs
-        answer = 'He encontrado estos fragmentos relevantes de la base de conocimientos:\n\n'
-        for d in docs:
-            answer += f"Fuente: {d['meta']['source']} (chunk {d['meta']['chunk']})\n{d['text']}\n\n"
-        return answer
+    if bal:
+        return f"Balance para {bal['Nombre']} ({bal['ID_Cedula']}): {bal['Balance']}"
+    else:
+        return f"No se encontró balance para el ID {id_val}."
+
+def kb_answer(docs):
+    # If OpenAI key present, you could call an LLM to synthesize; fallback to returning retrieved docs
+    answer = 'He encontrado estos fragmentos relevantes de la base de conocimientos:\n\n'
+    for d in docs:
+        answer += f"Fuente: {d['meta']['source']} (chunk {d['meta']['chunk']})\n{d['text']}\n\n"
+    return answer
 
+def route_and_respond(question, t=None):
+    """Answer one question; `t`, if given, is the trace whose source gets set."""
+    with span('route'):
+        route, id_val = classify_question(question)
+    if t is not None:
+        t.source = route
+    if route == 'balance':
+        return balance_answer(id_val)
+    if route == 'kb':
+        return kb_answer(ENGINE.retrieve(question, top_k=4))
     # General response: fall back to simple reply (LLM integration optional)
-    return "Consulta general detectada. Si desea una respuesta generada por un LLM configure `OPENAI_API_KEY` y actualice este script para usar LangChain/OpenAI." 
+    return GENERAL_ANSWER
 
-def main():
+def route_and_respond_batch(questions):
+    """Answer several questions; the KB-bound ones share a single retrieval call."""
+    routes = ROUTER.route_many(questions)
+    kb_pos = [i for i, (route, _) in enumerate(routes) if route == 'kb']
+    kb_docs = dict(zip(kb_pos, ENGINE.retrieve_batch([questions[i] for i in kb_pos], top_k=4)))
+    answers = []
+    for i, (route, id_val) in enumerate(routes):
+        if route == 'balance':
+            answers.append(balance_answer(id_val))
+        elif route == 'kb':
+            answers.append(kb_answer(kb_docs[i]))
+        else:
+            answers.append(GENERAL_ANSWER)
+    return answers
+
+def main(show_trace=False):
     print('Agente de consulta. Escriba su pregunta y pulse Enter (Ctrl+C para salir).')
     while True:
         q = input('\nPregunta: ').strip()
         if not q:
             continue
         try:
-            resp = route_and_respond(q)
+            with trace('query_agent') as t:
+                resp = route_and_respond(q, t)
             print('\nRespuesta:\n')
             print(resp)
+            if show_trace:
+                print(f'\n[{t.source}] {t.format()}')
         except Exception as e:
             print('Error:', e)
 
 if __name__ == '__main__':
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Agente de consulta sobre la base de conocimientos indexada')
+    parser.add_argument('--backend', choices=sorted(INDEX_FILES), default=DEFAULT_BACKEND,
+                        help='dense: FAISS IndexFlatIP; sparse: TF-IDF CSR posting lists')
+    parser.add_argument('--trace', action='store_true', help='Mostrar el tiempo de cada etapa después de cada respuesta')
+    args = parser.parse_args()
+    ENGINE = QueryEngine(backend=args.backend)
+    main(show_trace=args.trace)
@@ -0,0 +1,55 @@
+"""Single-regex question router of query_agent.
+
+It is a smaller copy of the rules in langchain_groq_app/router.py (one pass
+over the lowercased text, batches joined with SEPARATOR); a fix to one
+usually belongs in both.
+"""
+import bisect
+import re
+
+# joins the texts of route_many; no rule can match across it
+SEPARATOR = '\x00'
+
+class Router:
+    """Classifies questions as ('balance', id), ('kb', None) or ('general', None).
+
+    The ID pattern and the KB keywords are compiled once into a single regex
+    with named groups, so a question is classified in one pass over its
+    lowercased text. An ID wins over KB keywords and is returned as it
+    appears in the original text.
+    """
+
+    def __init__(self, kb_terms, id_pattern):
+        # longest first, so a long term is not shadowed by a shorter one at the same position
+        terms = sorted({t.lower() for t in kb_terms}, key=len, reverse=True)
+        rules = f'(?P<id>{id_pattern})|(?P<kb>' + '|'.join(re.escape(t) for t in terms) + ')'
+        self.pattern = re.compile(rules)
+        # for the rare texts whose length changes when lowercased (e.g. 'İ')
+        self._pattern_ci = re.compile(rules, re.I)
+
+    def _matches(self, text):
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return self.pattern.finditer(lowered)
+        return self._pattern_ci.finditer(text)
+
+    def route(self, text):
+        return self.route_many([text])[0]
+
+    def route_many(self, texts):
+        """Classify a batch with a single regex pass over the joined texts."""
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + 1
+        ids = [None] * len(texts)
+        kb = [False] * len(texts)
+        joined = SEPARATOR.join(texts)
+        for m in self._matches(joined):
+            j = bisect.bisect_right(starts, m.start()) - 1
+            if m.lastgroup == 'kb':
+                kb[j] = True
+            elif ids[j] is None:
+                # spans are the same in the lowercased text, so slice the original
+                ids[j] = joined[m.start():m.end()]
+        return [('balance', i) if i is not None else ('kb' if k else 'general', None) for i, k in zip(ids, kb)]
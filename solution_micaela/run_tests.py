@@ -1,6 +1,7 @@
 import importlib.util
 import os
 import textwrap
+import time
 
 MOD_PATH = os.path.join(os.path.dirname(__file__), 'query_agent.py')
 
@@ -17,6 +18,7 @@ tests = [
 ]
 
 def run():
+    timings = []
     for q in tests:
         print('\n' + '='*80)
         print('Query:', q)
@@ -25,7 +27,9 @@ def run():
             retrieved = None
             if hasattr(qa, 'retrieve_docs'):
                 try:
+                    t0 = time.perf_counter()
                     retrieved = qa.retrieve_docs(q, top_k=4)
+                    timings.append(time.perf_counter() - t0)
                 except Exception as e:
                     retrieved = f'Error retrieving docs: {e}'
 
@@ -50,5 +54,19 @@ def run():
         except Exception as e:
             print('Error running test:', e)
 
+    report_latency(timings)
+
+def report_latency(timings):
+    # the first retrieval loads the index artifacts (cold); the rest hit the resident QueryEngine (warm)
+    print('\n' + '='*80)
+    if not timings:
+        print('No retrieval timings recorded.')
+        return
+    print(f'Retrieval latency (index loads: {qa.ENGINE.loads})')
+    print(f'  cold: {timings[0] * 1000:.2f} ms')
+    if len(timings) > 1:
+        warm = timings[1:]
+        print(f'  warm: {sum(warm) / len(warm) * 1000:.2f} ms avg over {len(warm)} queries')
+
 if __name__ == '__main__':
     run()
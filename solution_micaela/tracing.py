@@ -0,0 +1,46 @@
+"""Per-stage spans of one question, kept in a ContextVar.
+
+A trimmed copy of the span/trace part of langchain_groq_app/tracing.py,
+without the metrics or the profiler; a fix to one usually belongs in both.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+class Trace:
+    """Per-stage timings of one question; `source` is set by whoever answers it."""
+
+    def __init__(self, name):
+        self.name = name
+        self.source = None
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+
+    def format(self):
+        stages = ' | '.join(f'{n} {s * 1000:.1f} ms' for n, s in self.spans)
+        total = f'{self.seconds * 1000:.1f} ms' if self.seconds is not None else 'en curso'
+        return f'{total}: {stages}' if stages else total
+
+_CURRENT = ContextVar('trace', default=None)
+
+@contextmanager
+def span(name):
+    """Time a stage into the active trace; without one it only costs a clock read."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t = _CURRENT.get()
+        if t is not None:
+            t.spans.append((name, time.perf_counter() - start))
+
+@contextmanager
+def trace(name):
+    t = Trace(name)
+    token = _CURRENT.set(t)
+    try:
+        yield t
+    finally:
+        t.seconds = time.perf_counter() - t.start
+        _CURRENT.reset(token)